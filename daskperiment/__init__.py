@@ -1 +1,2 @@
 from daskperiment.core.experiment import Experiment    # noqa
+from daskperiment.core.runner import ProcessPoolTrialRunner    # noqa
@@ -1,13 +1,42 @@
+import itertools
 import pathlib
 
 from daskperiment.core.errors import TrialIDNotFoundError
+from daskperiment.io.compression import (create_compression, decompress,
+                                         decompress_chunks, is_compressed)
+import daskperiment.io.chunk as chunk
 import daskperiment.io.pickle as pickle
+import daskperiment.io.serializer as serializer
 from daskperiment.util.log import get_logger
 
 
 logger = get_logger(__name__)
 
 
+# separator of step name and input hash in the input key of step hash
+STEP_INPUT_SEP = '-'
+
+
+def get_step_input_key(step, input_hash):
+    """
+    Get the input key of the step hash
+    """
+    return step + STEP_INPUT_SEP + input_hash
+
+
+def get_step_name(input_key):
+    """
+    Get the step name from the input key built by get_step_input_key
+    """
+    # input hash is a hex digest without the separator, and step name
+    # may contain it
+    step, sep, input_hash = input_key.rpartition(STEP_INPUT_SEP)
+    if sep == '' or input_hash == '':
+        msg = 'Invalid input key of step hash: {}'
+        raise ValueError(msg.format(input_key))
+    return step
+
+
 def init_backend(experiment_id=None, backend=None):
     """
     Initialize backend from Experiment ID and protocol.
@@ -107,6 +136,9 @@ def maybe_mongo(uri):
 
 class _BaseBackend(object):
 
+    # compression used if not specified
+    default_compression = None
+
     def __init__(self, experiment_id):
         self.experiment_id = experiment_id
 
@@ -130,6 +162,53 @@ class _BaseBackend(object):
         """
         return self
 
+    def start_recording(self):
+        """
+        Start recording updates to be replayed in other process.
+
+        Dababase-like backends do nothing because updates are directly
+        saved to the database.
+        """
+        # overridden in LocalBackend
+        return self
+
+    def stop_recording(self):
+        """
+        Stop recording and return recorded updates.
+        """
+        return []
+
+    def replay(self, records):
+        """
+        Replay updates recorded in other process.
+        """
+        return self
+
+    ################################################
+    # Compression
+    ################################################
+
+    @property
+    def compression(self):
+        if not hasattr(self, '_compression'):
+            self._compression = create_compression(
+                None, default=self.default_compression)
+        return self._compression
+
+    def set_compression(self, compression):
+        """
+        Set compression policy of stored data.
+
+        Prameters
+        ---------
+        compression: str, dict, bool or Compression
+           None to use backend's default, False to disable. Codec name or
+           a dict of data category and codec name.
+        """
+        self._compression = create_compression(
+            compression, default=self.default_compression)
+        return self
+
     ################################################
     # Key & value management
     ################################################
@@ -143,18 +222,60 @@ class _BaseBackend(object):
     def get_metric_key(self, metric_key, trial_id):
         return self._get_metric_key(metric_key, trial_id)
 
+    def get_step_log_key(self, trial_id):
+        """
+        Get key to save step log records
+        """
+        return self._get_step_log_key(trial_id)
+
     def get_persist_key(self, step, trial_id):
         """
         Get key to save persisted results
         """
         return self._get_persist_key(step, trial_id)
 
+    def get_persist_blob_key(self, content_hash):
+        """
+        Get key to save persisted results by its content hash
+        """
+        return self._get_persist_blob_key(content_hash)
+
     def get_step_hash_key(self, key):
         """
-        Get key to save persisted results
+        Get key to save step output hash
         """
         return self._get_step_hash_key(key)
 
+    def get_step_trial_key(self, key):
+        """
+        Get key to save the trial id which persisted the step output
+        """
+        return self._get_step_trial_key(key)
+
+    def get_step_output_key(self, key):
+        """
+        Get key to save serialized step output shared between processes
+        """
+        return self._get_step_output_key(key)
+
+    def get_reference_key(self, token):
+        """
+        Get key to save the value of reference parameter
+        """
+        return self._get_reference_key(token)
+
+    def get_profile_key(self, trial_id):
+        """
+        Get key to save profile captured in the trial
+        """
+        return self._get_profile_key(trial_id)
+
+    def get_trace_key(self, trial_id):
+        """
+        Get key to save trace recorded in the trial
+        """
+        return self._get_trace_key(trial_id)
+
     def get_code_key(self, trial_id):
         """
         Get key to save code
@@ -165,11 +286,141 @@ class _BaseBackend(object):
         # ext is used in LocalBackend
         return self._get_environment_key(env_key, trial_id, ext)
 
+    ################################################
+    # Persisted result
+    ################################################
+
+    def save_persisted(self, key, obj, format=None):
+        """
+        Save persisted step result in the format. If format is not
+        provided, it is inferred from the result type.
+
+        The result is stored by its content hash, and the key holds a
+        reference to it. Returns the reference which can be linked from
+        other keys.
+
+        This method must be overwritten by actual class
+        """
+        raise NotImplementedError
+
+    def link_persisted(self, key, reference):
+        """
+        Save reference to the result stored by save_persisted.
+
+        This method must be overwritten by actual class
+        """
+        raise NotImplementedError
+
+    def load_persisted(self, key, columns=None, mmap=False):
+        """
+        Load persisted step result. If columns is provided, only the
+        columns are loaded (DataFrame only). If mmap is True, arrays are
+        loaded as read-only memory-mapped array if possible.
+
+        This method must be overwritten by actual class
+        """
+        raise NotImplementedError
+
+    ################################################
+    # Garbage collection
+    ################################################
+
+    def list_persisted(self):
+        """
+        Return a list of tuples of (step, trial_id, key) of persisted
+        results. key is where the reference (or the result persisted by
+        older versions) is stored.
+
+        This method must be overwritten by actual class
+        """
+        raise NotImplementedError
+
+    def get_persisted_reference(self, key):
+        """
+        Return the reference stored in the key returned by get_persist_key
+        or listed by list_persisted. None if the result is stored without
+        reference (persisted by older versions) or not found.
+
+        This method must be overwritten by actual class
+        """
+        raise NotImplementedError
+
+    def list_persist_blobs(self):
+        """
+        Return a dict of reference and bytes of persisted results stored
+        by their content hash.
+
+        This method must be overwritten by actual class
+        """
+        raise NotImplementedError
+
+    def get_nbytes(self, key):
+        """
+        Return bytes stored in the key, None if not exists.
+
+        This method must be overwritten by actual class
+        """
+        raise NotImplementedError
+
+    def remove(self, key):
+        """
+        Remove data stored in the key. Do nothing if not exists.
+
+        This method must be overwritten by actual class
+        """
+        raise NotImplementedError
+
+    ################################################
+    # Step output cache
+    ################################################
+
+    def save_step_output(self, key, data):
+        """
+        Save serialized step output atomically, thus other processes never
+        read partially written output.
+
+        This method must be overwritten by actual class
+        """
+        raise NotImplementedError
+
+    def load_step_output(self, key, ttl=None):
+        """
+        Load serialized step output and update its last access time.
+        Returns None if not exists, or it is not accessed for ttl seconds.
+
+        This method must be overwritten by actual class
+        """
+        raise NotImplementedError
+
+    def list_step_outputs(self):
+        """
+        Return a list of tuples of (key, nbytes, last access time)
+
+        This method must be overwritten by actual class
+        """
+        raise NotImplementedError
+
+    def delete_step_output(self, key):
+        """
+        Delete step output. Do nothing if not exists.
+
+        This method must be overwritten by actual class
+        """
+        raise NotImplementedError
+
 
 class _NoSQLBackend(_BaseBackend):
 
     _SEP = ':'
 
+    default_compression = 'zlib'
+
+    # binary data larger than chunk_size is stored as chunks, thus
+    # a single command or document never holds huge value
+    chunk_size = 1024 * 1024
+    # number of chunks sent in a single round trip
+    chunk_batch_size = 8
+
     def __repr__(self):
         return "{}('{}')".format(self.__class__.__name__, self.uri)
 
@@ -186,6 +437,9 @@ class _NoSQLBackend(_BaseBackend):
         state = {}
         state['experiment_id'] = self.experiment_id
         state['uri'] = self.uri
+        state['_compression'] = self.compression
+        state['chunk_size'] = self.chunk_size
+        state['chunk_batch_size'] = self.chunk_batch_size
         # do not pickle _client
         return state
 
@@ -243,6 +497,190 @@ class _NoSQLBackend(_BaseBackend):
         """
         raise NotImplementedError
 
+    def exists(self, key):
+        """
+        This method must be overwritten by actual class
+        """
+        raise NotImplementedError
+
+    def getset(self, key, value):
+        """
+        Set value and return the previous value, None if not exists.
+
+        This method must be overwritten by actual class
+        """
+        raise NotImplementedError
+
+    def delete(self, key):
+        """
+        Delete value. Do nothing if not exists.
+
+        This method must be overwritten by actual class
+        """
+        raise NotImplementedError
+
+    ################################################
+    # Chunked binary
+    ################################################
+
+    def get_chunk_key(self, chunk_id, index):
+        """
+        Get key to save a chunk of large binary data
+        """
+        return self._get_chunk_key(chunk_id, index)
+
+    def set_binary(self, key, data):
+        """
+        Save binary data. Data larger than chunk_size is written chunk by
+        chunk under a new chunk ID, then the key is replaced with the
+        manifest of chunks. Chunks previously stored in the key are deleted.
+        """
+        self._validate_key(key)
+        if len(data) > self.chunk_size:
+            chunk_id = chunk.new_chunk_id()
+            chunks = 0
+            batch = []
+            for data_chunk in chunk.split(data, self.chunk_size):
+                batch.append((chunks, data_chunk.tobytes()))
+                chunks += 1
+                if len(batch) >= self.chunk_batch_size:
+                    self._set_chunks(chunk_id, batch)
+                    batch = []
+            if len(batch) > 0:
+                self._set_chunks(chunk_id, batch)
+            value = chunk.dumps_manifest(chunk_id, chunks, len(data))
+        else:
+            value = data
+        self._replace_binary(key, value)
+
+    def set_binary_stream(self, key, dump):
+        """
+        Save binary data written to file-like object by dump(fileobj).
+        Written data is sent chunk by chunk, thus the entire data is never
+        held in memory. Stored data is the same as set_binary.
+        """
+        self._validate_key(key)
+        chunk_id = chunk.new_chunk_id()
+        writer = chunk.ChunkWriter(
+            lambda batch: self._set_chunks(chunk_id, batch),
+            self.chunk_size, batch_size=self.chunk_batch_size)
+        try:
+            dump(writer)
+            value = writer.finish()
+        except Exception:
+            self._delete_chunks({'id': chunk_id, 'chunks': writer.chunks})
+            raise
+        if value is None:
+            value = chunk.dumps_manifest(chunk_id, writer.chunks,
+                                         writer.nbytes)
+        self._replace_binary(key, value)
+
+    def _replace_binary(self, key, value):
+        previous = chunk.loads_manifest(self.getset(key, value))
+        if previous is not None:
+            self._delete_chunks(previous)
+
+    def _set_chunks(self, chunk_id, chunks):
+        """
+        Save a list of (index, bytes) of chunks. Overwritten to write them
+        in a single round trip.
+        """
+        for index, data in chunks:
+            self.set(self.get_chunk_key(chunk_id, index), data)
+
+    def iter_binary(self, key):
+        """
+        Iterate binary data saved by set_binary chunk by chunk. Yields
+        nothing if the key doesn't exist.
+        """
+        self._validate_key(key)
+        res = self.get(key)
+        if res is None:
+            return
+        manifest = chunk.loads_manifest(res)
+        if manifest is None:
+            yield res
+            return
+        for i in range(manifest['chunks']):
+            data_chunk = self.get(self.get_chunk_key(manifest['id'], i))
+            if data_chunk is None:
+                # overwritten during read
+                msg = 'Chunk {} of {} is not found'
+                raise TrialIDNotFoundError(msg.format(i, key))
+            yield data_chunk
+
+    def _open_chunks(self, key):
+        """
+        Return an iterator of chunks saved by set_binary. Raises
+        TrialIDNotFoundError if the key doesn't exist.
+        """
+        chunks = self.iter_binary(key)
+        first = next(chunks, None)
+        if first is None:
+            raise TrialIDNotFoundError(key)
+        return itertools.chain([first], chunks)
+
+    def get_binary(self, key):
+        """
+        Load binary data saved by set_binary. Returns None if the key
+        doesn't exist.
+        """
+        chunks = list(self.iter_binary(key))
+        if len(chunks) == 0:
+            return None
+        elif len(chunks) == 1:
+            return chunks[0]
+        return b''.join(chunks)
+
+    def _delete_chunks(self, manifest):
+        """
+        Delete chunks referred from the manifest
+        """
+        for i in range(manifest['chunks']):
+            self.delete(self.get_chunk_key(manifest['id'], i))
+
+    def _get_manifest(self, key, nbytes=None):
+        """
+        Return manifest of chunks stored in the key, None if the key
+        stores data as it is
+        """
+        if nbytes is None:
+            nbytes = self._get_nbytes(key)
+        if nbytes is None or nbytes > 1024:
+            # manifest is small
+            return None
+        return chunk.loads_manifest(self.get(key))
+
+    def _get_nbytes(self, key):
+        """
+        Return bytes of the value, None if not exists.
+
+        This method must be overwritten by actual class
+        """
+        raise NotImplementedError
+
+    ################################################
+    # Step hash
+    ################################################
+
+    def load_step_hashes(self, steps):
+        """
+        Load the step hashes of the given step names in one bulk read.
+        Returns a dict of input key and output hash.
+
+        This method must be overwritten by actual class
+        """
+        raise NotImplementedError
+
+    def save_step_hashes(self, hashes):
+        """
+        Save step hashes (a dict of input key and output hash) in one
+        bulk write.
+
+        This method must be overwritten by actual class
+        """
+        raise NotImplementedError
+
     ################################################
     # High level API
     ################################################
@@ -253,6 +691,9 @@ class _NoSQLBackend(_BaseBackend):
 
     def save_text(self, key, text):
         self._validate_key(key)
+        data = self.compression.compress(text.encode('utf-8'), 'text')
+        if is_compressed(data):
+            return self.set(key, data)
         return self.set(key, text)
 
     def load_text(self, key):
@@ -266,6 +707,8 @@ class _NoSQLBackend(_BaseBackend):
             # TODO: define better exception
             # key may not contain trial id
             raise TrialIDNotFoundError(key)
+        elif is_compressed(res):
+            return decompress(res).decode('utf-8')
         else:
             return self._finalize_text(res)
 
@@ -274,26 +717,125 @@ class _NoSQLBackend(_BaseBackend):
         return value
 
     def dumps_object(self, value):
-        return pickle.dumps(value)
+        return self.compression.compress(pickle.dumps(value), 'object')
 
     def loads_object(self, value):
-        return pickle.loads(value)
+        return pickle.loads(decompress(value))
 
     def save_object(self, key, obj):
         """
         Save object to key
         """
         self._validate_key(key)
-        return self.set(key, self.dumps_object(obj))
+
+        def dump(fileobj):
+            writer = self.compression.open_writer(fileobj, 'object')
+            pickle.dump_stream(obj, writer)
+            writer.close()
+
+        return self.set_binary_stream(key, dump)
 
     def load_object(self, key):
         """
         Load object from key
         """
         self._validate_key(key)
+        chunks = decompress_chunks(self._open_chunks(key))
+        return pickle.load_stream(chunk.open_reader(chunks))
+
+    def save_persisted(self, key, obj, format=None):
+        """
+        Save persisted step result as a blob which holds the format.
+        The blob is addressed by its content hash and written only if
+        it doesn't exist.
+        """
+        self._validate_key(key)
+        parts = serializer.dumps_parts(obj, format=format)
+        content_hash = serializer.content_hash(*parts)
+        blob_key = self.get_persist_blob_key(content_hash)
+        if not self.exists(blob_key):
+
+            def dump(fileobj):
+                writer = self.compression.open_writer(fileobj, 'persist')
+                for part in parts:
+                    writer.write(part)
+                writer.close()
+
+            self.set_binary_stream(blob_key, dump)
+        self.link_persisted(key, content_hash)
+        return content_hash
+
+    def link_persisted(self, key, reference):
+        """
+        Save reference to the result stored by save_persisted
+        """
+        self._validate_key(key)
+        return self.set(key, serializer.dumps_reference(reference))
+
+    def load_persisted(self, key, columns=None, mmap=False):
+        """
+        Load persisted step result. Database-like backends don't support
+        mmap.
+        """
+        if mmap:
+            msg = 'mmap is only supported by LocalBackend, backend: {}'
+            raise ValueError(msg.format(self))
+        self._validate_key(key)
         res = self.get(key)
 
         if res is None:
             raise TrialIDNotFoundError(key)
+
+        content_hash = serializer.loads_reference(res)
+        if content_hash is None:
+            # results persisted by older versions are stored in the key
+            chunks = [res]
         else:
-            return self.loads_object(res)
+            blob_key = self.get_persist_blob_key(content_hash)
+            try:
+                chunks = self._open_chunks(blob_key)
+            except TrialIDNotFoundError:
+                raise TrialIDNotFoundError(key)
+        return serializer.load_chunks(chunks, columns=columns)
+
+    ################################################
+    # Garbage collection
+    ################################################
+
+    def get_persisted_reference(self, key):
+        return serializer.loads_reference(self.get(key))
+
+    def list_persist_blobs(self):
+        return {content_hash: self.get_nbytes(
+                    self.get_persist_blob_key(content_hash))
+                for content_hash in self._list_persist_blob_hashes()}
+
+    def _list_persist_blob_hashes(self):
+        """
+        This method must be overwritten by actual class
+        """
+        raise NotImplementedError
+
+    def get_nbytes(self, key):
+        """
+        Return bytes stored in the key including its chunks, None if
+        not exists.
+        """
+        self._validate_key(key)
+        nbytes = self._get_nbytes(key)
+        if nbytes is None:
+            return None
+        manifest = self._get_manifest(key, nbytes=nbytes)
+        if manifest is not None:
+            nbytes += manifest['nbytes']
+        return nbytes
+
+    def remove(self, key):
+        """
+        Remove data stored in the key and its chunks.
+        """
+        self._validate_key(key)
+        manifest = self._get_manifest(key)
+        self.delete(key)
+        if manifest is not None:
+            self._delete_chunks(manifest)
@@ -1,8 +1,15 @@
+import os
 import pathlib
+import threading
+import time
+import uuid
 
 from daskperiment.backend.base import _BaseBackend
 from daskperiment.core.errors import TrialIDNotFoundError
+from daskperiment.io.compression import (decompress, is_compressed,
+                                         is_compressed_file)
 import daskperiment.io.pickle as pickle
+import daskperiment.io.serializer as serializer
 from daskperiment.util.log import get_logger
 
 
@@ -29,10 +36,28 @@ class LocalBackend(_BaseBackend):
         pickle.maybe_create_dir('code', self.code_dir)
         pickle.maybe_create_dir('environment', self.environment_dir)
         pickle.maybe_create_dir('persist', self.persist_dir)
+        pickle.maybe_create_dir('persist blob', self.persist_blob_dir)
+        pickle.maybe_create_dir('step output', self.step_output_dir)
+        pickle.maybe_create_dir('reference', self.reference_dir)
+        pickle.maybe_create_dir('profile', self.profile_dir)
+        pickle.maybe_create_dir('trace', self.trace_dir)
 
     def __repr__(self):
         return "LocalBackend('{}')".format(self.cache_dir)
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # do not pickle threading Lock and recording flag
+        state.pop('_lock_obj', None)
+        state.pop('_recording', None)
+        return state
+
+    @property
+    def _lock(self):
+        if not hasattr(self, '_lock_obj'):
+            self._lock_obj = threading.Lock()
+        return self._lock_obj
+
     def __eq__(self, other):
         if not isinstance(other, LocalBackend):
             return False
@@ -54,6 +79,26 @@ class LocalBackend(_BaseBackend):
     def persist_dir(self):
         return self.cache_dir / 'persist'
 
+    @property
+    def persist_blob_dir(self):
+        return self.persist_dir / 'blob'
+
+    @property
+    def step_output_dir(self):
+        return self.cache_dir / 'step_output'
+
+    @property
+    def reference_dir(self):
+        return self.cache_dir / 'reference'
+
+    @property
+    def profile_dir(self):
+        return self.cache_dir / 'profile'
+
+    @property
+    def trace_dir(self):
+        return self.cache_dir / 'trace'
+
     ################################################
     # Key & value management
     ################################################
@@ -62,6 +107,26 @@ class LocalBackend(_BaseBackend):
         fname = '{}_{}_{}.pkl'.format(self.experiment_id, step, trial_id)
         return self.persist_dir / fname
 
+    def _get_persist_blob_key(self, content_hash):
+        # content_hash includes extension of the format
+        return self.persist_blob_dir / content_hash
+
+    def _get_step_output_key(self, key):
+        fname = '{}.pkl'.format(key)
+        return self.step_output_dir / fname
+
+    def _get_reference_key(self, token):
+        fname = '{}.pkl'.format(token)
+        return self.reference_dir / fname
+
+    def _get_profile_key(self, trial_id):
+        fname = '{}_{}.pkl'.format(self.experiment_id, trial_id)
+        return self.profile_dir / fname
+
+    def _get_trace_key(self, trial_id):
+        fname = '{}_{}.json'.format(self.experiment_id, trial_id)
+        return self.trace_dir / fname
+
     def _get_code_key(self, trial_id):
         fname = '{}_{}.py'.format(self.experiment_id, trial_id)
         return self.code_dir / fname
@@ -81,6 +146,11 @@ class LocalBackend(_BaseBackend):
         Save text to key (pathlib.Path)
         """
         assert isinstance(key, pathlib.Path)
+        if self.compression.enabled('text'):
+            data = self.compression.compress(text.encode('utf-8'), 'text')
+            if is_compressed(data):
+                key.write_bytes(data)
+                return
         key.write_text(text)
 
     def load_text(self, key):
@@ -89,6 +159,8 @@ class LocalBackend(_BaseBackend):
         """
         assert isinstance(key, pathlib.Path)
         try:
+            if is_compressed_file(key):
+                return decompress(key.read_bytes()).decode('utf-8')
             return key.read_text()
         except FileNotFoundError:
             raise TrialIDNotFoundError(key)
@@ -98,7 +170,11 @@ class LocalBackend(_BaseBackend):
         Save object to key (pathlib.Path)
         """
         assert isinstance(key, pathlib.Path)
-        pickle.save(obj, key)
+        if self.compression.enabled('object'):
+            data = self.compression.compress(pickle.dumps(obj), 'object')
+            key.write_bytes(data)
+        else:
+            pickle.save(obj, key)
 
     def load_object(self, key):
         """
@@ -106,21 +182,182 @@ class LocalBackend(_BaseBackend):
         """
         assert isinstance(key, pathlib.Path)
         try:
+            if is_compressed_file(key):
+                return pickle.loads(decompress(key.read_bytes()))
             return pickle.load(key)
         except FileNotFoundError:
             raise TrialIDNotFoundError(key)
 
+    def save_persisted(self, key, obj, format=None):
+        """
+        Save persisted step result to the blob file named by its content
+        hash and the format's extension. The blob is written only if it
+        doesn't exist, and key (pathlib.Path) whose suffix is replaced
+        with '.ref' holds the blob name.
+        """
+        assert isinstance(key, pathlib.Path)
+        fmt, payload = serializer.serialize(obj, format=format)
+        name = serializer.content_hash(fmt.name.encode(),
+                                       payload) + fmt.extension
+        blob = self.get_persist_blob_key(name)
+        if not blob.is_file():
+            serializer.write(blob, self.compression.compress(payload,
+                                                             'persist'))
+        self.link_persisted(key, name)
+        return name
+
+    def link_persisted(self, key, reference):
+        """
+        Save reference to the blob stored by save_persisted
+        """
+        assert isinstance(key, pathlib.Path)
+        serializer.write(key.with_suffix('.ref'), reference.encode())
+
+    def load_persisted(self, key, columns=None, mmap=False):
+        """
+        Load persisted step result from key (pathlib.Path) in any format.
+        If mmap is True, arrays in npy format are returned as read-only
+        np.memmap.
+        """
+        assert isinstance(key, pathlib.Path)
+        try:
+            name = key.with_suffix('.ref').read_text()
+        except FileNotFoundError:
+            # persisted by older versions
+            try:
+                return serializer.load(key, columns=columns, mmap=mmap)
+            except FileNotFoundError:
+                raise TrialIDNotFoundError(key)
+
+        blob = self.get_persist_blob_key(name)
+        try:
+            return serializer.load_file(blob, columns=columns, mmap=mmap)
+        except FileNotFoundError:
+            raise TrialIDNotFoundError(key)
+
+    ################################################
+    # Garbage collection
+    ################################################
+
+    def list_persisted(self):
+        """
+        Return a list of tuples of (step, trial_id, path) of persisted
+        results. path is the reference file, or the result file persisted
+        by older versions.
+        """
+        prefix = '{}_'.format(self.experiment_id)
+        results = []
+        for path in self.persist_dir.iterdir():
+            if (not path.is_file() or path.name.startswith('.') or
+                    not path.name.startswith(prefix)):
+                # blob directory and temporary files
+                continue
+            step, _, trial_id = path.stem[len(prefix):].rpartition('_')
+            try:
+                results.append((step, int(trial_id), path))
+            except ValueError:
+                continue
+        return results
+
+    def get_persisted_reference(self, key):
+        assert isinstance(key, pathlib.Path)
+        try:
+            # result persisted by older versions has no reference file
+            return key.with_suffix('.ref').read_text()
+        except FileNotFoundError:
+            return None
+
+    def list_persist_blobs(self):
+        return {path.name: path.stat().st_size
+                for path in self.persist_blob_dir.iterdir()
+                if path.is_file() and not path.name.startswith('.')}
+
+    def get_nbytes(self, key):
+        assert isinstance(key, pathlib.Path)
+        try:
+            return key.stat().st_size
+        except FileNotFoundError:
+            return None
+
+    def remove(self, key):
+        assert isinstance(key, pathlib.Path)
+        try:
+            key.unlink()
+        except FileNotFoundError:
+            pass
+
+    ################################################
+    # Step output cache
+    ################################################
+
+    def save_step_output(self, key, data):
+        """
+        Save serialized step output atomically, thus other processes never
+        read partially written output.
+        """
+        path = self.get_step_output_key(key)
+        # write to temporary file in the same directory, then rename
+        tmp = path.with_name('.{}.{}.tmp'.format(path.name, uuid.uuid4().hex))
+        tmp.write_bytes(data)
+        os.replace(str(tmp), str(path))
+
+    def load_step_output(self, key, ttl=None):
+        """
+        Load serialized step output and update its last access time.
+        Returns None if not exists, or it is not accessed for ttl seconds.
+        """
+        path = self.get_step_output_key(key)
+        try:
+            if ttl is not None and time.time() - path.stat().st_mtime > ttl:
+                self.delete_step_output(key)
+                return None
+            data = path.read_bytes()
+            # modification time is regarded as the last access time
+            os.utime(str(path))
+        except FileNotFoundError:
+            # may be evicted by other process
+            return None
+        return data
+
+    def list_step_outputs(self):
+        """
+        Return a list of tuples of (key, nbytes, last access time)
+        """
+        results = []
+        for path in self.step_output_dir.glob('*.pkl'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            results.append((path.stem, stat.st_size, stat.st_mtime))
+        return results
+
+    def delete_step_output(self, key):
+        """
+        Delete step output. Do nothing if not exists.
+        """
+        try:
+            self.get_step_output_key(key).unlink()
+        except FileNotFoundError:
+            pass
+
     def save(self):
         """
         Save myself to specified location.
 
         LocalBackend pickles myself to the path defined by experiment_id
         """
+        if getattr(self, '_recording', False):
+            # recorded updates are saved by the process replaying them
+            return self
+
         fname = '{}.pkl'.format(self.experiment_id)
         path = self.cache_dir / fname
         msg = 'Saving Experiment to file: {}'
         logger.info(msg.format(path))
-        pickle.save(self, path)
+        # concurrent trials may save myself at the same time
+        with self._lock:
+            pickle.save(self, path)
         return self
 
     def load(self):
@@ -134,10 +371,46 @@ class LocalBackend(_BaseBackend):
         if path.is_file():
             msg = 'Loading Experiment from file: {}'
             logger.info(msg.format(path))
-            return pickle.load(path)
+            backend = pickle.load(path)
+            # create directories added in later versions
+            backend.initialize_backend()
+            return backend
         else:
             return self
 
+    def start_recording(self):
+        """
+        Start recording updates to be replayed in other process.
+
+        It is used to perform trials in worker processes. Only the parent
+        process saves myself to avoid conflicts.
+        """
+        self._recording = True
+        for manager in (self.trials, self.metrics):
+            manager._records = []
+        return self
+
+    def stop_recording(self):
+        """
+        Stop recording and return recorded updates.
+        """
+        self._recording = False
+        records = []
+        for name in ('trials', 'metrics'):
+            manager = getattr(self, name)
+            for method, args in getattr(manager, '_records', None) or []:
+                records.append((name, method, args))
+            manager._records = None
+        return records
+
+    def replay(self, records):
+        """
+        Replay updates recorded in other process.
+        """
+        for name, method, args in records:
+            getattr(getattr(self, name), method)(*args)
+        return self
+
     def _delete_cache(self):
         """
         Delete cache dir
@@ -1,7 +1,9 @@
 import os
+import re
+import time
 import urllib
 
-from daskperiment.backend.base import _NoSQLBackend
+from daskperiment.backend.base import _NoSQLBackend, get_step_input_key
 from daskperiment.util.log import get_logger
 
 
@@ -105,6 +107,12 @@ class MongoBackend(_NoSQLBackend):
                          'trial_id': trial_id}
         return MongoKey(document_meta, field_name='history')
 
+    def _get_step_log_key(self, trial_id):
+        document_meta = {'experiment_id': self.experiment_id,
+                         'category': 'trial',
+                         'trial_id': trial_id}
+        return MongoKey(document_meta, field_name='step_log')
+
     def _get_metric_key(self, metric_key, trial_id):
         document_meta = {'experiment_id': self.experiment_id,
                          'category': 'metric',
@@ -119,12 +127,55 @@ class MongoBackend(_NoSQLBackend):
                          'trial_id': trial_id}
         return MongoKey(document_meta)
 
+    def _get_persist_blob_key(self, content_hash):
+        document_meta = {'experiment_id': self.experiment_id,
+                         'category': 'persist_blob',
+                         'content_hash': content_hash}
+        return MongoKey(document_meta)
+
+    def _get_chunk_key(self, chunk_id, index):
+        document_meta = {'experiment_id': self.experiment_id,
+                         'category': 'chunk',
+                         'chunk_id': chunk_id,
+                         'index': index}
+        return MongoKey(document_meta)
+
     def _get_step_hash_key(self, key):
         document_meta = {'experiment_id': self.experiment_id,
                          'category': 'step_hash',
                          'input_hash': key}
         return MongoKey(document_meta)
 
+    def _get_step_trial_key(self, key):
+        document_meta = {'experiment_id': self.experiment_id,
+                         'category': 'step_trial',
+                         'step_key': key}
+        return MongoKey(document_meta)
+
+    def _get_step_output_key(self, key):
+        document_meta = {'experiment_id': self.experiment_id,
+                         'category': 'step_output',
+                         'step_key': key}
+        return MongoKey(document_meta)
+
+    def _get_reference_key(self, token):
+        document_meta = {'experiment_id': self.experiment_id,
+                         'category': 'reference',
+                         'token': token}
+        return MongoKey(document_meta)
+
+    def _get_profile_key(self, trial_id):
+        document_meta = {'experiment_id': self.experiment_id,
+                         'category': 'profile',
+                         'trial_id': trial_id}
+        return MongoKey(document_meta)
+
+    def _get_trace_key(self, trial_id):
+        document_meta = {'experiment_id': self.experiment_id,
+                         'category': 'trace',
+                         'trial_id': trial_id}
+        return MongoKey(document_meta)
+
     def _get_code_key(self, trial_id):
         document_meta = {'experiment_id': self.experiment_id,
                          'category': 'code',
@@ -181,6 +232,76 @@ class MongoBackend(_NoSQLBackend):
                                        return_document=ReturnDocument.AFTER)
         return result[key.field_name]
 
+    def exists(self, key):
+        self._validate_key(key)
+        query = dict(key.document_meta)
+        query[key.field_name] = {'$exists': True}
+        return self.collection.find_one(query, {'_id': True}) is not None
+
+    def _get_nbytes(self, key):
+        self._validate_key(key)
+        query = dict(key.document_meta)
+        query[key.field_name] = {'$exists': True}
+        field = '$' + key.field_name
+        pipeline = [{'$match': query},
+                    {'$project': {'nbytes': {'$binarySize': field}}}]
+        for doc in self.collection.aggregate(pipeline):
+            return doc['nbytes']
+        return None
+
+    def getset(self, key, value):
+        from pymongo import ReturnDocument
+        self._validate_key(key)
+        doc = self.collection.find_one_and_update(
+            key.document_meta, {'$set': {key.field_name: value}},
+            projection={key.field_name: True}, upsert=True,
+            return_document=ReturnDocument.BEFORE)
+        try:
+            return doc[key.field_name]
+        except (KeyError, TypeError):
+            # doc may be None
+            return None
+
+    def delete(self, key):
+        self._validate_key(key)
+        return self.collection.update_one(key.document_meta,
+                                          {'$unset': {key.field_name: ''}})
+
+    ################################################
+    # Step hash
+    ################################################
+
+    def load_step_hashes(self, steps):
+        """
+        Load the step hashes of the given step names in one bulk read.
+        Returns a dict of input key and output hash.
+        """
+        if len(steps) == 0:
+            return {}
+        query = self.get_step_hash_key('*')
+        meta = dict(query.document_meta)
+        # input key starts with the step name and the separator
+        prefixes = [re.escape(get_step_input_key(step, '')) for step in steps]
+        meta['input_hash'] = {'$in': [re.compile('^' + prefix)
+                                      for prefix in prefixes]}
+        docs = self.collection.find(meta)
+        return {doc['input_hash']: doc[query.field_name] for doc in docs
+                if query.field_name in doc}
+
+    def save_step_hashes(self, hashes):
+        """
+        Save step hashes (a dict of input key and output hash) in one
+        bulk write.
+        """
+        from pymongo import UpdateOne
+        requests = []
+        for key, value in hashes.items():
+            key = self.get_step_hash_key(key)
+            requests.append(UpdateOne(key.document_meta,
+                                      {'$set': {key.field_name: value}},
+                                      upsert=True))
+        self.collection.bulk_write(requests, ordered=False)
+
     ################################################
     # High level API
     ################################################
@@ -191,3 +312,94 @@ class MongoBackend(_NoSQLBackend):
 
     def _delete_cache(self):
         self.client.drop_database(self.dbname)
+
+    ################################################
+    # Chunked binary
+    ################################################
+
+    def _set_chunks(self, chunk_id, chunks):
+        # chunks are new documents because chunk_id is unique
+        docs = []
+        for index, data in chunks:
+            key = self.get_chunk_key(chunk_id, index)
+            doc = dict(key.document_meta)
+            doc[key.field_name] = data
+            docs.append(doc)
+        self.collection.insert_many(docs, ordered=False)
+
+    def _delete_chunks(self, manifest):
+        # chunks are stored as separate documents like GridFS
+        query = {'experiment_id': self.experiment_id,
+                 'category': 'chunk',
+                 'chunk_id': manifest['id']}
+        self.collection.delete_many(query)
+
+    ################################################
+    # Garbage collection
+    ################################################
+
+    def list_persisted(self):
+        query = self.get_persist_key('*', '*')
+        meta = dict(query.document_meta)
+        meta[query.field_name] = {'$exists': True}
+        fields = {'step': True, 'trial_id': True}
+        return [(doc['step'], doc['trial_id'],
+                 self.get_persist_key(doc['step'], doc['trial_id']))
+                for doc in self.collection.find(meta, fields)]
+
+    def _list_persist_blob_hashes(self):
+        query = self.get_persist_blob_key('*')
+        meta = dict(query.document_meta)
+        meta[query.field_name] = {'$exists': True}
+        fields = {'content_hash': True}
+        return [doc['content_hash']
+                for doc in self.collection.find(meta, fields)]
+
+    ################################################
+    # Step output cache
+    ################################################
+
+    def save_step_output(self, key, data):
+        """
+        Save serialized step output atomically, thus other processes never
+        read partially written output.
+        """
+        # single document update is atomic
+        key = self.get_step_output_key(key)
+        values = {key.field_name: data, 'nbytes': len(data),
+                  'accessed': time.time()}
+        self.collection.update_one(key.document_meta, {'$set': values},
+                                   upsert=True)
+
+    def load_step_output(self, key, ttl=None):
+        """
+        Load serialized step output and update its last access time.
+        Returns None if not exists, or it is not accessed for ttl seconds.
+        """
+        mkey = self.get_step_output_key(key)
+        now = time.time()
+        doc = self.collection.find_one_and_update(
+            mkey.document_meta, {'$set': {'accessed': now}})
+        if doc is None:
+            return None
+        if ttl is not None and now - doc['accessed'] > ttl:
+            self.delete_step_output(key)
+            return None
+        return doc[mkey.field_name]
+
+    def list_step_outputs(self):
+        """
+        Return a list of tuples of (key, nbytes, last access time)
+        """
+        query = {'experiment_id': self.experiment_id,
+                 'category': 'step_output'}
+        fields = {'step_key': True, 'nbytes': True, 'accessed': True}
+        return [(doc['step_key'], doc['nbytes'], doc['accessed'])
+                for doc in self.collection.find(query, fields)]
+
+    def delete_step_output(self, key):
+        """
+        Delete step output. Do nothing if not exists.
+        """
+        key = self.get_step_output_key(key)
+        self.collection.delete_one(key.document_meta)
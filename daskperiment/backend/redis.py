@@ -1,4 +1,6 @@
-from daskperiment.backend.base import _NoSQLBackend
+import time
+
+from daskperiment.backend.base import _NoSQLBackend, get_step_name
 from daskperiment.util.log import get_logger
 
 
@@ -71,12 +73,56 @@ class RedisBackend(_NoSQLBackend):
         return self.build_key(self.experiment_id, 'metric',
                               metric_key, trial_id)
 
+    def _get_step_log_key(self, trial_id):
+        return self.build_key(self.experiment_id, 'step_log', trial_id)
+
     def _get_persist_key(self, step, trial_id):
         return self.build_key(self.experiment_id, 'persist', step, trial_id)
 
+    def _get_persist_blob_key(self, content_hash):
+        return self.build_key(self.experiment_id, 'persist_blob',
+                              content_hash)
+
+    def _get_chunk_key(self, chunk_id, index):
+        return self.build_key(self.experiment_id, 'chunk', chunk_id, index)
+
     def _get_step_hash_key(self, key):
         return self.build_key(self.experiment_id, 'step_hash', key)
 
+    def _get_step_hashes_key(self, step):
+        """
+        Specify the key of a hash which stores step hashes of the step
+        """
+        return self.build_key(self.experiment_id, 'step_hashes', step)
+
+    def _get_step_hashes_migrated_key(self):
+        """
+        Specify the key marking that step hashes stored by older versions
+        are migrated
+        """
+        return self.build_key(self.experiment_id, 'step_hashes_migrated')
+
+    def _get_step_trial_key(self, key):
+        return self.build_key(self.experiment_id, 'step_trial', key)
+
+    def _get_step_output_key(self, key):
+        return self.build_key(self.experiment_id, 'step_output', key)
+
+    def _get_step_output_index_key(self, field):
+        """
+        Specify the key to save last access time and size of step outputs
+        """
+        return self.build_key(self.experiment_id, 'step_output_index', field)
+
+    def _get_reference_key(self, token):
+        return self.build_key(self.experiment_id, 'reference', token)
+
+    def _get_profile_key(self, trial_id):
+        return self.build_key(self.experiment_id, 'profile', trial_id)
+
+    def _get_trace_key(self, trial_id):
+        return self.build_key(self.experiment_id, 'trace', trial_id)
+
     def _get_code_key(self, trial_id):
         return self.build_key(self.experiment_id, 'code', trial_id)
 
@@ -107,6 +153,25 @@ class RedisBackend(_NoSQLBackend):
     def increment(self, key):
         return self.client.incr(key)
 
+    def exists(self, key):
+        self._validate_key(key)
+        return self.client.exists(key) > 0
+
+    def _get_nbytes(self, key):
+        self._validate_key(key)
+        nbytes = self.client.strlen(key)
+        if nbytes == 0 and not self.exists(key):
+            return None
+        return nbytes
+
+    def getset(self, key, value):
+        self._validate_key(key)
+        return self.client.getset(key, value)
+
+    def delete(self, key):
+        self._validate_key(key)
+        return self.client.delete(key)
+
     ################################################
     # High level API
     ################################################
@@ -114,9 +179,177 @@ class RedisBackend(_NoSQLBackend):
     def _finalize_text(self, value):
         return value.decode('utf-8')
 
+    def _set_chunks(self, chunk_id, chunks):
+        # chunks are written in a single round trip
+        pipe = self.client.pipeline(transaction=False)
+        for index, data in chunks:
+            pipe.set(self.get_chunk_key(chunk_id, index), data)
+        pipe.execute()
+
+    def _delete_chunks(self, manifest):
+        keys = [self.get_chunk_key(manifest['id'], i)
+                for i in range(manifest['chunks'])]
+        self.client.delete(*keys)
+
     def _delete_cache(self):
         self.client.flushdb()
 
+    ################################################
+    # Step output cache
+    ################################################
+
+    def save_step_output(self, key, data):
+        """
+        Save serialized step output atomically, thus other processes never
+        read partially written output.
+        """
+        # MULTI / EXEC transaction
+        pipe = self.client.pipeline(transaction=True)
+        pipe.set(self.get_step_output_key(key), data)
+        pipe.zadd(self._get_step_output_index_key('accessed'),
+                  {key: time.time()})
+        pipe.hset(self._get_step_output_index_key('nbytes'), key, len(data))
+        pipe.execute()
+
+    def load_step_output(self, key, ttl=None):
+        """
+        Load serialized step output and update its last access time.
+        Returns None if not exists, or it is not accessed for ttl seconds.
+        """
+        accessed_key = self._get_step_output_index_key('accessed')
+        now = time.time()
+        if ttl is not None:
+            accessed = self.client.zscore(accessed_key, key)
+            if accessed is not None and now - accessed > ttl:
+                self.delete_step_output(key)
+                return None
+
+        data = self.client.get(self.get_step_output_key(key))
+        if data is not None:
+            # update only existing member (XX)
+            self.client.zadd(accessed_key, {key: now}, xx=True)
+        return data
+
+    def list_step_outputs(self):
+        """
+        Return a list of tuples of (key, nbytes, last access time)
+        """
+        accessed = self.client.zrange(
+            self._get_step_output_index_key('accessed'), 0, -1,
+            withscores=True)
+        nbytes = self.client.hgetall(
+            self._get_step_output_index_key('nbytes'))
+        results = []
+        for key, score in accessed:
+            size = nbytes.get(key, 0)
+            if isinstance(key, bytes):
+                key = key.decode('utf-8')
+            results.append((key, int(size), score))
+        return results
+
+    def delete_step_output(self, key):
+        """
+        Delete step output. Do nothing if not exists.
+        """
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(self.get_step_output_key(key))
+        pipe.zrem(self._get_step_output_index_key('accessed'), key)
+        pipe.hdel(self._get_step_output_index_key('nbytes'), key)
+        pipe.execute()
+
+    ################################################
+    # Step hash
+    ################################################
+
+    def load_step_hashes(self, steps):
+        """
+        Load the step hashes of the given step names in one bulk read.
+        Returns a dict of input key and output hash.
+        """
+        if len(steps) == 0:
+            return {}
+        # step hashes are stored in a hash per step
+        pipe = self.client.pipeline(transaction=False)
+        pipe.exists(self._get_step_hashes_migrated_key())
+        for step in steps:
+            pipe.hgetall(self._get_step_hashes_key(step))
+        migrated, *step_hashes = pipe.execute()
+
+        if not migrated:
+            self._migrate_step_hashes()
+            pipe = self.client.pipeline(transaction=False)
+            for step in steps:
+                pipe.hgetall(self._get_step_hashes_key(step))
+            step_hashes = pipe.execute()
+
+        results = {}
+        for hashes in step_hashes:
+            for key, value in hashes.items():
+                results[key.decode('utf-8')] = self._finalize_text(value)
+        return results
+
+    def _migrate_step_hashes(self, batch_size=1000):
+        """
+        Move step hashes stored per input key by older versions to the
+        hashes per step. Keys are scanned incrementally (not KEYS), and it
+        is performed once per experiment.
+        """
+        query = self.get_step_hash_key('*')
+        # remove wildcard
+        prefix = len(query) - 1
+        keys = list(self.client.scan_iter(match=query, count=batch_size))
+        for start in range(0, len(keys), batch_size):
+            batch = keys[start:start + batch_size]
+            values = self.client.mget(batch)
+            pipe = self.client.pipeline(transaction=False)
+            for key, value in zip(batch, values):
+                if isinstance(key, bytes):
+                    key = key.decode('utf-8')
+                input_key = key[prefix:]
+                if value is None:
+                    continue
+                try:
+                    step = get_step_name(input_key)
+                except ValueError:
+                    continue
+                # hashes saved by newer versions are not overwritten
+                pipe.hsetnx(self._get_step_hashes_key(step), input_key,
+                            value)
+            pipe.delete(*batch)
+            pipe.execute()
+        self.client.set(self._get_step_hashes_migrated_key(), 1)
+        if len(keys) > 0:
+            msg = 'Migrated {} step hashes stored by older versions'
+            logger.info(msg.format(len(keys)))
+
+    def save_step_hashes(self, hashes):
+        """
+        Save step hashes (a dict of input key and output hash) in one
+        bulk write.
+        """
+        pipe = self.client.pipeline(transaction=False)
+        for key, value in hashes.items():
+            pipe.hset(self._get_step_hashes_key(get_step_name(key)),
+                      key, value)
+        pipe.execute()
+
+    ################################################
+    # Garbage collection
+    ################################################
+
+    def list_persisted(self):
+        results = []
+        for key in self.keys(self.get_persist_key('*', '*')):
+            step, trial_id = key.split(self._SEP)[-2:]
+            results.append((step, int(trial_id), key))
+        return results
+
+    def _list_persist_blob_hashes(self):
+        query = self.get_persist_blob_key('*')
+        # remove wildcard
+        prefix = len(query) - 1
+        return [key[prefix:] for key in self.keys(query)]
+
     ################################################
     # Redis unique
     ################################################
@@ -9,3 +9,35 @@ import daskperiment
 def board(port, experiment):
     ex = daskperiment.Experiment(experiment)
     ex.start_dashboard(port=port)
+
+
+@click.command()
+@click.option('--backend', default='local',
+              help='Backend of the experiment, "local" or URI.')
+@click.option('--keep-last', type=int, default=None,
+              help='Keep artifacts of the latest N trials.')
+@click.option('--keep-best', type=int, default=None,
+              help='Keep artifacts of the best K trials by their results.')
+@click.option('--max-bytes', type=int, default=None,
+              help='Remove artifacts of the oldest trials until the total '
+                   'bytes fits within the value.')
+@click.option('--minimize', is_flag=True,
+              help='Regard smaller result as better in --keep-best.')
+@click.option('--dry-run/--no-dry-run', default=True,
+              help='Only report artifacts to be removed (default).')
+@click.argument('experiment')
+def gc(backend, keep_last, keep_best, max_bytes, minimize, dry_run,
+       experiment):
+    ex = daskperiment.Experiment(experiment, backend=backend)
+    removed = ex.gc(keep_last=keep_last, keep_best=keep_best,
+                    max_bytes=max_bytes, minimize=minimize, dry_run=dry_run)
+
+    summary = removed.groupby('Category')['Bytes'].sum()
+    for category, nbytes in summary.items():
+        click.echo('{}: {} bytes'.format(category, nbytes))
+    trials = removed['Trial ID'].dropna().nunique()
+    if dry_run:
+        msg = 'Reclaimable {} bytes ({} artifacts of {} trials, dry run)'
+    else:
+        msg = 'Reclaimed {} bytes ({} artifacts of {} trials)'
+    click.echo(msg.format(int(removed['Bytes'].sum()), len(removed), trials))
@@ -0,0 +1,321 @@
+import collections
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from dask.sizeof import sizeof
+
+import daskperiment.io.pickle as pickle
+from daskperiment.util.log import get_logger
+
+
+logger = get_logger(__name__)
+
+
+def _copy(value):
+    """
+    Copy numpy arrays and pandas objects which may be modified in-place.
+    Other objects are returned as they are.
+    """
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    elif isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=True)
+    return value
+
+
+class StepCache(object):
+    """
+    Process-local cache of experiment step outputs.
+
+    Outputs are evicted in LRU order when the total size exceeds max_bytes.
+    Caching is disabled if max_bytes is 0.
+
+    numpy arrays and pandas objects are copied when they are stored and
+    loaded, thus in-place modification by steps doesn't affect cached
+    outputs. Other objects are shared.
+    """
+
+    def __init__(self, max_bytes=0):
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        # key -> (value, nbytes), ordered from least recently used
+        self._data = collections.OrderedDict()
+        self.nbytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __repr__(self):
+        fmt = 'StepCache(count: {}, nbytes: {}, max_bytes: {})'
+        return fmt.format(len(self._data), self.nbytes, self.max_bytes)
+
+    def __getstate__(self):
+        # cached outputs are process-local
+        return {'max_bytes': self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(max_bytes=state['max_bytes'])
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def resize(self, max_bytes):
+        """
+        Update memory budget evicting outputs if needed
+        """
+        if max_bytes < 0:
+            msg = 'Cache size must be 0 or positive, given: {}'
+            raise ValueError(msg.format(max_bytes))
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def get(self, key):
+        """
+        Get cached output. Returns a tuple of (found, value).
+        """
+        if not self.enabled:
+            return False, None
+
+        with self._lock:
+            try:
+                value, _ = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+        return True, _copy(value)
+
+    def put(self, key, value):
+        """
+        Store output. Output larger than the budget is not stored.
+        """
+        if not self.enabled:
+            return False
+
+        nbytes = sizeof(value)
+        if nbytes > self.max_bytes:
+            msg = 'Step output is too large to be cached: {} bytes'
+            logger.debug(msg.format(nbytes))
+            return False
+
+        value = _copy(value)
+        with self._lock:
+            if key in self._data:
+                self.nbytes -= self._data.pop(key)[1]
+            self._data[key] = (value, nbytes)
+            self.nbytes += nbytes
+            self._evict()
+        return True
+
+    def _evict(self):
+        # must be called under the lock
+        while self.nbytes > self.max_bytes and len(self._data) > 0:
+            _, (_, nbytes) = self._data.popitem(last=False)
+            self.nbytes -= nbytes
+            self.evictions += 1
+
+    def clear(self):
+        """
+        Remove all cached outputs (counters are kept)
+        """
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def info(self):
+        """
+        Return cache statistics
+        """
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'count': len(self._data),
+                    'nbytes': self.nbytes,
+                    'max_bytes': self.max_bytes}
+
+
+class BackendStepCache(object):
+    """
+    Cache of experiment step outputs stored through the backend.
+
+    Serialized outputs are shared between processes using the same backend.
+    Outputs which are not accessed for ttl seconds are expired, and
+    outputs are evicted in LRU order when the total size exceeds max_bytes.
+    Caching is disabled if max_bytes is 0.
+
+    Stored outputs are listed from the backend only when the running total
+    of output bytes exceeds max_bytes, every scan_interval puts (to count
+    outputs stored by other processes) or when ttl seconds elapsed since
+    the last listing.
+    """
+
+    scan_interval = 64
+
+    def __init__(self, backend, max_bytes=0, ttl=None):
+        self.backend = backend
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._reset_total()
+
+    def _reset_total(self):
+        # running total of output bytes, None if not listed yet
+        self._nbytes = None
+        self._puts = 0
+        # time of the last listing
+        self._scanned = 0
+
+    def __repr__(self):
+        fmt = 'BackendStepCache(backend: {}, max_bytes: {}, ttl: {})'
+        return fmt.format(self.backend, self.max_bytes, self.ttl)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # do not pickle threading Lock
+        state.pop('_lock', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        # other process may store outputs after pickled
+        self._reset_total()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def resize(self, max_bytes, ttl=None):
+        """
+        Update memory budget and TTL evicting outputs if needed
+        """
+        if max_bytes < 0:
+            msg = 'Cache size must be 0 or positive, given: {}'
+            raise ValueError(msg.format(max_bytes))
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        if self.enabled:
+            self.evict()
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, key):
+        """
+        Get cached output. Returns a tuple of (found, value).
+        """
+        if not self.enabled:
+            return False, None
+
+        data = self.backend.load_step_output(key, ttl=self.ttl)
+        if data is None:
+            self._count('misses')
+            return False, None
+        self._count('hits')
+        return True, pickle.loads(data)
+
+    def put(self, key, value):
+        """
+        Store output. Output larger than the budget is not stored.
+        """
+        if not self.enabled:
+            return False
+
+        data = pickle.dumps(value)
+        if len(data) > self.max_bytes:
+            msg = 'Step output is too large to be cached: {} bytes'
+            logger.debug(msg.format(len(data)))
+            return False
+
+        self.backend.save_step_output(key, data)
+        if self._should_evict(len(data)):
+            self.evict()
+        return True
+
+    def _should_evict(self, nbytes):
+        """
+        Add the bytes to the running total, and return whether stored
+        outputs must be listed to evict
+        """
+        with self._lock:
+            self._puts += 1
+            if self._nbytes is None:
+                return True
+            # overwritten output is counted twice, which only makes
+            # the listing earlier
+            self._nbytes += nbytes
+            if self._nbytes > self.max_bytes:
+                return True
+            if self._puts % self.scan_interval == 0:
+                return True
+            return (self.ttl is not None and
+                    time.time() - self._scanned > self.ttl)
+
+    def evict(self):
+        """
+        Delete expired outputs, then least recently used outputs until
+        the total size fits to the budget.
+        """
+        entries = sorted(self.backend.list_step_outputs(),
+                         key=lambda entry: entry[2])
+        now = time.time()
+        nbytes = sum(entry[1] for entry in entries)
+
+        deleted = 0
+        for key, size, accessed in entries:
+            expired = self.ttl is not None and now - accessed > self.ttl
+            if not expired and nbytes <= self.max_bytes:
+                # entries are sorted by last access time
+                break
+            # other processes may delete the same output concurrently
+            self.backend.delete_step_output(key)
+            nbytes -= size
+            deleted += 1
+
+        with self._lock:
+            self.evictions += deleted
+            self._nbytes = nbytes
+            self._scanned = now
+        return deleted
+
+    def clear(self):
+        """
+        Remove all cached outputs (counters are kept)
+        """
+        for key, _, _ in self.backend.list_step_outputs():
+            self.backend.delete_step_output(key)
+        with self._lock:
+            self._nbytes = 0
+
+    def info(self):
+        """
+        Return cache statistics
+        """
+        entries = self.backend.list_step_outputs()
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'count': len(entries),
+                    'nbytes': sum(entry[1] for entry in entries),
+                    'max_bytes': self.max_bytes,
+                    'ttl': self.ttl}
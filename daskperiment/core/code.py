@@ -3,6 +3,7 @@ import os
 
 from daskperiment.backend import init_backend
 from daskperiment.util.diff import unified_diff
+from daskperiment.util.hashing import get_hash
 from daskperiment.util.log import get_logger
 from daskperiment.util.text import trim_indent
 
@@ -23,12 +24,15 @@ class CodeManager(object):
 
     def __getstate__(self):
         state = {}
-        # Do not pickle self.codes because it is overwritten after load
-        state['history'] = self.history
+        # pickled with Experiment to perform trials in worker processes
+        state['backend'] = self.backend
+        state['codes'] = list(self.codes)
+        state['history'] = self.history.copy()
         return state
 
     def __setstate__(self, state):
-        self.codes = []
+        self.backend = state.get('backend')
+        self.codes = state.get('codes', [])
         self.history = state['history']
 
     def _get_code_context(self, func):
@@ -69,6 +73,12 @@ class CodeManager(object):
             for d in unified_diff(previous, current):
                 logger.warning(d)
 
+    def get_code_hash(self, key):
+        """
+        Get hash of the registered code context
+        """
+        return get_hash(self.history.get(key, ''))
+
     def get_code(self, trial_id=None):
         if trial_id is None:
             return self.describe()
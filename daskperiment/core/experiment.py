@@ -1,17 +1,41 @@
+import collections
+import concurrent.futures
+import contextlib
 import functools
+import json
 
 import numpy as np
 import pandas as pd
 import dask
 
+from dask.base import get_scheduler
 from dask.delayed import Delayed, DelayedLeaf
 
 from daskperiment.backend import init_backend
+from daskperiment.core.cache import BackendStepCache, StepCache
 from daskperiment.core.code import CodeManager
 from daskperiment.environment.environment import Environment
-from daskperiment.core.errors import TrialIDNotFoundError
-from daskperiment.core.parameter import ParameterManager
+from daskperiment.core.errors import LockedTrialError, TrialIDNotFoundError
+from daskperiment.core.graph import (TRIAL_CONTEXT, TrialContext,
+                                     TrialFailure, add_alias, annotate_layer,
+                                     build_batch_graph, get_task_function,
+                                     get_trial_key, is_local_scheduler,
+                                     resolve_graph, substitute_tasks,
+                                     uniquify_graph)
+from daskperiment.core.parameter import (ParameterManager,
+                                         ParameterReference,
+                                         expand_parameter_grid)
 from daskperiment.core.parser import parse_command_arguments
+from daskperiment.core.profiler import (create_profiler, to_profile_frame,
+                                        to_pstats)
+from daskperiment.core.purity import PurityCheck, validate_purity
+from daskperiment.core.retention import RetentionPolicy, collect_garbage
+from daskperiment.core.runner import ProcessPoolTrialRunner
+from daskperiment.core.steplog import StepTimer, to_step_log_frame
+from daskperiment.core.writer import PersistWriter
+from daskperiment.io.compression import create_compression
+from daskperiment.io.serializer import get_serializer
+from daskperiment.util.hashing import get_hash
 from daskperiment.util.log import get_logger
 from daskperiment.util.text import validate_identifier
 
@@ -23,9 +47,10 @@ class ExperimentFunction(DelayedLeaf):
     """
     Delayed function created with `Experiment.__call__` decorator.
     """
-    __slots__ = ('_experiment', '_obj', '_key', '_pure', '_nout')
+    __slots__ = ('_experiment', '_obj', '_key', '_pure', '_nout',
+                 '_annotations')
 
-    def __init__(self, experiment, dask_obj):
+    def __init__(self, experiment, dask_obj, annotations=None):
         self._experiment = experiment
 
         self._obj = dask_obj._obj
@@ -33,15 +58,25 @@ class ExperimentFunction(DelayedLeaf):
         self._pure = dask_obj._pure
         self._nout = dask_obj._nout
 
+        # dask annotations attached to the layer of each call
+        self._annotations = annotations
+
+    def __call__(self, *args, **kwargs):
+        from dask.delayed import call_function
+        # pass trial context to bind the trial during execution
+        kwargs[TRIAL_CONTEXT] = self._experiment._trial_context
+        res = call_function(self._obj, self._key, args, kwargs,
+                            pure=self._pure, nout=self._nout)
+        # layers created for arguments are not annotated
+        return annotate_layer(res, self._annotations)
+
 
 class ResultFunction(ExperimentFunction):
     """
     Delayed function created with `Experiment.result` decorator.
     """
     def __call__(self, *args, **kwargs):
-        from dask.delayed import call_function
-        res = call_function(self._obj, self._key, args, kwargs,
-                            pure=self._pure, nout=self._nout)
+        res = super().__call__(*args, **kwargs)
         return Result(self._experiment, res)
 
 
@@ -62,9 +97,129 @@ class Result(Delayed):
         self._experiment._result = True
         self._compute_maybe_file()
 
-    def compute(self, seed=None, **kwargs):
+    def compute(self, seed=None, parameters=None, resume_from=None,
+                profile=None, trace=None, **kwargs):
+        """
+        Perform a trial.
+
+        Prameters
+        ---------
+        seed: int, optional
+           Random seed.
+        parameters: dict, optional
+           Parameter values used only in the trial. Parameters which are not
+           specified use values set by Experiment.set_parameters. It is
+           useful to perform trials concurrently from multiple threads.
+        resume_from: int, optional
+           Trial ID to be resumed. The trial is performed with the same
+           parameters and seed of the specified trial, and persisted steps
+           are loaded from the trial instead of being executed. It is
+           recorded as a new trial linked to the specified trial.
+        profile: bool or str, optional
+           Perform the trial under the profiler. True or 'cprofile' to use
+           cProfile, 'sampling' to use statistical profiler. If not
+           provided, the experiment's default is used.
+        trace: bool, optional
+           Record spans of the trial as Chrome trace. If not provided, the
+           experiment's default is used.
+
+        Returns
+        -------
+        object: result
+        """
+        if resume_from is not None:
+            if parameters is not None:
+                msg = 'Unable to specify parameters to resume the trial'
+                raise ValueError(msg)
+            exp = self._experiment
+            exp._check_trial_id(resume_from)
+            parameters = exp._trials.load_parameters(resume_from)
+            parameters = {k: exp.load_reference(v)
+                          if isinstance(v, ParameterReference) else v
+                          for k, v in parameters.items()}
+            if seed is None:
+                seed = exp._trials.load_result(resume_from)['Seed']
+
         # create trial instance actually executed
-        task = TrialTask(self)
+        task = TrialTask(self, parameters=parameters,
+                         resume_from=resume_from)
+        return task.compute(seed=seed, profile=profile, trace=trace,
+                            **kwargs)
+
+    def submit(self, seed=None, parameters=None, executor=None, **kwargs):
+        """
+        Submit a trial to be performed asynchronously.
+
+        Trial ID is fixed when the trial is submitted, and its history is
+        saved when the trial is finished.
+
+        Prameters
+        ---------
+        seed: int, optional
+           Random seed.
+        parameters: dict, optional
+           Parameter values used only in the trial.
+        executor: concurrent.futures.Executor or distributed.Client, optional
+           Executor to perform the trial. If not provided, experiment's
+           default ThreadPoolExecutor is used. If Client is provided, the
+           trial's graph is computed on the Client and its keys are
+           distinguished per trial.
+
+        Returns
+        -------
+        concurrent.futures.Future: future
+           Future of the trial result. Its trial_id attribute specifies the
+           Trial ID.
+        """
+        if executor is None:
+            executor = self._experiment._executor
+        task = TrialTask(self, parameters=parameters)
+        return task.submit(executor, seed=seed, **kwargs)
+
+    def compute_async(self, seed=None, parameters=None, executor=None,
+                      **kwargs):
+        """
+        Submit a trial and return an awaitable of asyncio.
+
+        The trial is submitted immediately, thus multiple trials can be
+        performed concurrently before awaiting them.
+
+        Prameters
+        ---------
+        seed: int, optional
+           Random seed.
+        parameters: dict, optional
+           Parameter values used only in the trial.
+        executor: concurrent.futures.Executor or distributed.Client, optional
+           Executor to perform the trial. If not provided, experiment's
+           default ThreadPoolExecutor is used.
+
+        Returns
+        -------
+        asyncio.Future: future
+        """
+        import asyncio
+        future = self.submit(seed=seed, parameters=parameters,
+                             executor=executor, **kwargs)
+        return asyncio.wrap_future(future)
+
+    def compute_many(self, parameters, seed=None, **kwargs):
+        """
+        Perform multiple trials in a single computation graph.
+
+        Prameters
+        ---------
+        parameters: list of dict
+           Parameter values per trial. Parameters which are not specified
+           use current values.
+        seed: int, optional
+           Random seed shared between trials.
+
+        Returns
+        -------
+        list: results
+        """
+        task = TrialBatch(self, parameters)
         return task.compute(seed=seed, **kwargs)
 
     def _compute_maybe_file(self):
@@ -77,47 +232,177 @@ class Result(Delayed):
             self.compute(seed=seed)
 
 
+def _is_client(executor):
+    """
+    Check whether the executor is dask.distributed Client
+    """
+    try:
+        from distributed import Client
+    except ImportError:
+        return False
+    return isinstance(executor, Client)
+
+
 class TrialTask(Delayed):
     """
     Delayed instance corresponding to actual trial execution.
     All parameters are resolved in computation graph.
     """
-    __slots__ = ('_experiment', '_key', 'dask', '_length')
+    __slots__ = ('_experiment', '_key', 'dask', '_length', '_parameters',
+                 '_resume_from')
 
-    def __init__(self, result):
+    def __init__(self, result, parameters=None, resume_from=None):
         assert isinstance(result, Result)
         self._experiment = result._experiment
+        # Trial ID whose persisted steps are loaded
+        self._resume_from = resume_from
 
-        # TODO: key should be uniquified for queueing
+        # key is uniquified per trial when the trial is started
         self._key = result._key
 
-        self.dask = self._resolve_parameters(result.dask)
+        # fix parameters when the trial is created,
+        # because other threads may update experiment parameters
+        if parameters is None:
+            parameters = {}
+        self._parameters = self._experiment._parameters.bind(**parameters)
+
+        # parameters are resolved when the trial is started
+        self.dask = result.dask
         self._length = result._length
 
-    def _resolve_parameters(self, dsk):
+    def _resolve_parameters(self, dsk, trial_id):
         """
-        Update dask graph resolving parameter value
+        Update dask graph resolving parameter values and trial context.
+
+        HighLevelGraph is kept as it is except for layers to be resolved.
         """
-        # TODO: handle HighLevelGraph without converting to dict?
-        result = dict(dsk)
-        parameters = self._experiment._parameters.to_dask_dict()
+        values = self._parameters.to_dask_dict()
+        values[self._experiment._trial_context._key] = (trial_id, )
+        return resolve_graph(dsk, values)
 
-        result.update(parameters)
-        return result
+    def _load_persisted_steps(self, dsk, trial_id):
+        """
+        Replace persisted steps in the graph with the results persisted in
+        the resumed trial. The current trial refers to the loaded results
+        without storing them again.
+        """
+        exp = self._experiment
+        resume_from = self._resume_from
+
+        # persisted result is not identical if the step is called
+        # multiple times in a trial
+        steps = collections.Counter()
+        for task in dsk.values():
+            func = get_task_function(task)
+            if getattr(func, '_persist', False):
+                steps[func.__name__] += 1
+
+        def load(key, task):
+            func = get_task_function(task)
+            if not getattr(func, '_persist', False):
+                return False, None
+            step = func.__name__
+            if steps[step] > 1:
+                msg = ('Unable to resume step called multiple times: '
+                       '(step: {})')
+                logger.info(msg.format(step))
+                return False, None
+
+            backend = exp._backend
+            source_key = backend.get_persist_key(step, resume_from)
+            try:
+                result = backend.load_persisted(source_key)
+            except TrialIDNotFoundError:
+                return False, None
+
+            msg = 'Resumed persisted result: (step: {}, trial id: {})'
+            logger.info(msg.format(step, resume_from))
+            persist_key = backend.get_persist_key(step, trial_id)
+            reference = backend.get_persisted_reference(source_key)
+            if reference is not None:
+                # refer to the result stored by its content hash
+                backend.link_persisted(persist_key, reference)
+            else:
+                # persisted by older versions
+                persist_format = getattr(func, '_persist_format', None)
+                backend.save_persisted(persist_key, result,
+                                       format=persist_format)
+            return True, result
+
+        dsk, _ = substitute_tasks(dsk, self._key, load)
+        return dsk
+
+    def _uniquify_key(self, trial_id, shared=False):
+        """
+        Add an alias of the result key distinguished by trial id. All the
+        keys are renamed if the scheduler is shared with other trials.
+        """
+        key = get_trial_key(self._key, trial_id)
+        if shared:
+            self.dask = uniquify_graph(self.dask, trial_id)
+        else:
+            self.dask = add_alias(self.dask, self._key, key)
+        self._key = key
 
-    def compute(self, seed=None, **kwargs):
+    def submit(self, executor, seed=None, **kwargs):
+        """
+        Submit myself to the executor reserving Trial ID.
+
+        If the executor is dask.distributed Client, the trial is performed
+        on the experiment's default executor and its graph is computed on
+        the Client.
+        """
+        exp = self._experiment
+        if _is_client(executor):
+            kwargs.setdefault('scheduler', executor)
+            executor = exp._executor
+        # when myself is not executable, immediately raise
+        # (do not store history)
+        exp.check_executable(parameters=self._parameters)
+
+        trial_id = exp._trials.reserve()
+        msg = 'Submitted Experiment (trial id={})'
+        logger.info(msg.format(trial_id))
+
+        future = executor.submit(self.compute, seed=seed,
+                                 trial_id=trial_id, **kwargs)
+        future.trial_id = trial_id
+        return future
+
+    def compute(self, seed=None, trial_id=None, profile=None, trace=None,
+                **kwargs):
         # increment trial id before experiment start
         exp = self._experiment
 
         # when myself is not executable, immediately raise
         # (do not store history)
-        exp.check_executable()
+        exp.check_executable(parameters=self._parameters)
+        if profile is None:
+            profile = exp._profile
+        profiler = create_profiler(profile)
+        if trace is None:
+            trace = exp._trace
 
         # fix current_trial_id
-        with exp._trials.start(exp, seed=seed) as trial_state:
+        with exp._trials.start(exp, seed=seed, parameters=self._parameters,
+                               trial_id=trial_id,
+                               resumed_from=self._resume_from,
+                               profiler=profiler,
+                               trace=trace) as trial_state:
+            trial_id = trial_state.current_trial_id
+            self.dask = self._resolve_parameters(self.dask, trial_id)
             try:
+                if self._resume_from is not None:
+                    self.dask = self._load_persisted_steps(self.dask,
+                                                           trial_id)
+                get = get_scheduler(scheduler=kwargs.get('scheduler'),
+                                    collections=[self])
+                self._uniquify_key(trial_id,
+                                   shared=not is_local_scheduler(get))
                 # actual computation
                 result = super().compute(**kwargs)
+                # the trial fails if persisted steps are not written
+                trial_state.wait_persist()
 
                 trial_state.save_result(result=result, success=True,
                                         description=np.nan)
@@ -130,33 +415,213 @@ class TrialTask(Delayed):
                 raise
 
 
-def wrap_result(experiment, func, persist=False):
+class TrialBatch(object):
+    """
+    Multiple trials executed in a single computation graph.
+
+    Steps which don't depend on parameters different between trials are
+    computed only once and shared.
+    """
+
+    def __init__(self, result, parameters):
+        assert isinstance(result, Result)
+        self._experiment = result._experiment
+        self._result = result
+
+        # ParameterManager per trial
+        self._parameters = [self._experiment._parameters.bind(**p)
+                            for p in parameters]
+
+    def compute(self, seed=None, **kwargs):
+        exp = self._experiment
+        if len(self._parameters) == 0:
+            return []
+
+        # when any of trials is not executable, immediately raise
+        # (do not store history)
+        for parameters in self._parameters:
+            parameters._check_all_defined()
+
+        with exp._trials.start_batch(exp, self._parameters,
+                                     seed=seed) as batch_state:
+            parameters = [p.to_dask_dict() for p in self._parameters]
+            dsk, keys = build_batch_graph(self._result.dask,
+                                          self._result._key,
+                                          parameters,
+                                          batch_state.trial_ids,
+                                          exp._trials,
+                                          exp._trial_context._key)
+
+            get = get_scheduler(scheduler=kwargs.get('scheduler'))
+            if not is_local_scheduler(get):
+                # shared tasks are distinguished by the first trial
+                dsk = uniquify_graph(dsk, batch_state.trial_ids[0])
+                keys = [get_trial_key(k, batch_state.trial_ids[0])
+                        for k in keys]
+
+            try:
+                # actual computation in a single scheduler call
+                results = dask.compute(*[Delayed(k, dsk) for k in keys],
+                                       **kwargs)
+            except Exception as e:
+                description = '{}({})'.format(e.__class__.__name__, e)
+                logger.error('Experiment failed: {}'.format(description))
+                for trial_state in batch_state.trial_states:
+                    trial_state.save_result(result=None, success=False,
+                                            description=description)
+                raise
+
+            failure = None
+            for trial_state, result in zip(batch_state.trial_states,
+                                           results):
+                if not isinstance(result, TrialFailure):
+                    try:
+                        trial_state.wait_persist()
+                    except Exception as e:
+                        result = TrialFailure(e)
+                if isinstance(result, TrialFailure):
+                    msg = 'Experiment failed (trial id={}): {}'
+                    logger.error(msg.format(trial_state.current_trial_id,
+                                            result.description))
+                    trial_state.save_result(result=None, success=False,
+                                            description=result.description)
+                    if failure is None:
+                        failure = result
+                else:
+                    trial_state.save_result(result=result, success=True,
+                                            description=np.nan)
+
+        if failure is not None:
+            raise failure.exception
+        return list(results)
+
+
+def wrap_result(experiment, func, persist=False, purity=None,
+                persist_format=None, cache=True):
     """
     Persist (cache) an intermediate step result
     """
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        # execute function
-        result = func(*args, **kwargs)
+        trial_ids = kwargs.pop(TRIAL_CONTEXT, None)
+        if trial_ids is None:
+            # not in trial
+            return _execute_step(experiment, func, args, kwargs,
+                                 persist=persist, purity=purity,
+                                 persist_format=persist_format,
+                                 cache=cache)
+        # dask worker threads may be shared between concurrent trials
+        with experiment._trials.bind(trial_ids), \
+                experiment._profile_step(trial_ids):
+            return _execute_step(experiment, func, args, kwargs,
+                                 persist=persist, purity=purity,
+                                 persist_format=persist_format,
+                                 cache=cache)
+
+    # used to find persisted steps in the graph
+    wrapper._persist = persist
+    wrapper._persist_format = persist_format
+    return wrapper
 
-        # TODO: write step log
 
-        # check the function is pure
-        experiment._trials.maybe_pure(func, (args, kwargs), result)
+def _execute_step(experiment, func, args, kwargs, persist=False,
+                  purity=None, persist_format=None, cache=True):
+    """
+    Execute an experiment step
+    """
+    step = func.__name__
+    if purity is None:
+        purity = experiment._purity
+    in_trial = experiment._trials.in_trial()
+
+    with StepTimer() as timer, experiment._span(step, 'step'):
+        found = False
+        input_hash = step_key = None
+        if experiment._use_step_key(persist=persist, cache=cache):
+            with timer.hashing(), experiment._span('hash inputs', 'step'):
+                input_hash = get_hash(*args, **kwargs)
+            step_key = experiment._get_step_key(step, input_hash)
+
+            with experiment._span('load previous step', 'cache'):
+                found, result = experiment._load_previous_step(
+                    step, step_key, persist=persist, cache=cache)
+
+        check = None
+        if not found:
+            # execute function
+            with experiment._span('compute', 'step'):
+                result = func(*args, **kwargs)
+
+            if purity != 'off':
+                check = PurityCheck(func, args, kwargs, result, purity,
+                                    input_hash=input_hash)
+            if check is not None and (purity != 'async' or not in_trial):
+                # check the function is pure
+                with timer.hashing(), \
+                        experiment._span('check purity', 'backend'):
+                    check.run(experiment._trials)
+            if step_key is not None and cache:
+                with experiment._span('save cache', 'cache'):
+                    experiment._step_cache.put(step_key, result)
+                    experiment._backend_cache.put(step_key, result)
 
         # save if persist
         if persist:
-            experiment._save_persist(func.__name__, result)
-        return result
+            with experiment._span('save persist', 'backend'):
+                experiment._save_persist(step, result, step_key,
+                                         format=persist_format)
+
+    if in_trial:
+        trial_ids = experiment._trials.current_trial_ids
+        record = timer.record(step, result, from_cache=found)
+        experiment._trials.append_step_log(trial_ids, record)
+        if check is not None and purity == 'async':
+            # hash after the step returns
+            experiment._trials.submit_purity_check(trial_ids, check,
+                                                   record=record)
+    return result
+
+
+def _load_persisted(backend, key, columns):
+    """
+    Load persisted result, used in Delayed
+    """
+    return backend.load_persisted(key, columns=columns)
 
-    return wrapper
+
+def _stack_persisted(results):
+    """
+    Stack persisted results of trials to a single object
+    """
+    values = list(results.values())
+    if len(values) == 0:
+        return pd.Series([], index=pd.Index([], name='Trial ID'))
+
+    if all(isinstance(v, np.ndarray) for v in values):
+        shapes = set(v.shape for v in values)
+        if len(shapes) > 1:
+            msg = 'Unable to stack arrays with different shapes: {}'
+            raise ValueError(msg.format(sorted(shapes)))
+        return np.stack(values)
+    elif all(isinstance(v, (pd.DataFrame, pd.Series)) for v in values):
+        return pd.concat(values, keys=list(results.keys()),
+                         names=['Trial ID'])
+    elif all(pd.api.types.is_scalar(v) for v in values):
+        return pd.Series(values, index=pd.Index(list(results.keys()),
+                                                name='Trial ID'))
+    msg = 'Unable to stack persisted results: {}'
+    raise ValueError(msg.format(sorted(set(type(v).__name__
+                                           for v in values))))
 
 
 class Experiment(object):
 
     _instance_cache = {}
 
-    def __new__(cls, id, backend='local', seed=None):
+    def __new__(cls, id, backend='local', seed=None, incremental=False,
+                cache_size=0, backend_cache_size=0, backend_cache_ttl=None,
+                profile=False, trace=False, purity='full',
+                compression=None, persist_buffer_size=0, persist_workers=1):
         # return the identical instance based on id
         if id in cls._instance_cache:
             return cls._instance_cache[id]
@@ -168,10 +633,63 @@ class Experiment(object):
         cls._instance_cache[id] = obj
         return obj
 
-    def __init__(self, id, backend='local', seed=None):
+    def __init__(self, id, backend='local', seed=None, incremental=False,
+                 cache_size=0, backend_cache_size=0, backend_cache_ttl=None,
+                 profile=False, trace=False, purity='full',
+                 compression=None, persist_buffer_size=0,
+                 persist_workers=1):
         """
-        Automatically load my backend if exists
+        Automatically load my backend if exists.
+
+        If incremental is True, persisted steps reuse the output of the
+        previous trial when its code and inputs are unchanged.
+
+        If cache_size is positive, step outputs are cached in memory up to
+        the specified bytes and reused when its code and inputs are
+        unchanged.
+
+        If backend_cache_size is positive, step outputs are also cached
+        through the backend up to the specified bytes, and shared between
+        processes using the same backend. Cached outputs which are not used
+        for backend_cache_ttl seconds are expired.
+
+        If profile is True or 'cprofile', trials are performed under cProfile
+        by default. If 'sampling', under a statistical profiler with low
+        overhead.
+
+        If trace is True, spans of trials, steps and backend I/O are
+        recorded as Chrome trace per trial by default.
+
+        purity specifies how to check that steps return the same output
+        for the same input by default:
+
+        - 'full': hash inputs and output with dask tokenize
+        - 'sampled': hash deterministic subset of rows of large objects
+        - 'fast': hash raw buffers with non-cryptographic hash
+        - 'async': same as 'full', but hash on a background thread
+        - 'off': do not check purity
+
+        compression specifies how to compress data stored in the backend,
+        a codec name ('zlib', 'zstd' or 'lz4'), a dict of data category
+        ('persist', 'object', 'metric' and 'text') and codec name, or a
+        Compression instance to specify the threshold. False disables
+        compression. If not provided, backend's setting is kept (by default,
+        Redis and MongoDB backends use 'zlib', LocalBackend doesn't
+        compress).
+
+        If persist_buffer_size is positive, persisted step results are
+        written by persist_workers background threads, thus steps don't
+        wait for backend I/O. Results waiting to be written are bounded by
+        the specified bytes, and steps wait for preceding writes when it is
+        exceeded. A trial is finished after all of its results are written.
         """
+        # validate options before initializing backend
+        create_profiler(profile)
+        validate_purity(purity)
+        create_compression(compression)
+        persist_writer = PersistWriter(max_bytes=persist_buffer_size,
+                                       workers=persist_workers)
+
         self._backend = init_backend(experiment_id=self.id,
                                      backend=backend)
         self._backend = self._backend.load()
@@ -180,8 +698,25 @@ class Experiment(object):
             # Backend instance by themselves
             msg = 'Experiment ID mismatch: instance={}, backend={}'
             raise ValueError(msg.format(self.id, self._backend.experiment_id))
+        if compression is not None:
+            self._backend.set_compression(compression)
 
         self._seed = seed
+        self._incremental = incremental
+        self._profile = profile
+        self._trace = trace
+        self._purity = purity
+        if hasattr(self, '_step_cache'):
+            # keep cached outputs in the process
+            self._step_cache.resize(cache_size)
+        else:
+            self._step_cache = StepCache(max_bytes=cache_size)
+        # tokens of reference parameters saved from the process
+        self._saved_references = set()
+        self._persist_writer = persist_writer
+        self._backend_cache = BackendStepCache(self._backend,
+                                               max_bytes=backend_cache_size,
+                                               ttl=backend_cache_ttl)
 
         if self.trial_id != 0:
             msg = 'Loaded existing experiment: {}'
@@ -191,6 +726,7 @@ class Experiment(object):
             logger.info(msg.format(self))
 
         self._parameters = ParameterManager()
+        self._trial_context = TrialContext(self.id)
         self._codes = CodeManager(backend=self._backend)
         self._environment = Environment(backend=self._backend)
 
@@ -200,6 +736,19 @@ class Experiment(object):
         self._environment.log_environment_info()
         self._check_environment_change()
 
+    def __getnewargs__(self):
+        # unpickled to the instance with the same id in worker processes
+        return (self.id, )
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # do not pickle executor, running profilers and tracers
+        state.pop('_executor_obj', None)
+        state.pop('_profilers_obj', None)
+        state.pop('_tracers_obj', None)
+        state.pop('_random_states_obj', None)
+        return state
+
     def __repr__(self):
         msg = 'Experiment(id: {}, trial_id: {}, backend: {})'
         return msg.format(self.id, self.trial_id, self._backend)
@@ -223,10 +772,63 @@ class Experiment(object):
         Return current trial ID of the trial.
 
         It is accessible during the trial is performing, and specifies the ID
-        which the trial is stored.
+        which the trial is stored. Trial ID is managed per thread, thus
+        trials can be performed concurrently from multiple threads.
         """
         return self._trials.current_trial_id
 
+    @property
+    def random_state(self):
+        """
+        Return numpy RandomState of the current trial.
+
+        It is initialized with the trial's seed and not shared with other
+        trials, thus trials performed concurrently are reproducible. Falls
+        back to global random state if the trial is not performed in this
+        process.
+        """
+        trial_id = self._trials.current_trial_id
+        random_state = self._random_states.get(trial_id)
+        if random_state is None:
+            return np.random.mtrand._rand
+        return random_state
+
+    @property
+    def _executor(self):
+        """
+        Default executor to perform submitted trials
+        """
+        if not hasattr(self, '_executor_obj'):
+            self._executor_obj = concurrent.futures.ThreadPoolExecutor()
+        return self._executor_obj
+
+    @property
+    def _profilers(self):
+        """
+        Profilers of running trials per Trial ID
+        """
+        if not hasattr(self, '_profilers_obj'):
+            self._profilers_obj = {}
+        return self._profilers_obj
+
+    @property
+    def _random_states(self):
+        """
+        Random states of running trials per Trial ID
+        """
+        if not hasattr(self, '_random_states_obj'):
+            self._random_states_obj = {}
+        return self._random_states_obj
+
+    @property
+    def _tracers(self):
+        """
+        Tracers of running trials per Trial ID
+        """
+        if not hasattr(self, '_tracers_obj'):
+            self._tracers_obj = {}
+        return self._tracers_obj
+
     @property
     def _trials(self):
         """
@@ -245,7 +847,7 @@ class Experiment(object):
     # Parameter
     ##########################################################
 
-    def parameter(self, name, default=None):
+    def parameter(self, name, default=None, reference=False):
         """
         Declare a parameter in the Experiment.
 
@@ -259,12 +861,44 @@ class Experiment(object):
            You must specify the name provided here in .set_parameters.
         default: object, optional
            Default value of the parameter.
+        reference: bool, default False
+           Whether to pass the value by reference. The value is stored in
+           the backend only once, and the history records its token and
+           summary. It is useful for large values like DataFrame.
 
         Returns
         -------
         Parameter: parameter
         """
-        return self._parameters.define(name, default=default)
+        return self._parameters.define(name, default=default,
+                                       reference=reference)
+
+    def load_reference(self, reference):
+        """
+        Load the value of reference parameter recorded in the history.
+
+        Prameters
+        ---------
+        reference: ParameterReference
+           Reference recorded in the history.
+
+        Returns
+        -------
+        object: value
+        """
+        key = self._backend.get_reference_key(reference.token)
+        return self._backend.load_object(key)
+
+    def _save_references(self, parameters):
+        """
+        Save values of reference parameters if not saved
+        """
+        for reference, value in parameters.get_references().items():
+            if reference.token in self._saved_references:
+                continue
+            key = self._backend.get_reference_key(reference.token)
+            self._backend.save_object(key, value)
+            self._saved_references.add(reference.token)
 
     def set_parameters(self, **kwargs):
         """
@@ -319,7 +953,7 @@ class Experiment(object):
     # Decorators
     ##########################################################
 
-    def __call__(self, func=None):
+    def __call__(self, func=None, purity=None, cache=True, **annotations):
         """
         A decorator to declare the function is in experiment step.
 
@@ -329,21 +963,36 @@ class Experiment(object):
         ---------
         func: callable
            A function for experiment step
+        purity: str, optional
+           Purity check mode of the step, one of 'full', 'sampled', 'fast',
+           'async' and 'off'. If not provided, the experiment's default is
+           used.
+        cache: bool, default True
+           Whether to reuse the step result from the step cache. Disable it
+           if the step has side effects like saving metrics.
+        annotations:
+           dask annotations of the step, like resources, priority and
+           retries. These are passed to the scheduler.
 
         Returns
         -------
         ExperimentFunction: func
         """
 
+        if purity is not None:
+            validate_purity(purity)
+
         def wrap(func):
-            return self._build_step(func, persist=False)
+            return self._build_step(func, persist=False, purity=purity,
+                                    cache=cache, annotations=annotations)
 
         if func is None:
             return wrap
         else:
             return wrap(func)
 
-    def persist(self, func=None):
+    def persist(self, func=None, purity=None, format=None, cache=True,
+                **annotations):
         """
         A decorator to declare the function is in experiment step, and
         persists the function's results in each trials.
@@ -354,28 +1003,53 @@ class Experiment(object):
         ---------
         func: callable
            A function for experiment step
+        purity: str, optional
+           Purity check mode of the step, one of 'full', 'sampled', 'fast',
+           'async' and 'off'. If not provided, the experiment's default is
+           used.
+        cache: bool, default True
+           Whether to reuse the step result from the step cache. Disable it
+           if the step has side effects like saving metrics.
+        format: str, optional
+           Format to persist the results, one of 'pickle', 'npy' and
+           'parquet' (or registered by register_serializer). If not
+           provided, it is inferred from the result type.
+        annotations:
+           dask annotations of the step, like resources, priority and
+           retries. These are passed to the scheduler.
 
         Returns
         -------
         ExperimentFunction: func
         """
+        if purity is not None:
+            validate_purity(purity)
+        if format is not None:
+            get_serializer(format)
+
         def wrap(func):
-            return self._build_step(func, persist=True)
+            return self._build_step(func, persist=True, purity=purity,
+                                    persist_format=format, cache=cache,
+                                    annotations=annotations)
 
         if func is None:
             return wrap
         else:
             return wrap(func)
 
-    def _build_step(self, func, persist=False):
+    def _build_step(self, func, persist=False, purity=None,
+                    persist_format=None, cache=True, annotations=None):
         """
         Build a single eperiment step
         """
-        dask_obj = dask.delayed(wrap_result(self, func, persist=persist))
+        dask_obj = dask.delayed(wrap_result(self, func, persist=persist,
+                                            purity=purity,
+                                            persist_format=persist_format,
+                                            cache=cache))
         self._codes.register(func)
-        return ExperimentFunction(self, dask_obj)
+        return ExperimentFunction(self, dask_obj, annotations=annotations)
 
-    def result(self, func=None):
+    def result(self, func=None, purity=None, cache=True, **annotations):
         """
         A decorator to declare the function is the last experiment step.
 
@@ -388,15 +1062,29 @@ class Experiment(object):
         ---------
         func: callable
            A function for experiment step
+        purity: str, optional
+           Purity check mode of the step, one of 'full', 'sampled', 'fast',
+           'async' and 'off'. If not provided, the experiment's default is
+           used.
+        cache: bool, default True
+           Whether to reuse the step result from the step cache. Disable it
+           if the step has side effects like saving metrics.
+        annotations:
+           dask annotations of the step, like resources, priority and
+           retries. These are passed to the scheduler.
 
         Returns
         -------
         ResultFunction: func
         """
+        if purity is not None:
+            validate_purity(purity)
+
         def wrap(func):
-            dask_obj = dask.delayed(wrap_result(self, func))
+            dask_obj = dask.delayed(wrap_result(self, func, purity=purity,
+                                                cache=cache))
             self._codes.register(func)
-            return ResultFunction(self, dask_obj)
+            return ResultFunction(self, dask_obj, annotations=annotations)
 
         if func is None:
             return wrap
@@ -407,13 +1095,17 @@ class Experiment(object):
     # Run experiment
     ##########################################################
 
-    def _save_experiment_step(self, trial_id):
+    def _save_experiment_step(self, trial_id, parameters=None):
         """
         Save the trial info
         """
-        self._trials.save_parameters(trial_id, self._parameters)
-        self._codes.save(trial_id)
-        self._environment.save(trial_id)
+        if parameters is None:
+            parameters = self._parameters
+        with self._span('save experiment', 'backend'):
+            self._save_references(parameters)
+            self._trials.save_parameters(trial_id, parameters)
+            self._codes.save(trial_id)
+            self._environment.save(trial_id)
 
     def _save_backend(self):
         """
@@ -422,20 +1114,69 @@ class Experiment(object):
         return self._backend.save()
 
     def _check_trial_id(self, trial_id):
-        if not isinstance(trial_id, int):
-            msg = 'Trial id must be integer, given: {}{}'
-            msg.format(trial_id, type(trial_id))
-            raise TrialIDNotFoundError(msg.format(trial_id, type(trial_id)))
-        if trial_id <= 0 or self.trial_id < trial_id:
-            raise TrialIDNotFoundError(trial_id)
-
-    def check_executable(self):
+        self._check_trial_ids((trial_id, ))
+
+    def _check_trial_ids(self, trial_ids):
+        # latest trial ID is loaded once
+        latest = self.trial_id
+        for trial_id in trial_ids:
+            if not isinstance(trial_id, int):
+                msg = 'Trial id must be integer, given: {}{}'
+                raise TrialIDNotFoundError(msg.format(trial_id,
+                                                      type(trial_id)))
+            if trial_id <= 0 or latest < trial_id:
+                raise TrialIDNotFoundError(trial_id)
+
+    def check_executable(self, parameters=None):
         """
         Check whether the current Experiment is executable.
 
         * Parameters are all defined
         """
-        self._parameters._check_all_defined()
+        if parameters is None:
+            parameters = self._parameters
+        parameters._check_all_defined()
+
+    def sweep(self, result, param_grid, seed=None, **kwargs):
+        """
+        Perform trials with all the parameter combinations in a single
+        computation graph.
+
+        Steps which don't depend on swept parameters are computed only once,
+        and the whole trials are computed in a single scheduler call. Each
+        trial has its own trial ID, history, code and environment.
+
+        Prameters
+        ---------
+        result: Result
+           Experiment result to be computed
+        param_grid: dict or list of dict
+           If dict is provided, each value must be a list of values to be
+           swept, like {'a': [1, 2], 'b': [3, 4]}. Otherwise, a list of
+           parameter sets like [{'a': 1, 'b': 3}, {'a': 2, 'b': 4}].
+        seed: int, optional
+           Random seed shared between trials.
+        scheduler: str, optional
+           If 'processes', each trial is performed as a whole in worker
+           processes using ProcessPoolTrialRunner instead of a single
+           computation graph. num_workers specifies the number of
+           worker processes.
+
+        Returns
+        -------
+        list: results
+        """
+        if not isinstance(result, Result):
+            msg = 'Sweep target must be Result, given: {}{}'
+            raise ValueError(msg.format(result, type(result)))
+        parameters = expand_parameter_grid(param_grid)
+
+        if kwargs.get('scheduler') in ('processes', 'multiprocessing'):
+            kwargs.pop('scheduler')
+            num_workers = kwargs.pop('num_workers', None)
+            with ProcessPoolTrialRunner(max_workers=num_workers) as runner:
+                return runner.map(result, parameters, seed=seed, **kwargs)
+        return result.compute_many(parameters, seed=seed, **kwargs)
 
     ##########################################################
     # History management
@@ -459,12 +1200,134 @@ class Experiment(object):
         """
         return self._trials.get_history(verbose=verbose)
 
-    def _save_persist(self, step, result):
-        trial_id = self._trials.current_trial_id
+    def _save_persist(self, step, result, step_key, format=None):
+        # step may be shared between trials in a batch
+        trial_ids = self._trials.current_trial_ids
+
+        def write():
+            with self._trials.bind(trial_ids), \
+                    self._span('write persist', 'backend'):
+                reference = None
+                for trial_id in trial_ids:
+                    key = self._backend.get_persist_key(step, trial_id)
+                    if reference is None:
+                        reference = self._backend.save_persisted(
+                            key, result, format=format)
+                    else:
+                        # the result is stored once, and referred from
+                        # each trial
+                        self._backend.link_persisted(key, reference)
+                if step_key is not None:
+                    # saved after the result is written, because the trial
+                    # is used to load the result in incremental mode
+                    self._trials.save_step_trial(step_key, trial_ids[0])
+
+        # written on background if persist writer is enabled
+        self._persist_writer.submit(trial_ids, write, result)
+
+    def _use_step_key(self, persist=False, cache=True):
+        """
+        Whether the step key is required to reuse or persist the output
+        """
+        return ((persist and self._incremental) or
+                (cache and (self._step_cache.enabled or
+                            self._backend_cache.enabled)))
+
+    def _get_step_key(self, step, input_hash):
+        """
+        Get the key to distinguish step execution by its code and inputs
+        """
+        code_hash = self._codes.get_code_hash(step)
+        return '{}-{}-{}'.format(step, code_hash, input_hash)
+
+    def _load_previous_step(self, step, step_key, persist=False,
+                            cache=True):
+        """
+        Load step output of the previous trial which has the same
+        code and inputs. Returns a tuple of (found, result).
+
+        Output is searched from in-memory cache, backend cache (if cache
+        is True), then persisted result if incremental.
+        """
+        if cache:
+            found, result = self._load_cached_step(step, step_key)
+            if found:
+                return True, result
+
+        if not (persist and self._incremental):
+            return False, None
+
+        trial_id = self._trials.load_step_trial(step_key)
+        if trial_id is None:
+            return False, None
+
         key = self._backend.get_persist_key(step, trial_id)
-        self._backend.save_object(key, result)
+        try:
+            result = self._backend.load_persisted(key)
+        except TrialIDNotFoundError:
+            # persisted result may be deleted
+            return False, None
+
+        msg = 'Reused persisted result: (step: {}, trial id: {})'
+        logger.info(msg.format(step, trial_id))
+        if cache:
+            self._step_cache.put(step_key, result)
+        return True, result
+
+    def _load_cached_step(self, step, step_key):
+        """
+        Load step output from in-memory cache, then backend cache
+        """
+        found, result = self._step_cache.get(step_key)
+        if found:
+            msg = 'Reused cached result: (step: {})'
+            logger.info(msg.format(step))
+            return True, result
+
+        found, result = self._backend_cache.get(step_key)
+        if found:
+            msg = 'Reused backend cached result: (step: {})'
+            logger.info(msg.format(step))
+            self._step_cache.put(step_key, result)
+            return True, result
+        return False, None
+
+    def get_cache_info(self, backend=False):
+        """
+        Get statistics of the step cache.
+
+        Prameters
+        ---------
+        backend: bool, default False
+           If True, return statistics of the backend step cache.
+           Otherwise, return statistics of the in-memory step cache.
+
+        Returns
+        -------
+        dict: cache_info
+           hits, misses, evictions, count, nbytes and max_bytes
+           (and ttl for the backend step cache)
+        """
+        if backend:
+            return self._backend_cache.info()
+        return self._step_cache.info()
 
-    def get_persisted(self, step, trial_id):
+    def clear_cache(self, backend=False):
+        """
+        Clear the step cache.
+
+        Prameters
+        ---------
+        backend: bool, default False
+           If True, clear the backend step cache shared between processes.
+           Otherwise, clear the in-memory step cache.
+        """
+        if backend:
+            self._backend_cache.clear()
+        else:
+            self._step_cache.clear()
+
+    def get_persisted(self, step, trial_id, columns=None, mmap=False):
         """
         Get persisted result.
 
@@ -474,6 +1337,13 @@ class Experiment(object):
            The name of the function decorated by persist.
         trial_id: int
            Trial ID to be loaded
+        columns: list, optional
+           Columns to be loaded if the result is a DataFrame. Results
+           persisted in Parquet format only read the columns.
+        mmap: bool, default False
+           If True, numpy arrays persisted in npy format are returned as
+           read-only np.memmap without reading the entire data. Only
+           supported by LocalBackend.
 
         Returns
         -------
@@ -482,7 +1352,139 @@ class Experiment(object):
         self._check_trial_id(trial_id)
 
         key = self._backend.get_persist_key(step, trial_id)
-        return self._backend.load_object(key)
+        return self._backend.load_persisted(key, columns=columns, mmap=mmap)
+
+    def get_persisted_many(self, step, trial_ids, columns=None, mmap=False,
+                           stack=False, lazy=False, max_workers=None):
+        """
+        Get persisted results of multiple trials.
+
+        Trial IDs are validated at once, and results are loaded
+        concurrently.
+
+        Prameters
+        ---------
+        step: str
+           The name of the function decorated by persist.
+        trial_ids: list of int
+           Trial IDs to be loaded
+        columns: list, optional
+           Columns to be loaded if the results are DataFrame.
+        mmap: bool, default False
+           If True, numpy arrays persisted in npy format are returned as
+           read-only np.memmap. Only supported by LocalBackend.
+        stack: bool, default False
+           If True, results are stacked to a single object. numpy arrays
+           with the same shape are stacked to ndarray along the first axis,
+           pandas objects are concatenated to DataFrame or Series with
+           "Trial ID" index level, and scalars are combined to Series
+           indexed by "Trial ID".
+        lazy: bool, default False
+           If True, return a dict of Delayed which loads the result when
+           computed. Cannot be used with stack.
+        max_workers: int, optional
+           Number of threads to load results. If not provided,
+           ThreadPoolExecutor's default is used.
+
+        Returns
+        -------
+        dict, ndarray, DataFrame or Series: persisted_results
+           dict of trial ID and the result if stack is False.
+        """
+        trial_ids = list(trial_ids)
+        self._check_trial_ids(trial_ids)
+        if lazy:
+            if stack:
+                raise ValueError('lazy and stack cannot be specified at once')
+            return collections.OrderedDict(
+                (trial_id, self._persisted_delayed(step, trial_id,
+                                                   columns=columns))
+                for trial_id in trial_ids)
+
+        keys = [self._backend.get_persist_key(step, trial_id)
+                for trial_id in trial_ids]
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=max_workers) as executor:
+            futures = [executor.submit(self._backend.load_persisted, key,
+                                       columns=columns, mmap=mmap)
+                       for key in keys]
+            results = collections.OrderedDict(
+                (trial_id, future.result())
+                for trial_id, future in zip(trial_ids, futures))
+
+        if stack:
+            return _stack_persisted(results)
+        return results
+
+    def persisted_delayed(self, step, trial_id, columns=None):
+        """
+        Get persisted result as Delayed. The result is loaded on the worker
+        when computed, thus it can be used in other computation graphs
+        without loading it in the client.
+
+        Prameters
+        ---------
+        step: str
+           The name of the function decorated by persist.
+        trial_id: int
+           Trial ID to be loaded
+        columns: list, optional
+           Columns to be loaded if the result is a DataFrame.
+
+        Returns
+        -------
+        Delayed: persisted_result
+        """
+        self._check_trial_id(trial_id)
+        return self._persisted_delayed(step, trial_id, columns=columns)
+
+    def _persisted_delayed(self, step, trial_id, columns=None):
+        key = self._backend.get_persist_key(step, trial_id)
+        name = 'persisted-{}-{}-{}'.format(
+            step, trial_id,
+            dask.base.tokenize(self.id, step, trial_id, columns))
+        # pass backend rather than experiment to be serialized to workers
+        return dask.delayed(_load_persisted, pure=True)(
+            self._backend, key, columns, dask_key_name=name)
+
+    def gc(self, keep_last=None, keep_best=None, max_bytes=None,
+           minimize=False, dry_run=True):
+        """
+        Remove artifacts (persisted results, code, environment info,
+        profiles and traces) of trials which are not kept by the retention
+        policy. Persisted results which are not referred from any trial
+        are also removed. History, parameters and metrics are kept.
+
+        Trials must not be performed during garbage collection, including
+        ones in other processes sharing the backend.
+
+        Prameters
+        ---------
+        keep_last: int, optional
+           Keep artifacts of the latest N trials.
+        keep_best: int, optional
+           Keep artifacts of the best K trials by their results.
+        max_bytes: int, optional
+           Remove artifacts of trials from the oldest until the total bytes
+           fits within max_bytes. Trials kept by keep_last and keep_best
+           are not removed.
+        minimize: bool, default False
+           If True, smaller result is regarded as better in keep_best.
+        dry_run: bool, default True
+           If True, only report artifacts to be removed.
+
+        Returns
+        -------
+        DataFrame: removed_artifacts
+           Trial ID, category, key and bytes of removed artifacts. Sum of
+           "Bytes" column is the reclaimed bytes.
+        """
+        policy = RetentionPolicy(keep_last=keep_last, keep_best=keep_best,
+                                 max_bytes=max_bytes, minimize=minimize)
+        if self._trials.is_locked():
+            msg = 'Unable to collect garbage during trial'
+            raise LockedTrialError(msg)
+        return collect_garbage(self, policy, dry_run=dry_run)
 
     ##########################################################
     # Code management
@@ -523,10 +1525,11 @@ class Experiment(object):
         value: scalar
            A value of the distinguish metric
         """
-        trial_id = self._trials.current_trial_id
         # metric_key validation is performed in MetricManager.save
-        self._metrics.save(metric_key=metric_key, trial_id=trial_id,
-                           epoch=epoch, value=value)
+        with self._span('save metric', 'backend', metric_key=metric_key):
+            for trial_id in self._trials.current_trial_ids:
+                self._metrics.save(metric_key=metric_key, trial_id=trial_id,
+                                   epoch=epoch, value=value)
 
     def load_metric(self, metric_key, trial_id):
         """
@@ -552,6 +1555,128 @@ class Experiment(object):
         return self._metrics.load(metric_key=metric_key,
                                   trial_id=trial_id)
 
+    ##########################################################
+    # Profile management
+    ##########################################################
+
+    def _profile_step(self, trial_ids):
+        """
+        Context manager to profile a step with profilers of the trials
+        """
+        stack = contextlib.ExitStack()
+        for trial_id in trial_ids:
+            profiler = self._profilers.get(trial_id)
+            if profiler is not None:
+                stack.enter_context(profiler.profile_step())
+        return stack
+
+    def _save_profile(self, trial_id, data):
+        key = self._backend.get_profile_key(trial_id)
+        self._backend.save_object(key, data)
+
+    def get_profile(self, trial_id, top=None):
+        """
+        Get profile captured in the trial.
+
+        Prameters
+        ---------
+        trial_id: int
+           Trial ID to get profile.
+        top: int, optional
+           Number of functions to be returned in DataFrame.
+
+        Returns
+        -------
+        pstats.Stats or DataFrame: profile
+           pstats.Stats if the trial is profiled with cProfile and top is
+           not provided. Otherwise, DataFrame of functions sorted by
+           cumulative time.
+        """
+        self._check_trial_id(trial_id)
+        key = self._backend.get_profile_key(trial_id)
+        try:
+            data = self._backend.load_object(key)
+        except TrialIDNotFoundError:
+            msg = 'Trial is not profiled: (trial id: {})'
+            raise TrialIDNotFoundError(msg.format(trial_id))
+
+        if data['mode'] == 'cprofile' and top is None:
+            return to_pstats(data)
+        return to_profile_frame(data, top=top)
+
+    ##########################################################
+    # Trace management
+    ##########################################################
+
+    def _span(self, name, category, **args):
+        """
+        Context manager to record a span with tracers of the current trials
+        """
+        stack = contextlib.ExitStack()
+        if not self._tracers or not self._trials.in_trial():
+            return stack
+        for trial_id in self._trials.current_trial_ids:
+            tracer = self._tracers.get(trial_id)
+            if tracer is not None:
+                stack.enter_context(tracer.span(name, category, **args))
+        return stack
+
+    def _save_trace(self, trial_id, tracer):
+        key = self._backend.get_trace_key(trial_id)
+        self._backend.save_text(key, tracer.dumps())
+
+    def get_trace(self, trial_id, path=None):
+        """
+        Get spans recorded in the trial as Chrome trace.
+
+        Prameters
+        ---------
+        trial_id: int
+           Trial ID to get trace.
+        path: str, optional
+           If provided, trace is also written to the file as JSON which can
+           be opened with chrome://tracing or Perfetto.
+
+        Returns
+        -------
+        dict: trace
+        """
+        self._check_trial_id(trial_id)
+        key = self._backend.get_trace_key(trial_id)
+        try:
+            text = self._backend.load_text(key)
+        except TrialIDNotFoundError:
+            msg = 'Trial is not traced: (trial id: {})'
+            raise TrialIDNotFoundError(msg.format(trial_id))
+
+        if path is not None:
+            with open(path, mode='w') as f:
+                f.write(text)
+        return json.loads(text)
+
+    ##########################################################
+    # Step log
+    ##########################################################
+
+    def get_step_log(self, trial_id):
+        """
+        Get resource usage of each step invocation during the trial.
+
+        Prameters
+        ---------
+        trial_id: int
+           Trial ID to get step log.
+
+        Returns
+        -------
+        DataFrame: step log
+           Wall time, CPU time, peak RSS delta (bytes), result size (bytes)
+           and whether the result came from cache, per step invocation.
+        """
+        self._check_trial_id(trial_id)
+        records = self._trials.load_step_log(trial_id)
+        return to_step_log_frame(records)
+
     ##########################################################
     # Environment management
     ##########################################################
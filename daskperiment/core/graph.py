@@ -0,0 +1,497 @@
+import contextlib
+
+from dask.base import tokenize
+from dask.core import get_dependencies, get_deps, istask
+from dask.delayed import Delayed
+from dask.highlevelgraph import HighLevelGraph
+
+try:
+    from dask.utils import apply
+except ImportError:
+    # older dask
+    from dask.compatibility import apply
+
+from daskperiment.util.hashing import get_hash
+
+
+# hidden keyword argument name to pass trial context to experiment steps
+TRIAL_CONTEXT = '_daskperiment_trial_ids'
+
+
+def _outside_trial():
+    return None
+
+
+class TrialContext(Delayed):
+    """
+    Delayed instance which is resolved to Trial IDs during a trial.
+
+    Every experiment step receives it as a hidden keyword argument, thus
+    steps can bind the trial even if dask worker threads are shared between
+    trials. It is resolved to None outside of trials.
+    """
+    __slots__ = ('_key', 'dask', '_length')
+
+    def __init__(self, experiment_id):
+        self._key = 'trial-context-' + tokenize(experiment_id)
+        self.dask = {self._key: (_outside_trial, )}
+        self._length = None
+
+    def __dask_layers__(self):
+        # layer is named with the key to be replaced in TrialTask
+        return (self._key, )
+
+    def __repr__(self):
+        return 'TrialContext({})'.format(self._key)
+
+
+def annotate(annotations):
+    """
+    Context manager to attach dask annotations to layers created in the
+    block. Do nothing if annotations are empty.
+    """
+    if not annotations:
+        # contextlib.nullcontext is not available in Python 3.6
+        return contextlib.ExitStack()
+
+    try:
+        from dask import annotate
+    except ImportError:
+        msg = 'Step annotations require dask 2.30.0 or later'
+        raise ImportError(msg)
+    return annotate(**annotations)
+
+
+def annotate_layer(obj, annotations):
+    """
+    Attach dask annotations only to the layer of the Delayed. Layers of its
+    dependencies (like Parameter) are kept intact. Do nothing if
+    annotations are empty.
+    """
+    if not annotations:
+        return obj
+
+    from dask.highlevelgraph import MaterializedLayer
+    dsk = obj.dask
+    layers = dict(dsk.layers)
+    with annotate(annotations):
+        # annotations in outer annotate blocks are merged
+        layers[obj.key] = MaterializedLayer(dict(layers[obj.key]))
+    dsk = HighLevelGraph(layers, dict(dsk.dependencies))
+    return Delayed(obj.key, dsk, length=obj._length)
+
+
+class TrialFailure(object):
+    """
+    A placeholder of the step output which raised an exception.
+
+    It is used in batch execution to fail only related trials.
+    Subsequent steps of the failed trials are skipped.
+    """
+    def __init__(self, exception):
+        self.exception = exception
+
+    def __repr__(self):
+        return 'TrialFailure({})'.format(self.description)
+
+    @property
+    def description(self):
+        e = self.exception
+        return '{}({})'.format(e.__class__.__name__, e)
+
+
+def _find_failure(obj):
+    """
+    Find TrialFailure from task arguments
+    """
+    if isinstance(obj, TrialFailure):
+        return obj
+    elif isinstance(obj, (list, tuple)):
+        values = obj
+    elif isinstance(obj, dict):
+        values = obj.values()
+    else:
+        return None
+
+    for value in values:
+        failure = _find_failure(value)
+        if failure is not None:
+            return failure
+    return None
+
+
+class TrialBoundFunction(object):
+    """
+    A callable to execute task function under the specified trials.
+    """
+    def __init__(self, func, trial_ids, trials):
+        self.func = func
+        self.trial_ids = tuple(trial_ids)
+        self.trials = trials
+
+    def __repr__(self):
+        fmt = 'TrialBoundFunction({}, trial_ids={})'
+        return fmt.format(self.func, self.trial_ids)
+
+    def __call__(self, *args):
+        failure = _find_failure(args)
+        if failure is not None:
+            # upstream step has been failed
+            return failure
+
+        with self.trials.bind(self.trial_ids):
+            try:
+                return self.func(*args)
+            except Exception as e:
+                return TrialFailure(e)
+
+
+def bind_task(task, trial_ids, trials):
+    """
+    Bind trial ids to the task
+    """
+    if istask(task):
+        func = TrialBoundFunction(task[0], trial_ids, trials)
+        return (func, ) + task[1:]
+    return task
+
+
+class LoadedValue(object):
+    """
+    A callable returns the loaded value.
+
+    It is used as a task to keep the value as it is in the graph.
+    """
+    def __init__(self, value):
+        self.value = value
+
+    def __repr__(self):
+        return 'LoadedValue({})'.format(type(self.value).__name__)
+
+    def __call__(self):
+        return self.value
+
+
+def get_task_function(task):
+    """
+    Return the function called by the task, None if not a task
+    """
+    if not istask(task):
+        return None
+    if task[0] is apply and len(task) > 1:
+        # function called with keywords
+        return task[1]
+    return task[0]
+
+
+def substitute_tasks(dsk, key, load):
+    """
+    Replace tasks required to compute the key with loaded values.
+
+    Dependencies of the replaced task are not visited, thus only the
+    tasks which are required to compute the key are loaded.
+
+    Prameters
+    ---------
+    dsk: dict
+       Computation graph
+    key: str
+       The key to compute
+    load: callable
+       A function takes the key and its task, and returns a tuple of
+       (found, value)
+
+    Returns
+    -------
+    dict: graph
+    list: replaced keys
+    """
+    values = {}
+    visited = set()
+    stack = [key]
+    while stack:
+        k = stack.pop()
+        if k in visited:
+            continue
+        visited.add(k)
+
+        found, value = load(k, dsk[k])
+        if found:
+            values[k] = (LoadedValue(value), )
+        else:
+            stack.extend(get_dependencies(dsk, k))
+    return resolve_graph(dsk, values), sorted(values, key=str)
+
+
+def get_trial_key(key, trial_id):
+    """
+    Get the key to distinguish the task per trial
+    """
+    if isinstance(key, tuple):
+        return (get_trial_key(key[0], trial_id), ) + key[1:]
+    return '{}-trial{}'.format(key, trial_id)
+
+
+def rename_keys(task, mapping):
+    """
+    Replace keys in the task based on mapping
+    """
+    if istask(task):
+        return (task[0], ) + tuple(rename_keys(t, mapping) for t in task[1:])
+    elif isinstance(task, list):
+        return [rename_keys(t, mapping) for t in task]
+
+    try:
+        return mapping.get(task, task)
+    except TypeError:
+        # unhashable
+        return task
+
+
+def resolve_graph(dsk, values):
+    """
+    Replace tasks in the graph with given values.
+
+    If the graph is HighLevelGraph and each key is a layer by itself (like
+    Parameter), the layer is replaced with a small layer holding the value.
+    Thus, other layers are kept intact and its cost doesn't depend on
+    the graph size.
+    """
+    if isinstance(dsk, HighLevelGraph):
+        layers = dict(dsk.layers)
+        for key, value in values.items():
+            if key in layers and len(layers[key]) == 1:
+                layers[key] = {key: value}
+            elif key in dsk:
+                # key is a part of other layer
+                break
+        else:
+            return HighLevelGraph(layers, dict(dsk.dependencies))
+
+    result = dict(dsk)
+    result.update(values)
+    return result
+
+
+def add_alias(dsk, key, alias):
+    """
+    Add alias of the key to the graph
+    """
+    if isinstance(dsk, HighLevelGraph):
+        layers = dict(dsk.layers)
+        dependencies = dict(dsk.dependencies)
+        layers[alias] = {alias: key}
+        if key in layers:
+            dependencies[alias] = {key}
+        else:
+            dependencies[alias] = set(dsk.layers)
+        return HighLevelGraph(layers, dependencies)
+
+    result = dict(dsk)
+    result[alias] = key
+    return result
+
+
+def is_local_scheduler(get):
+    """
+    Check whether the scheduler function is a single-machine scheduler of
+    dask, whose keys are not shared with other computations
+    """
+    if get is None:
+        return True
+    func = getattr(get, 'func', get)
+    module = getattr(func, '__module__', None) or ''
+    return module.split('.')[0] == 'dask'
+
+
+def uniquify_graph(dsk, trial_id):
+    """
+    Rename all the keys and layers of the graph to distinguish them per
+    trial. Layers keep their annotations.
+
+    It is required to compute graphs of multiple trials on a shared
+    scheduler (like dask.distributed) because the same key is regarded as
+    the same task.
+    """
+    if isinstance(dsk, HighLevelGraph):
+        layers = dsk.layers
+    else:
+        layers = {None: dsk}
+
+    tasks = {name: dict(layer) for name, layer in layers.items()}
+    mapping = {}
+    for layer_tasks in tasks.values():
+        for k in layer_tasks:
+            mapping[k] = get_trial_key(k, trial_id)
+
+    renamed = {}
+    for name, layer_tasks in tasks.items():
+        renamed[name] = {mapping[k]: rename_keys(task, mapping)
+                         for k, task in layer_tasks.items()}
+
+    if not isinstance(dsk, HighLevelGraph):
+        return renamed[None]
+
+    graph_layers = {}
+    graph_deps = {}
+    for name, layer in layers.items():
+        trial_name = get_trial_key(name, trial_id)
+        graph_layers[trial_name] = _create_layer(renamed[name],
+                                                 _layer_annotations(layer))
+        graph_deps[trial_name] = {get_trial_key(dep, trial_id)
+                                  for dep in dsk.dependencies[name]}
+    return HighLevelGraph(graph_layers, graph_deps)
+
+
+def get_dependents(dsk, keys):
+    """
+    Return keys which depend on any of given keys (including themselves)
+    """
+    _, dependents = get_deps(dsk)
+
+    results = set()
+    stack = list(keys)
+    while stack:
+        key = stack.pop()
+        if key in results:
+            continue
+        results.add(key)
+        stack.extend(dependents.get(key, ()))
+    return results
+
+
+def _layer_annotations(layer):
+    # Layer doesn't exist in older dask, and dict layer has no annotations
+    return getattr(layer, 'annotations', None)
+
+
+def _create_layer(tasks, annotations=None):
+    """
+    Create a layer holding tasks with the annotations of the original layer
+    """
+    if not annotations:
+        return tasks
+    from dask.highlevelgraph import MaterializedLayer
+    return MaterializedLayer(tasks, annotations=annotations)
+
+
+def build_batch_graph(dsk, key, parameters, trial_ids, trials,
+                      context_key=None):
+    """
+    Build a single computation graph to perform multiple trials.
+
+    Tasks which depend on the parameters different between trials are
+    duplicated per trial. Other tasks are shared between all the trials.
+
+    The graph is built layer by layer. Each layer is split into a layer of
+    shared tasks (keeps the original name) and layers of duplicated tasks
+    per trial, and they keep the annotations of the original layer.
+
+    Prameters
+    ---------
+    dsk: HighLevelGraph or dict
+       Computation graph whose parameters are not resolved. dict is
+       regarded as a single layer.
+    key: str
+       The key of result
+    parameters: list of dict
+       Parameter key and its value per trial
+    trial_ids: list of int
+       Trial IDs corresponding to parameters
+    trials: TrialManager
+       TrialManager to bind trial ids
+    context_key: str, optional
+       The key of TrialContext
+
+    Returns
+    -------
+    HighLevelGraph: graph
+    list: keys to compute results per trial
+    """
+    assert len(parameters) == len(trial_ids)
+
+    if isinstance(dsk, HighLevelGraph):
+        layers = dsk.layers
+        layer_deps = dsk.dependencies
+    else:
+        name = 'batch-' + tokenize(key)
+        layers = {name: dsk}
+        layer_deps = {name: set()}
+
+    # tasks of each layer
+    tasks = {name: dict(layer) for name, layer in layers.items()}
+    flat = {}
+    for layer_tasks in tasks.values():
+        flat.update(layer_tasks)
+
+    varying = []
+    for k in parameters[0]:
+        if k not in flat:
+            continue
+        if len(set(get_hash(p[k]) for p in parameters)) > 1:
+            varying.append(k)
+
+    variant = get_dependents(flat, varying)
+
+    graph_layers = {}
+    graph_deps = {}
+    for name, layer_tasks in tasks.items():
+        shared = {}
+        for k, task in layer_tasks.items():
+            if k in variant:
+                continue
+            if k == context_key:
+                # shared steps belong to all the trials
+                shared[k] = tuple(trial_ids)
+            elif k in parameters[0]:
+                # the same value in all the trials
+                shared[k] = parameters[0][k]
+            else:
+                shared[k] = bind_task(task, trial_ids, trials)
+        if len(shared) > 0:
+            annotations = _layer_annotations(layers[name])
+            graph_layers[name] = _create_layer(shared, annotations)
+            # shared tasks only depend on shared tasks
+            graph_deps[name] = set(layer_deps[name])
+
+    keys = []
+    for trial_id, params in zip(trial_ids, parameters):
+        mapping = {k: get_trial_key(k, trial_id) for k in variant}
+        if context_key in flat:
+            mapping[context_key] = get_trial_key(context_key, trial_id)
+        trial_layers = {}
+        for name, layer_tasks in tasks.items():
+            trial_tasks = {}
+            for k, task in layer_tasks.items():
+                if k == context_key:
+                    trial_tasks[mapping[k]] = (trial_id, )
+                elif k not in variant:
+                    continue
+                elif k in params:
+                    trial_tasks[mapping[k]] = params[k]
+                else:
+                    task = rename_keys(task, mapping)
+                    trial_tasks[mapping[k]] = bind_task(task, (trial_id, ),
+                                                        trials)
+            if len(trial_tasks) > 0:
+                annotations = _layer_annotations(layers[name])
+                trial_name = get_trial_key(name, trial_id)
+                graph_layers[trial_name] = _create_layer(trial_tasks,
+                                                         annotations)
+                trial_layers[name] = trial_name
+
+        for name, trial_name in trial_layers.items():
+            # shared part of the same layer and its dependencies
+            deps = set()
+            for dep in set(layer_deps[name]) | {name}:
+                if dep in graph_layers:
+                    deps.add(dep)
+                if dep in trial_layers and dep != name:
+                    deps.add(trial_layers[dep])
+            graph_deps[trial_name] = deps
+        keys.append(mapping.get(key, key))
+
+    # layers removed as all of their tasks are duplicated
+    for name, deps in graph_deps.items():
+        graph_deps[name] = {dep for dep in deps if dep in graph_layers}
+    return HighLevelGraph(graph_layers, graph_deps), keys
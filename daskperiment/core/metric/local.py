@@ -1,3 +1,5 @@
+import threading
+
 from daskperiment.core.errors import TrialIDNotFoundError
 from daskperiment.core.metric.base import _MetricManager
 
@@ -8,13 +10,38 @@ class LocalMetricManager(_MetricManager):
         super().__init__(backend)
         self.metrics = {}
 
+    def __getstate__(self):
+        # copy containers which may be updated by concurrent trials
+        with self._lock:
+            state = self.__dict__.copy()
+            state.pop('_lock_obj', None)
+            state.pop('_records', None)
+            state['metrics'] = {k: m.copy() for k, m in self.metrics.items()}
+        return state
+
+    @property
+    def _lock(self):
+        if not hasattr(self, '_lock_obj'):
+            self._lock_obj = threading.Lock()
+        return self._lock_obj
+
+    def _record(self, method, *args):
+        """
+        Record an update to be replayed in other process if recording
+        """
+        records = getattr(self, '_records', None)
+        if records is not None:
+            records.append((method, args))
+
     def keys(self):
         return list(self.metrics.keys())
 
     def _save(self, metric_key, trial_id, record):
-        if metric_key not in self.metrics:
-            self.metrics[metric_key] = Metric(metric_key)
-        self.metrics[metric_key].save(trial_id, record)
+        with self._lock:
+            if metric_key not in self.metrics:
+                self.metrics[metric_key] = Metric(metric_key)
+            self.metrics[metric_key].save(trial_id, record)
+            self._record('_save', metric_key, trial_id, record)
 
     def _load_single(self, metric_key, trial_id):
         try:
@@ -32,6 +59,11 @@ class Metric(object):
         self.values = {}
         self.metric_key = metric_key
 
+    def copy(self):
+        result = Metric(self.metric_key)
+        result.values = {k: list(v) for k, v in self.values.items()}
+        return result
+
     def save(self, trial_id, record):
         if trial_id not in self.values:
             self.values[trial_id] = []
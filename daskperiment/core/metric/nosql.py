@@ -1,5 +1,6 @@
 from daskperiment.core.errors import TrialIDNotFoundError
 from daskperiment.core.metric.base import _MetricManager
+from daskperiment.io.compression import decompress
 import daskperiment.io.pickle as pickle
 
 
@@ -11,7 +12,9 @@ class _NoSQLMetricManager(_MetricManager):
 
     def _save(self, metric_key, trial_id, record):
         key = self.backend.get_metric_key(metric_key, trial_id)
-        return self.backend.append_list(key, pickle.dumps(record))
+        data = self.backend.compression.compress(pickle.dumps(record),
+                                                 'metric')
+        return self.backend.append_list(key, data)
 
     def _load_single(self, metric_key, trial_id):
         key = self.backend.get_metric_key(metric_key, trial_id)
@@ -24,7 +27,7 @@ class _NoSQLMetricManager(_MetricManager):
             else:
                 raise TrialIDNotFoundError(trial_id)
 
-        values = [pickle.loads(value) for value in values]
+        values = [pickle.loads(decompress(value)) for value in values]
 
         return self._wrap_single_result(values, trial_id)
 
@@ -1,5 +1,9 @@
+import itertools
+
 from dask.base import tokenize
 from dask.delayed import Delayed
+import numpy as np
+import pandas as pd
 
 from daskperiment.core.errors import (ParameterUndeclaredError,
                                       ParameterUndefinedError)
@@ -21,10 +25,52 @@ class Undefined(object):
             return False
 
 
+def summarize_value(value):
+    """
+    Return short str to describe large value
+    """
+    name = type(value).__name__
+    if isinstance(value, np.ndarray):
+        return '{}(shape={}, dtype={})'.format(name, value.shape, value.dtype)
+    elif isinstance(value, (pd.DataFrame, pd.Series)):
+        return '{}(shape={})'.format(name, value.shape)
+    try:
+        return '{}(len={})'.format(name, len(value))
+    except TypeError:
+        return '{}()'.format(name)
+
+
+class ParameterReference(object):
+    """
+    A reference to the parameter value stored in the backend.
+
+    It is recorded in the history instead of the value itself.
+    """
+
+    def __init__(self, token, summary):
+        self.token = token
+        self.summary = summary
+
+    def __repr__(self):
+        return 'Reference({}, token={})'.format(self.summary, self.token)
+
+    def __eq__(self, other):
+        if not isinstance(other, ParameterReference):
+            return False
+        return self.token == other.token
+
+    def __hash__(self):
+        return hash(self.token)
+
+    def __dask_tokenize__(self):
+        return self.token
+
+
 class Parameter(Delayed):
-    __slots__ = ('_name', '_key', 'dask', '_length', '_value')
+    __slots__ = ('_name', '_key', 'dask', '_length', '_value',
+                 '_reference')
 
-    def __init__(self, name, length=None):
+    def __init__(self, name, length=None, reference=False):
         # parameter representation name, like "a"
         self._name = name
         # parameter with token, like "a-xxxx"
@@ -36,30 +82,58 @@ class Parameter(Delayed):
         self._length = length
         self._value = Undefined()
 
+        # ParameterReference if the value is passed by reference,
+        # False if the value is recorded as it is
+        self._reference = reference
+
+    def __dask_layers__(self):
+        # layer is named with the key to be replaced in TrialTask
+        return (self._key, )
+
     def __repr__(self):
+        return 'Parameter({}: {})'.format(self._name, self._describe_value())
+
+    def _describe_value(self):
         if self.is_undefined:
-            typ = ''
+            return str(self._value)
+        elif self.is_reference:
+            return repr(self._reference)
         else:
-            typ = type(self._value)
-
-        return 'Parameter({}: {}{})'.format(self._name, self._value, typ)
+            return '{}{}'.format(self._value, type(self._value))
 
     def summarize(self):
         """
         Return name=value format str
         """
-        if self.is_undefined:
-            typ = ''
-        else:
-            typ = type(self._value)
-
-        return '{}={}{}'.format(self._name, self._value, typ)
+        return '{}={}'.format(self._name, self._describe_value())
 
     def set(self, value):
         """
         Set value to myself
         """
         self._value = value
+        if self._reference is not False:
+            if self.is_undefined:
+                self._reference = True
+            else:
+                # tokenize large value only once
+                self._reference = ParameterReference(tokenize(value),
+                                                     summarize_value(value))
+
+    @property
+    def is_reference(self):
+        """
+        Whether the value is passed by reference
+        """
+        return isinstance(self._reference, ParameterReference)
+
+    def record(self):
+        """
+        Return the value to be recorded in the history
+        """
+        if self.is_reference:
+            return self._reference
+        return self.resolve(allow_undefined=True)
 
     @property
     def is_undefined(self):
@@ -83,10 +157,18 @@ class ParameterManager(object):
 
     def to_dict(self):
         """
-        Return dict of parameter name and its value
+        Return dict of parameter name and its value.
+
+        The value of reference parameter is ParameterReference.
+        """
+        return {k: v.record() for k, v in self._parameters.items()}
+
+    def get_references(self):
+        """
+        Return dict of ParameterReference and its value
         """
-        return {k: v.resolve(allow_undefined=True)
-                for k, v in self._parameters.items()}
+        return {v._reference: v._value for v in self._parameters.values()
+                if v.is_reference}
 
     def to_dask_dict(self):
         """
@@ -94,7 +176,7 @@ class ParameterManager(object):
         """
         return {v._key: v.resolve() for v in self._parameters.values()}
 
-    def define(self, name, default=None):
+    def define(self, name, default=None, reference=False):
         """"
         Declare parameter
         """
@@ -103,7 +185,7 @@ class ParameterManager(object):
             logger.debug(msg.format(name))
             return self._parameters[name]
         else:
-            p = Parameter(name)
+            p = Parameter(name, reference=reference)
             if default is not None:
                 p.set(default)
             self._parameters[name] = p
@@ -122,6 +204,33 @@ class ParameterManager(object):
         msg = 'Updated parameters: {}'
         logger.info(msg.format(self.describe()))
 
+    def copy(self):
+        """
+        Return a copy of myself which holds the same parameters and values
+        """
+        result = ParameterManager()
+        for name, p in self._parameters.items():
+            copied = Parameter(name, length=p._length)
+            # do not tokenize the value again
+            copied._value = p._value
+            copied._reference = p._reference
+            result._parameters[name] = copied
+        return result
+
+    def bind(self, **kwargs):
+        """
+        Return a copy of myself updated with given parameter values.
+
+        Different from .set, it doesn't modify myself.
+        """
+        result = self.copy()
+        for name, value in kwargs.items():
+            if name in result._parameters:
+                result._parameters[name].set(value)
+            else:
+                raise ParameterUndeclaredError(name)
+        return result
+
     def _check_all_defined(self):
         undefined = []
         for k, p in self._parameters.items():
@@ -130,3 +239,35 @@ class ParameterManager(object):
 
         if len(undefined) > 0:
             raise ParameterUndefinedError(', '.join(undefined))
+
+
+def expand_parameter_grid(param_grid):
+    """
+    Expand parameter grid to a list of parameter dict.
+
+    Prameters
+    ---------
+    param_grid: dict or list of dict
+       If dict is provided, each value must be list-like and all the
+       combinations of values are generated. Otherwise, each element is
+       regarded as a parameter set.
+
+    Returns
+    -------
+    list of dict: parameters
+    """
+    if isinstance(param_grid, dict):
+        keys = sorted(param_grid.keys())
+        for key in keys:
+            if not pd.api.types.is_list_like(param_grid[key]):
+                msg = 'Parameter grid values must be list-like, given: {}={}'
+                raise ValueError(msg.format(key, param_grid[key]))
+        values = [param_grid[key] for key in keys]
+        return [dict(zip(keys, v)) for v in itertools.product(*values)]
+
+    param_grid = list(param_grid)
+    for params in param_grid:
+        if not isinstance(params, dict):
+            msg = 'Each parameter set must be dict, given: {}{}'
+            raise ValueError(msg.format(params, type(params)))
+    return param_grid
@@ -0,0 +1,253 @@
+import collections
+import contextlib
+import cProfile
+import pstats
+import sys
+import threading
+
+import pandas as pd
+
+from daskperiment.util.log import get_logger
+
+
+logger = get_logger(__name__)
+
+
+PROFILE_COLUMNS = ['Function', 'Calls', 'Total Time', 'Cumulative Time']
+
+
+def create_profiler(profile):
+    """
+    Create a profiler from the profile option.
+
+    Prameters
+    ---------
+    profile: bool or str
+       True or 'cprofile' to use deterministic profiler (cProfile),
+       'sampling' to use statistical profiler. False or None to disable.
+
+    Returns
+    -------
+    TrialProfiler: profiler, None if disabled
+    """
+    if profile is None or profile is False:
+        return None
+    elif profile is True or profile == 'cprofile':
+        return CProfileProfiler()
+    elif profile == 'sampling':
+        return SamplingProfiler()
+    msg = "profile must be a bool, 'cprofile' or 'sampling', given: {}"
+    raise ValueError(msg.format(profile))
+
+
+class _TrialProfiler(object):
+    """
+    Base class of profilers capturing a single trial.
+
+    The profiler is started in the thread which performs the trial.
+    Steps executed in other threads (such as dask worker threads) must be
+    wrapped with profile_step.
+    """
+
+    mode = None
+
+    def start(self):
+        self._owner = threading.get_ident()
+        self._start()
+
+    def stop(self):
+        """
+        Stop profiling and return profile data to be saved
+        """
+        data = {'mode': self.mode}
+        data.update(self._stop())
+        return data
+
+    @contextlib.contextmanager
+    def profile_step(self):
+        """
+        Profile a step executed in the block
+        """
+        if threading.get_ident() == self._owner:
+            # already profiled
+            yield
+        else:
+            with self._profile_thread():
+                yield
+
+
+class CProfileProfiler(_TrialProfiler):
+    """
+    Deterministic profiler using cProfile.
+
+    cProfile only captures the thread which enables it, thus each step
+    executed in other threads is captured by its own profiler, and all the
+    stats are merged when the trial is finished.
+    """
+
+    mode = 'cprofile'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._profiles = []
+
+    def _enable(self):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12 or later allows only one active profiler,
+            # which captures all the threads
+            return None
+        with self._lock:
+            self._profiles.append(profile)
+        return profile
+
+    def _start(self):
+        self._profile = self._enable()
+
+    @contextlib.contextmanager
+    def _profile_thread(self):
+        profile = self._enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+
+    def _stop(self):
+        if self._profile is not None:
+            self._profile.disable()
+        with self._lock:
+            profiles = list(self._profiles)
+
+        stats = {}
+        for profile in profiles:
+            profile.create_stats()
+            if not profile.stats:
+                continue
+            if not stats:
+                merged = pstats.Stats(profile)
+                stats = merged.stats
+            else:
+                merged.add(profile)
+        return {'stats': stats}
+
+
+class SamplingProfiler(_TrialProfiler):
+    """
+    Statistical profiler which samples stacks of the threads performing the
+    trial at the specified interval (seconds) from a background thread.
+
+    Its overhead doesn't depend on the number of function calls, thus it is
+    suitable for production runs. Calls are not counted, and times are
+    estimated from the number of samples.
+    """
+
+    mode = 'sampling'
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+
+        self._lock = threading.Lock()
+        # thread ident -> number of running steps
+        self._threads = collections.Counter()
+        # function -> number of samples at the top of the stack
+        self._self_samples = collections.Counter()
+        # function -> number of samples in the stack
+        self._samples = collections.Counter()
+        self._stopped = threading.Event()
+
+    def _start(self):
+        self._threads[self._owner] += 1
+        self._sampler = threading.Thread(target=self._run,
+                                         name='daskperiment-profiler',
+                                         daemon=True)
+        self._sampler.start()
+
+    @contextlib.contextmanager
+    def _profile_thread(self):
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._threads[ident] -= 1
+                if self._threads[ident] <= 0:
+                    del self._threads[ident]
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        frames = sys._current_frames()
+        with self._lock:
+            idents = list(self._threads)
+        for ident in idents:
+            frame = frames.get(ident)
+            if frame is None:
+                continue
+            self._self_samples[_get_function(frame)] += 1
+            functions = set()
+            while frame is not None:
+                functions.add(_get_function(frame))
+                frame = frame.f_back
+            self._samples.update(functions)
+
+    def _stop(self):
+        self._stopped.set()
+        self._sampler.join()
+        stats = {func: (self._self_samples.get(func, 0), count)
+                 for func, count in self._samples.items()}
+        return {'interval': self.interval, 'stats': stats}
+
+
+def _get_function(frame):
+    code = frame.f_code
+    return (code.co_filename, code.co_firstlineno, code.co_name)
+
+
+class _LoadedStats(object):
+    """
+    Holder to create pstats.Stats from saved stats
+    """
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def to_pstats(data):
+    """
+    Convert saved cProfile data to pstats.Stats
+    """
+    if data['mode'] != 'cprofile':
+        msg = 'pstats is only available for cprofile mode, given: {}'
+        raise ValueError(msg.format(data['mode']))
+    return pstats.Stats(_LoadedStats(dict(data['stats'])))
+
+
+def to_profile_frame(data, top=None):
+    """
+    Convert saved profile data to DataFrame sorted by cumulative time
+    """
+    records = []
+    if data['mode'] == 'cprofile':
+        for func, (_, ncalls, tottime, cumtime, _) in data['stats'].items():
+            records.append((pstats.func_std_string(func), ncalls,
+                            tottime, cumtime))
+    else:
+        interval = data['interval']
+        for func, (self_count, count) in data['stats'].items():
+            records.append((pstats.func_std_string(func), float('nan'),
+                            self_count * interval, count * interval))
+    df = pd.DataFrame(records, columns=PROFILE_COLUMNS)
+    df = df.sort_values('Cumulative Time', ascending=False)
+    df = df.reset_index(drop=True)
+    if top is not None:
+        df = df.head(top)
+    return df
@@ -0,0 +1,61 @@
+import time
+
+from daskperiment.util.hashing import get_fast_hash, get_hash, get_sampled_hash
+
+
+# full: hash inputs and output entirely with dask tokenize
+# sampled: hash deterministic subset of rows of large inputs and output
+# fast: hash raw buffers of inputs and output with non-cryptographic hash
+# async: same as full, but hash on a background thread
+# off: do not check purity
+PURITY_MODES = ('full', 'sampled', 'fast', 'async', 'off')
+
+_HASHERS = {'full': get_hash,
+            'sampled': get_sampled_hash,
+            'fast': get_fast_hash,
+            'async': get_hash}
+
+
+def validate_purity(purity):
+    """
+    Validate purity check mode
+    """
+    if purity not in PURITY_MODES:
+        msg = 'purity must be one of {}, given: {}'
+        raise ValueError(msg.format(', '.join(PURITY_MODES), purity))
+    return purity
+
+
+class PurityCheck(object):
+    """
+    A purity check of a single step invocation
+    """
+
+    def __init__(self, func, args, kwargs, result, purity, input_hash=None):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.result = result
+        self.purity = purity
+
+        if self.hasher is not get_hash:
+            # input_hash is calculated by dask tokenize
+            input_hash = None
+        self.input_hash = input_hash
+
+    def __repr__(self):
+        fmt = 'PurityCheck(step: {}, purity: {})'
+        return fmt.format(self.func.__name__, self.purity)
+
+    @property
+    def hasher(self):
+        return _HASHERS[self.purity]
+
+    def run(self, trials):
+        """
+        Check purity and return elapsed time in seconds
+        """
+        start = time.perf_counter()
+        trials.maybe_pure(self.func, (self.args, self.kwargs), self.result,
+                          input_hash=self.input_hash, hasher=self.hasher)
+        return time.perf_counter() - start
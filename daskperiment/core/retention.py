@@ -0,0 +1,207 @@
+import collections
+
+import pandas as pd
+
+from daskperiment.util.log import get_logger
+
+
+logger = get_logger(__name__)
+
+
+class RetentionPolicy(object):
+    """
+    Policy to select trials whose artifacts (persisted results, code,
+    environment info, profiles and traces) are kept.
+
+    History, parameters and metrics of trials are always kept.
+
+    Prameters
+    ---------
+    keep_last: int, optional
+       Keep artifacts of the latest N trials.
+    keep_best: int, optional
+       Keep artifacts of the best K trials by their results.
+    max_bytes: int, optional
+       Remove artifacts of trials from the oldest until the total bytes
+       fits within max_bytes. Trials kept by keep_last and keep_best are
+       not removed.
+    minimize: bool, default False
+       If True, smaller result is regarded as better in keep_best.
+
+    If neither keep_last nor keep_best is provided, all the trials are kept
+    unless max_bytes is exceeded.
+    """
+
+    def __init__(self, keep_last=None, keep_best=None, max_bytes=None,
+                 minimize=False):
+        for name, value in [('keep_last', keep_last),
+                            ('keep_best', keep_best),
+                            ('max_bytes', max_bytes)]:
+            if value is not None and value < 0:
+                msg = '{} must be 0 or positive, given: {}'
+                raise ValueError(msg.format(name, value))
+        self.keep_last = keep_last
+        self.keep_best = keep_best
+        self.max_bytes = max_bytes
+        self.minimize = minimize
+
+    def __repr__(self):
+        fmt = ('RetentionPolicy(keep_last: {}, keep_best: {}, '
+               'max_bytes: {}, minimize: {})')
+        return fmt.format(self.keep_last, self.keep_best, self.max_bytes,
+                          self.minimize)
+
+    def protected(self, trial_ids, history):
+        """
+        Return a set of trial IDs kept by keep_last and keep_best.
+        Returns None if neither is specified.
+        """
+        if self.keep_last is None and self.keep_best is None:
+            return None
+
+        protected = set()
+        if self.keep_last is not None and self.keep_last > 0:
+            protected.update(sorted(trial_ids)[-self.keep_last:])
+        if (self.keep_best is not None and self.keep_best > 0 and
+                len(history) > 0):
+            # failed trials and non-numeric results are never best
+            result = pd.to_numeric(history['Result'], errors='coerce')
+            result = result[history['Success'].astype(bool)].dropna()
+            if self.minimize:
+                best = result.nsmallest(self.keep_best)
+            else:
+                best = result.nlargest(self.keep_best)
+            protected.update(int(trial_id) for trial_id in best.index)
+        return protected
+
+    def select(self, trial_bytes, trial_blobs, blob_bytes, history):
+        """
+        Select trials to be removed.
+
+        Prameters
+        ---------
+        trial_bytes: dict
+           Trial ID and bytes of its artifacts except persisted blobs.
+        trial_blobs: dict
+           Trial ID and a set of persisted blobs referred from the trial.
+        blob_bytes: dict
+           Persisted blob and its bytes.
+        history: DataFrame
+           Trial history.
+
+        Returns
+        -------
+        set: removed trial IDs
+        """
+        trial_ids = set(trial_bytes) | set(trial_blobs)
+        # latest trials may not have artifacts
+        protected = self.protected(trial_ids | set(history.index), history)
+        if protected is None:
+            removed = set()
+            protected = set()
+        else:
+            removed = trial_ids - protected
+
+        if self.max_bytes is None:
+            return removed
+
+        # blobs are shared between trials
+        refcount = collections.Counter()
+        for trial_id in trial_ids - removed:
+            refcount.update(trial_blobs.get(trial_id, ()))
+        total = (sum(trial_bytes.get(trial_id, 0)
+                     for trial_id in trial_ids - removed) +
+                 sum(blob_bytes.get(blob, 0) for blob in refcount))
+
+        for trial_id in sorted(trial_ids - removed - protected):
+            if total <= self.max_bytes:
+                break
+            removed.add(trial_id)
+            total -= trial_bytes.get(trial_id, 0)
+            for blob in trial_blobs.get(trial_id, ()):
+                refcount[blob] -= 1
+                if refcount[blob] == 0:
+                    total -= blob_bytes.get(blob, 0)
+        return removed
+
+
+def _trial_artifact_keys(experiment, trial_id):
+    """
+    Iterate tuples of (category, key) of artifacts saved per trial except
+    persisted results
+    """
+    backend = experiment._backend
+    yield 'code', backend.get_code_key(trial_id)
+    for env in experiment._environment.collectors:
+        yield 'environment', backend.get_environment_key(env.key, trial_id,
+                                                         env.ext)
+    yield 'profile', backend.get_profile_key(trial_id)
+    yield 'trace', backend.get_trace_key(trial_id)
+
+
+def collect_garbage(experiment, policy, dry_run=True):
+    """
+    Remove artifacts of trials not kept by the policy, and persisted blobs
+    which are not referred from any trial.
+
+    Returns a DataFrame of removed artifacts. Nothing is removed if
+    dry_run is True.
+    """
+    backend = experiment._backend
+    history = experiment.get_history()
+
+    trial_ids = set(int(trial_id) for trial_id in history.index)
+    persisted = backend.list_persisted()
+    trial_ids.update(trial_id for _, trial_id, _ in persisted)
+
+    # (trial ID, category, key, bytes)
+    artifacts = []
+    for trial_id in sorted(trial_ids):
+        for category, key in _trial_artifact_keys(experiment, trial_id):
+            nbytes = backend.get_nbytes(key)
+            if nbytes is not None:
+                artifacts.append((trial_id, category, key, nbytes))
+
+    trial_blobs = collections.defaultdict(set)
+    for step, trial_id, key in persisted:
+        nbytes = backend.get_nbytes(key)
+        if nbytes is None:
+            continue
+        artifacts.append((trial_id, 'persist', key, nbytes))
+        reference = backend.get_persisted_reference(key)
+        if reference is not None:
+            trial_blobs[trial_id].add(reference)
+
+    trial_bytes = collections.Counter()
+    for trial_id, _, _, nbytes in artifacts:
+        trial_bytes[trial_id] += nbytes
+    blob_bytes = backend.list_persist_blobs()
+
+    removed_trials = policy.select(trial_bytes, trial_blobs, blob_bytes,
+                                   history)
+    removed = [a for a in artifacts if a[0] in removed_trials]
+
+    referred = set()
+    for trial_id, blobs in trial_blobs.items():
+        if trial_id not in removed_trials:
+            referred.update(blobs)
+    for blob in sorted(blob_bytes):
+        if blob not in referred:
+            removed.append((None, 'persist blob',
+                            backend.get_persist_blob_key(blob),
+                            blob_bytes[blob]))
+
+    if not dry_run:
+        # remove references before blobs
+        for _, _, key, _ in removed:
+            backend.remove(key)
+
+    msg = '{} {} artifacts of {} trials, {} bytes'
+    logger.info(msg.format('Found removable' if dry_run else 'Removed',
+                           len(removed), len(removed_trials),
+                           sum(a[3] for a in removed)))
+
+    columns = ['Trial ID', 'Category', 'Key', 'Bytes']
+    records = [(trial_id, category, str(key), nbytes)
+               for trial_id, category, key, nbytes in removed]
+    return pd.DataFrame(records, columns=columns)
@@ -0,0 +1,161 @@
+import concurrent.futures
+
+import daskperiment.io.pickle as pickle
+from daskperiment.util.log import get_logger
+
+
+logger = get_logger(__name__)
+
+
+def _run_trial(payload):
+    """
+    Perform a trial in a worker process.
+
+    Returns serialized tuple of (result, exception, records). Records are
+    updates of the backend to be replayed in the parent process.
+    """
+    task, seed, trial_id, kwargs = pickle.loads(payload)
+    backend = task._experiment._backend
+
+    backend.start_recording()
+    try:
+        result = task.compute(seed=seed, trial_id=trial_id, **kwargs)
+        error = None
+    except Exception as e:
+        result, error = None, e
+    finally:
+        records = backend.stop_recording()
+    return pickle.dumps((result, error, records))
+
+
+class ProcessPoolTrialRunner(object):
+    """
+    Perform trials in worker processes.
+
+    Trial IDs are reserved in the parent process, and each trial is
+    performed as a whole in a worker process. Thus, trials consist of
+    CPU-bound pure-Python steps can use all the cores.
+
+    Database-like backends are directly updated from worker processes.
+    Updates of LocalBackend are sent back and saved by the parent process,
+    thus only the parent process writes the experiment file.
+    """
+
+    def __init__(self, max_workers=None):
+        """
+        Prameters
+        ---------
+        max_workers: int, optional
+           The number of worker processes. If not provided, the number of
+           processors on the machine.
+        """
+        self.max_workers = max_workers
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers)
+
+    def __repr__(self):
+        return 'ProcessPoolTrialRunner(max_workers={})'.format(
+            self.max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ex_type, ex_value, trace):
+        self.shutdown()
+        return False
+
+    def shutdown(self, wait=True):
+        """
+        Shutdown worker processes
+        """
+        self._executor.shutdown(wait=wait)
+
+    def submit(self, result, seed=None, parameters=None, **kwargs):
+        """
+        Submit a trial to be performed in a worker process.
+
+        Prameters
+        ---------
+        result: Result
+           Experiment result to be computed
+        seed: int, optional
+           Random seed.
+        parameters: dict, optional
+           Parameter values used only in the trial.
+        kwargs:
+           Keywords passed to dask compute in the worker process. Trial is
+           computed with synchronous scheduler by default.
+
+        Returns
+        -------
+        concurrent.futures.Future: future
+           Future of the trial result. Its trial_id attribute specifies the
+           Trial ID.
+        """
+        from daskperiment.core.experiment import TrialTask
+
+        task = TrialTask(result, parameters=parameters)
+        experiment = task._experiment
+        # when myself is not executable, immediately raise
+        # (do not store history)
+        experiment.check_executable(parameters=task._parameters)
+
+        trial_id = experiment._trials.reserve()
+        msg = 'Submitted Experiment to worker process (trial id={})'
+        logger.info(msg.format(trial_id))
+
+        kwargs.setdefault('scheduler', 'sync')
+        payload = pickle.dumps((task, seed, trial_id, kwargs))
+
+        future = concurrent.futures.Future()
+        future.trial_id = trial_id
+
+        def callback(worker_future):
+            self._finish(experiment, worker_future, future)
+
+        self._executor.submit(_run_trial, payload).add_done_callback(callback)
+        return future
+
+    def _finish(self, experiment, worker_future, future):
+        """
+        Save the trial performed in the worker process
+        """
+        try:
+            result, error, records = pickle.loads(worker_future.result())
+            experiment._backend.replay(records)
+            experiment._save_backend()
+        except Exception as e:
+            # worker process is terminated abruptly
+            msg = 'Worker process failed (trial id={}): {}'
+            logger.error(msg.format(future.trial_id, e))
+            future.set_exception(e)
+            return
+
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def map(self, result, parameters, seed=None, **kwargs):
+        """
+        Perform trials per parameters in worker processes.
+
+        Prameters
+        ---------
+        result: Result
+           Experiment result to be computed
+        parameters: list of dict
+           Parameter values per trial. Parameters which are not specified
+           use current values.
+        seed: int, optional
+           Random seed shared between trials.
+
+        Returns
+        -------
+        list: results
+        """
+        futures = [self.submit(result, seed=seed, parameters=p, **kwargs)
+                   for p in parameters]
+        concurrent.futures.wait(futures)
+        # raise the first exception after all trials are saved
+        return [future.result() for future in futures]
@@ -0,0 +1,99 @@
+import contextlib
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from dask.sizeof import sizeof
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+
+STEP_LOG_COLUMNS = ['Step', 'Started', 'Wall Time', 'CPU Time', 'Hash Time',
+                    'Process Peak RSS', 'Result Size', 'From Cache']
+
+
+def _thread_time():
+    try:
+        return time.thread_time()
+    except AttributeError:
+        # Python 3.6 or unsupported platform
+        return time.process_time()
+
+
+def get_peak_rss():
+    """
+    Return peak resident set size of the current process in bytes,
+    NaN if not available
+    """
+    if resource is None:
+        return np.nan
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak
+    # Linux reports in kilobytes
+    return peak * 1024
+
+
+class StepTimer(object):
+    """
+    Context manager to measure resource usage of an experiment step.
+
+    CPU time is measured per thread. Hash time is the time spent in hashing
+    inputs and output. Process peak RSS is the all-time peak RSS of the
+    process when the step is finished, which is not specific to the step.
+    """
+
+    def __init__(self):
+        self.hash_time = 0.
+
+    @contextlib.contextmanager
+    def hashing(self):
+        """
+        Measure time spent in hashing
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.hash_time += time.perf_counter() - start
+
+    def __enter__(self):
+        self.started = pd.Timestamp.now()
+        self._wall = time.perf_counter()
+        self._cpu = _thread_time()
+        return self
+
+    def __exit__(self, ex_type, ex_value, trace):
+        self.wall_time = time.perf_counter() - self._wall
+        self.cpu_time = _thread_time() - self._cpu
+        self.peak_rss = get_peak_rss()
+        return False
+
+    def record(self, step, result, from_cache):
+        """
+        Return a step log record
+        """
+        return {'Step': step,
+                'Started': self.started,
+                'Wall Time': self.wall_time,
+                'CPU Time': self.cpu_time,
+                'Hash Time': self.hash_time,
+                'Process Peak RSS': self.peak_rss,
+                'Result Size': sizeof(result),
+                'From Cache': from_cache}
+
+
+def to_step_log_frame(records):
+    """
+    Convert step log records to DataFrame
+    """
+    df = pd.DataFrame(records, columns=STEP_LOG_COLUMNS)
+    for column in ['Wall Time', 'CPU Time', 'Hash Time']:
+        df[column] = pd.to_timedelta(df[column], unit='s')
+    df['From Cache'] = df['From Cache'].astype(bool)
+    return df
@@ -0,0 +1,74 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+
+class TrialTracer(object):
+    """
+    Collect spans of a single trial as Chrome trace events.
+
+    The trace can be opened with chrome://tracing or Perfetto.
+    Spans are recorded from multiple threads, thus each event holds the
+    thread which executes the span.
+    """
+
+    def __init__(self, trial_id):
+        self.trial_id = trial_id
+
+        self._lock = threading.Lock()
+        self._events = []
+        # thread ident -> thread name
+        self._threads = {}
+
+        # use wall clock as origin to align traces of different trials
+        self._origin = time.time()
+        self._counter = time.perf_counter()
+
+    def _timestamp(self, counter):
+        # Chrome trace uses microseconds
+        return (self._origin + counter - self._counter) * 1e6
+
+    @contextlib.contextmanager
+    def span(self, name, category, **args):
+        """
+        Record a span of the block
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            thread = threading.current_thread()
+            event = {'name': name, 'cat': category, 'ph': 'X',
+                     'ts': self._timestamp(start),
+                     'dur': (end - start) * 1e6,
+                     'pid': os.getpid(), 'tid': thread.ident,
+                     'args': args}
+            with self._lock:
+                self._events.append(event)
+                self._threads[thread.ident] = thread.name
+
+    def to_dict(self):
+        """
+        Return trace in Chrome trace event format
+        """
+        pid = os.getpid()
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+
+        name = 'Trial {}'.format(self.trial_id)
+        metadata = [{'name': 'process_name', 'ph': 'M', 'pid': pid,
+                     'args': {'name': name}}]
+        for ident, thread_name in threads.items():
+            metadata.append({'name': 'thread_name', 'ph': 'M', 'pid': pid,
+                             'tid': ident, 'args': {'name': thread_name}})
+        events = sorted(events, key=lambda event: event['ts'])
+        return {'traceEvents': metadata + events,
+                'displayTimeUnit': 'ms',
+                'otherData': {'trial_id': self.trial_id}}
+
+    def dumps(self):
+        return json.dumps(self.to_dict(), default=str)
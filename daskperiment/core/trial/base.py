@@ -1,12 +1,16 @@
+import concurrent.futures
+import contextlib
 import threading
 
 import numpy as np
 import pandas as pd
 
+from daskperiment.backend.base import get_step_input_key
 from daskperiment.core.errors import TrialIDNotFoundError
 from daskperiment.util.hashing import get_hash
 from daskperiment.util.log import get_logger
 from daskperiment.core.parameter import ParameterManager
+from daskperiment.core.trace import TrialTracer
 
 
 logger = get_logger(__name__)
@@ -15,7 +19,7 @@ logger = get_logger(__name__)
 class TrialResult(object):
 
     def __init__(self, result, success, finished,
-                 process_time, description, seed):
+                 process_time, description, seed, resumed_from=None):
         self.result = result
         if result is None:
             self.result_type = 'None'
@@ -26,6 +30,7 @@ class TrialResult(object):
         self.process_time = process_time
         self.description = description
         self.seed = seed
+        self.resumed_from = resumed_from
 
     def __repr__(self):
         if self.success:
@@ -41,7 +46,8 @@ class TrialResult(object):
                   'Finished': self.finished,
                   'Process Time': self.process_time,
                   'Description': self.description,
-                  'Seed': self.seed}
+                  'Seed': self.seed,
+                  'Resumed From': self.resumed_from}
         return record
 
 
@@ -49,10 +55,24 @@ class TrialState(object):
     """
     A class represents a single trial state during execution
     """
-    def __init__(self, trial_id, experiment, seed=None):
+    def __init__(self, trial_id, experiment, seed=None, parameters=None,
+                 resumed_from=None, profiler=None, trace=False):
         self._current_trial_id = trial_id
         self.experiment = experiment
         self.seed = seed
+        # ParameterManager used in the trial, experiment's one if None
+        self.parameters = parameters
+        # Trial ID which the trial continues from
+        self.resumed_from = resumed_from
+        # profiler capturing the trial, not profiled if None
+        self.profiler = profiler
+        # tracer recording spans of the trial, not traced if None
+        if trace:
+            self.tracer = TrialTracer(trial_id)
+        else:
+            self.tracer = None
+        # random state used only in the trial, created when seeded
+        self.random_state = None
         self._running = False
 
     @property
@@ -65,27 +85,93 @@ class TrialState(object):
             raise TrialIDNotFoundError(msg)
 
     def __enter__(self):
+        self._start_tracer()
+        self._start()
+        self.experiment._trials.prefetch_step_hashes(
+            (self.current_trial_id, ), self.experiment._codes.codes)
+        self._start_profiler()
+        return self
+
+    def __exit__(self, ex_type, ex_value, trace):
+        # exception must be handled in with block
+        self._stop_profiler()
+        self._finish()
+
+        with self.experiment._span('save backend', 'backend'):
+            self.experiment._save_backend()
+        self._stop_tracer()
+        self.experiment._trials.unlock()
+        return False
+
+    def _start_tracer(self):
+        if self.tracer is None:
+            return
+        trial_id = self._current_trial_id
+        self.experiment._tracers[trial_id] = self.tracer
+        self._trial_span = self.tracer.span('trial {}'.format(trial_id),
+                                            'trial')
+        self._trial_span.__enter__()
+
+    def _stop_tracer(self):
+        if self.tracer is None:
+            return
+        self._trial_span.__exit__(None, None, None)
+        trial_id = self._current_trial_id
+        self.experiment._tracers.pop(trial_id, None)
+        self.experiment._save_trace(trial_id, self.tracer)
+
+    def _start_profiler(self):
+        if self.profiler is None:
+            return
+        msg = 'Started {} profiler (trial id={})'
+        logger.info(msg.format(self.profiler.mode, self.current_trial_id))
+        self.experiment._profilers[self.current_trial_id] = self.profiler
+        self.profiler.start()
+
+    def _stop_profiler(self):
+        if self.profiler is None:
+            return
+        data = self.profiler.stop()
+        self.experiment._profilers.pop(self.current_trial_id, None)
+        self.experiment._save_profile(self.current_trial_id, data)
+
+    def _start(self):
         self._running = True
 
         self._start_time = pd.Timestamp.now()
-        msg = 'Started Experiment (trial id={})'
-        logger.info(msg.format(self.current_trial_id))
+        if self.resumed_from is None:
+            msg = 'Started Experiment (trial id={})'
+            logger.info(msg.format(self.current_trial_id))
+        else:
+            msg = 'Started Experiment (trial id={}, resumed from trial id={})'
+            logger.info(msg.format(self.current_trial_id, self.resumed_from))
 
-        self.experiment._save_experiment_step(self.current_trial_id)
+        self.experiment._save_experiment_step(self.current_trial_id,
+                                              parameters=self.parameters)
         self.set_seed()
 
-        return self
-
-    def __exit__(self, ex_type, ex_value, trace):
-        # exception must be handled in with block
+    def _finish(self):
         msg = 'Finished Experiment (trial id={})'
         logger.info(msg.format(self.current_trial_id))
-
-        self.experiment._save_backend()
-        self.experiment._trials.unlock()
+        try:
+            self.wait_persist()
+        except Exception as e:
+            # trial is already failed if not waited before
+            msg = 'Unable to save persisted step: {}({})'
+            logger.warning(msg.format(e.__class__.__name__, e))
+        self.experiment._trials.wait_purity_checks(self.current_trial_id)
+        self.experiment._trials.flush_step_hashes(self.current_trial_id)
+        self.experiment._trials.flush_step_log(self.current_trial_id)
+        self.experiment._random_states.pop(self.current_trial_id, None)
         self._running = False
 
-        return False
+    def wait_persist(self):
+        """
+        Wait persisted steps of the trial written on background. Raises
+        an exception if any of them failed.
+        """
+        with self.experiment._span('wait persist', 'backend'):
+            self.experiment._persist_writer.wait(self.current_trial_id)
 
     def set_seed(self):
         if self.seed is None:
@@ -101,7 +187,18 @@ class TrialState(object):
         else:
             msg = ('Random seed is initialized with given seed: {}')
             logger.info(msg.format(self.seed))
-
+            if self.experiment._trials.is_concurrent():
+                msg = ('Other trials are running concurrently. Global random '
+                       'state is shared between them and the trial may not '
+                       'be reproducible, use Experiment.random_state '
+                       'instead (trial id={})')
+                logger.warning(msg.format(self.current_trial_id))
+
+        self.random_state = np.random.RandomState(self.seed)
+        self.experiment._random_states[self.current_trial_id] = \
+            self.random_state
+
+        # kept for steps using global random state
         import random
         random.seed(self.seed)
         np.random.seed(self.seed)
@@ -112,8 +209,46 @@ class TrialState(object):
         record = TrialResult(result=result, success=success,
                              finished=end_time,
                              process_time=end_time - self._start_time,
-                             description=description, seed=self.seed)
-        self.experiment._trials.save_result(self.current_trial_id, record)
+                             description=description, seed=self.seed,
+                             resumed_from=self.resumed_from)
+        with self.experiment._span('save result', 'backend'):
+            self.experiment._trials.save_result(self.current_trial_id,
+                                                record)
+
+
+class TrialBatchState(object):
+    """
+    A class represents multiple trial states executed in a single
+    computation graph
+    """
+    def __init__(self, trial_states, experiment):
+        self.trial_states = trial_states
+        self.experiment = experiment
+
+    @property
+    def trial_ids(self):
+        return tuple(s._current_trial_id for s in self.trial_states)
+
+    def __enter__(self):
+        seed = None
+        for state in self.trial_states:
+            if seed is not None:
+                # trials in a batch share the same random state
+                state.seed = seed
+            state._start()
+            seed = state.seed
+        self.experiment._trials.prefetch_step_hashes(
+            self.trial_ids, self.experiment._codes.codes)
+        return self
+
+    def __exit__(self, ex_type, ex_value, trace):
+        # exception must be handled in with block
+        for state in self.trial_states:
+            state._finish()
+
+        self.experiment._save_backend()
+        self.experiment._trials.unlock()
+        return False
 
 
 class _TrialManager(object):
@@ -126,81 +261,170 @@ class _TrialManager(object):
     def __getstate__(self):
         # do not modify my __dict__
         state = self.__dict__.copy()
-        # do not pickle threading Lock
+        # do not pickle threading Lock and thread local trial state
         state.pop('_lock_obj', None)
-        state.pop('_lock_owner', None)
+        state.pop('_local_obj', None)
+        state.pop('_running', None)
+        state.pop('_step_log_buffer_obj', None)
+        state.pop('_purity_executor_obj', None)
+        state.pop('_purity_checks_obj', None)
         return state
 
     @property
     def _lock(self):
         if not hasattr(self, '_lock_obj'):
-            self._lock_obj = threading.Lock()
-            self._lock_owner = threading.current_thread()
+            self._lock_obj = threading.RLock()
         return self._lock_obj
 
+    @property
+    def _local(self):
+        """
+        Thread local storage which holds a stack of running trial IDs
+        """
+        if not hasattr(self, '_local_obj'):
+            self._local_obj = threading.local()
+        return self._local_obj
+
+    @property
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
     def is_locked(self):
         """
-        Check whether myself is locked. IOW, whether the trial is
+        Check whether myself is locked. IOW, whether any trial is
         being executed or not.
         """
-        return self._lock.locked()
+        return getattr(self, '_running', 0) > 0
+
+    def is_concurrent(self):
+        """
+        Check whether multiple trials are being executed in this process.
+        """
+        return getattr(self, '_running', 0) > 1
+
+    def in_trial(self):
+        """
+        Check whether the current thread is executing a trial.
+        """
+        return len(self._stack) > 0
 
-    def lock(self):
+    def lock(self, trial_ids):
         """
         Lock myself and guarantee the same Trial ID is returned during a
-        single trial. Note that it doesn't lock backend (db, file, etc)
+        single trial in the current thread. Other threads can perform other
+        trials concurrently. Note that it doesn't lock backend (db, file, etc)
         """
-        self._lock.acquire()
-        self._lock_owner = threading.current_thread()
+        with self._lock:
+            self._running = getattr(self, '_running', 0) + 1
+        self._stack.append(tuple(trial_ids))
 
     def unlock(self):
         """
-        Unlock myself.
+        Unlock myself (the trial performed in the current thread).
         """
-        self._lock.release()
+        self._stack.pop()
+        with self._lock:
+            self._running -= 1
+
+    def reserve(self):
+        """
+        Returns incremented Trial ID without locking myself.
+
+        The reserved Trial ID should be used by a trial performed later.
+        """
+        with self._lock:
+            return self._increment()
 
     def increment(self):
         """
         Lock myself and returns incremented Trial ID.
         """
-        self.lock()
-        self._current_trial_id = self._increment()
-        return self.current_trial_id
+        trial_id = self.reserve()
+        self.lock((trial_id, ))
+        return trial_id
 
     @property
     def current_trial_id(self):
-        if self.is_locked():
-            # TODO: is locked by myself?
-            return self._current_trial_id
+        return self.current_trial_ids[0]
+
+    @property
+    def current_trial_ids(self):
+        """
+        Return trial IDs which the current execution belongs to.
+
+        A step shared between trials in a batch belongs to multiple trials.
+        """
+        stack = self._stack
+        if len(stack) > 0:
+            return stack[-1]
         else:
             msg = "Current Trial ID only exists during a trial execution"
             raise TrialIDNotFoundError(msg)
 
-    def start(self, experiment, seed=None):
-        # increment trial id BEFORE experiment start lock myself
-        trial_id = self.increment()
-        return TrialState(trial_id, experiment, seed=seed)
+    @contextlib.contextmanager
+    def bind(self, trial_ids):
+        """
+        Bind trial IDs to the current thread during the block.
+
+        Dask worker threads may be shared between concurrent trials,
+        thus each task must be bound to its trial.
+        """
+        stack = self._stack
+        stack.append(tuple(trial_ids))
+        try:
+            yield
+        finally:
+            stack.pop()
+
+    def start(self, experiment, seed=None, parameters=None, trial_id=None,
+              resumed_from=None, profiler=None, trace=False):
+        if trial_id is None:
+            # increment trial id BEFORE experiment start lock myself
+            trial_id = self.increment()
+        else:
+            # use reserved trial id
+            self.lock((trial_id, ))
+        return TrialState(trial_id, experiment, seed=seed,
+                          parameters=parameters, resumed_from=resumed_from,
+                          profiler=profiler, trace=trace)
+
+    def start_batch(self, experiment, parameters, seed=None):
+        """
+        Lock myself and returns TrialBatchState which has incremented
+        Trial IDs per parameters.
+        """
+        with self._lock:
+            trial_ids = [self._increment() for _ in parameters]
+        self.lock(trial_ids)
+
+        states = [TrialState(trial_id, experiment, seed=seed, parameters=p)
+                  for trial_id, p in zip(trial_ids, parameters)]
+        return TrialBatchState(states, experiment)
 
     ##########################################################
     # Step Management
     ##########################################################
 
-    def maybe_pure(self, func, inputs, result):
+    def maybe_pure(self, func, inputs, result, input_hash=None,
+                   hasher=get_hash):
         """
         Check whether the function is pure.
 
         Actually, it only compares the hash of the function result based on
-        its input.
+        its input. Hashes are calculated by the hasher.
         """
         # inputs is a tuple of args, kwargs
         assert isinstance(inputs, tuple)
         assert len(inputs) == 2
         args, kwargs = inputs
 
-        input_hash = get_hash(*args, **kwargs)
-        output_hash = get_hash(result)
+        if input_hash is None:
+            input_hash = hasher(*args, **kwargs)
+        output_hash = hasher(result)
 
-        input_key = func.__name__ + '-' + input_hash
+        input_key = get_step_input_key(func.__name__, input_hash)
 
         previous_hash = self._update_step_hash(input_key, output_hash)
         maybe_pure = (output_hash == previous_hash)
@@ -210,6 +434,102 @@ class _TrialManager(object):
             logger.warning(msg.format(func.__name__, args, kwargs))
         return maybe_pure
 
+    def prefetch_step_hashes(self, trial_ids, steps=()):
+        """
+        Prefetch step hashes of the steps used in the trials.
+        Database-like backends override this to avoid a round trip per
+        step.
+        """
+        pass
+
+    def flush_step_hashes(self, trial_id):
+        """
+        Save step hashes updated in the trial
+        """
+        pass
+
+    @property
+    def _purity_executor(self):
+        """
+        Executor to check purity on a background thread
+        """
+        with self._lock:
+            if not hasattr(self, '_purity_executor_obj'):
+                executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+                self._purity_executor_obj = executor
+            return self._purity_executor_obj
+
+    @property
+    def _purity_checks(self):
+        """
+        Futures of purity checks running on background per trial ID
+        """
+        if not hasattr(self, '_purity_checks_obj'):
+            self._purity_checks_obj = {}
+        return self._purity_checks_obj
+
+    def submit_purity_check(self, trial_ids, check, record=None):
+        """
+        Check purity on a background thread. The check must be finished
+        before the trial is finished.
+
+        Elapsed time is added to the step log record if provided.
+        """
+        def run():
+            with self.bind(trial_ids):
+                elapsed = check.run(self)
+            if record is not None:
+                record['Hash Time'] += elapsed
+
+        future = self._purity_executor.submit(run)
+        with self._lock:
+            for trial_id in trial_ids:
+                self._purity_checks.setdefault(trial_id, []).append(future)
+        return future
+
+    def wait_purity_checks(self, trial_id):
+        """
+        Wait purity checks of the trial running on background
+        """
+        with self._lock:
+            futures = self._purity_checks.pop(trial_id, [])
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                msg = 'Unable to check purity: {}({})'
+                logger.warning(msg.format(e.__class__.__name__, e))
+
+    ##########################################################
+    # Step Log
+    ##########################################################
+
+    @property
+    def _step_log_buffer(self):
+        """
+        Step log records per trial ID which are not saved yet
+        """
+        if not hasattr(self, '_step_log_buffer_obj'):
+            self._step_log_buffer_obj = {}
+        return self._step_log_buffer_obj
+
+    def append_step_log(self, trial_ids, record):
+        """
+        Buffer a step log record. Records are saved in a batch
+        when the trial is finished.
+        """
+        with self._lock:
+            for trial_id in trial_ids:
+                self._step_log_buffer.setdefault(trial_id, []).append(record)
+
+    def flush_step_log(self, trial_id):
+        """
+        Save buffered step log records of the trial
+        """
+        with self._lock:
+            records = self._step_log_buffer.pop(trial_id, [])
+        self._save_step_log(trial_id, records)
+
     ##########################################################
     # Trial Management
     ##########################################################
@@ -234,7 +554,8 @@ class _TrialManager(object):
                                             orient='index')
         if verbose:
             result_index = ['Seed', 'Result', 'Result Type', 'Success',
-                            'Finished', 'Process Time', 'Description']
+                            'Finished', 'Process Time', 'Description',
+                            'Resumed From']
         else:
             result_index = ['Result', 'Success', 'Finished',
                             'Process Time', 'Description']
@@ -18,43 +18,109 @@ class LocalTrialManager(_TrialManager):
         # store function input hash and its output hash
         self._hashes = {}
 
+        # store step key and trial id which persisted its output
+        self._step_trials = {}
+
+        # store step log records per trial id
+        self._step_logs = {}
+
     @property
     def trial_id(self):
         """
         Return latest trial ID.
         """
-        if self.is_locked():
+        if self.in_trial():
             msg = ('Unable to use TrialManager.trial_id during trial. '
                    'Use .current_trial_id for safety.')
             raise LockedTrialError(msg)
         return self._trial_id
 
+    def __getstate__(self):
+        # copy containers which may be updated by concurrent trials
+        with self._lock:
+            state = super().__getstate__()
+            state.pop('_records', None)
+            for key in ['_parameters_history', '_result_history', '_hashes',
+                        '_step_trials', '_step_logs']:
+                state[key] = state[key].copy()
+        return state
+
+    def __setstate__(self, state):
+        # compat for instances pickled by previous versions
+        state.setdefault('_step_trials', {})
+        state.setdefault('_step_logs', {})
+        self.__dict__.update(state)
+
+    def _record(self, method, *args):
+        """
+        Record an update to be replayed in other process if recording
+        """
+        records = getattr(self, '_records', None)
+        if records is not None:
+            records.append((method, args))
+
     def _increment(self):
         self._trial_id += 1
         return self._trial_id
 
     def _save_parameters(self, trial_id, params):
-        self._parameters_history[trial_id] = params
+        with self._lock:
+            self._parameters_history[trial_id] = params
+            self._record('_save_parameters', trial_id, params)
 
     def load_parameters(self, trial_id):
         return self._parameters_history[trial_id]
 
     def _save_result(self, trial_id, params):
-        self._result_history[trial_id] = params
+        with self._lock:
+            self._result_history[trial_id] = params
+            self._record('_save_result', trial_id, params)
+
+    def load_result(self, trial_id):
+        return self._result_history[trial_id]
 
     def get_parameter_history(self):
-        return self._parameters_history.copy()
+        with self._lock:
+            return self._parameters_history.copy()
 
     def get_result_history(self):
-        return self._result_history.copy()
+        with self._lock:
+            return self._result_history.copy()
 
     def _update_step_hash(self, key, output_hash):
         """
         Update the hash result of experiment step. Return previous hash
         if exists.
         """
-        # return previous hash if exists, otherwise returns current
-        previous_hash = self._hashes.get(key, output_hash)
-        # overwrite with current hash
-        self._hashes[key] = output_hash
+        with self._lock:
+            # return previous hash if exists, otherwise returns current
+            previous_hash = self._hashes.get(key, output_hash)
+            # overwrite with current hash
+            self._hashes[key] = output_hash
+            self._record('_update_step_hash', key, output_hash)
         return previous_hash
+
+    def save_step_trial(self, key, trial_id):
+        """
+        Save the trial id which persisted the step output
+        """
+        with self._lock:
+            self._step_trials[key] = trial_id
+            self._record('save_step_trial', key, trial_id)
+
+    def load_step_trial(self, key):
+        """
+        Load the trial id which persisted the step output, None if not exists
+        """
+        return self._step_trials.get(key)
+
+    def _save_step_log(self, trial_id, records):
+        with self._lock:
+            self._step_logs[trial_id] = records
+            self._record('_save_step_log', trial_id, records)
+
+    def load_step_log(self, trial_id):
+        """
+        Load step log records of the trial
+        """
+        return self._step_logs.get(trial_id, [])
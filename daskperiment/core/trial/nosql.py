@@ -1,3 +1,4 @@
+from daskperiment.backend.base import get_step_name
 from daskperiment.core.errors import (LockedTrialError,
                                       TrialIDNotFoundError)
 from daskperiment.core.trial.base import _TrialManager
@@ -8,8 +9,55 @@ from daskperiment.core.parameter import Undefined
 logger = get_logger(__name__)
 
 
+class StepHashBuffer(object):
+    """
+    Step hashes prefetched at trial start, and updates to be saved
+    at trial end.
+    """
+
+    def __init__(self, hashes, steps):
+        self.hashes = hashes
+        # steps whose hashes are loaded
+        self.steps = set(steps)
+        self.updates = {}
+
+    def __repr__(self):
+        fmt = 'StepHashBuffer(steps: {}, hashes: {}, updates: {})'
+        return fmt.format(len(self.steps), len(self.hashes),
+                          len(self.updates))
+
+    def add(self, step, hashes):
+        """
+        Add hashes of the step loaded after prefetch
+        """
+        if step in self.steps:
+            return
+        self.steps.add(step)
+        for key, value in hashes.items():
+            self.hashes.setdefault(key, value)
+
+    def update(self, key, output_hash):
+        """
+        Update the hash. Return previous hash if exists, otherwise current.
+        """
+        previous_output_hash = self.hashes.get(key, output_hash)
+        self.hashes[key] = output_hash
+        self.updates[key] = output_hash
+        return previous_output_hash
+
+    def pop_updates(self):
+        updates = self.updates
+        self.updates = {}
+        return updates
+
+
 class _NoSQLTrialManager(_TrialManager):
 
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.pop('_step_hash_buffers_obj', None)
+        return state
+
     @property
     def experiment_id(self):
         return self.backend.experiment_id
@@ -23,7 +71,7 @@ class _NoSQLTrialManager(_TrialManager):
         """
         Return latest trial ID.
         """
-        if self.is_locked():
+        if self.in_trial():
             msg = ('Unable to use TrialManager.trial_id during trial. '
                    'Use .current_trial_id for safety.')
             raise LockedTrialError(msg)
@@ -47,33 +95,120 @@ class _NoSQLTrialManager(_TrialManager):
         key = self.backend.get_parameter_key(trial_id)
         return self.backend.load_object(key)
 
+    def load_result(self, trial_id):
+        key = self.backend.get_history_key(trial_id)
+        return self.backend.load_object(key)
+
     def _save_result(self, trial_id, params):
         key = self.backend.get_history_key(trial_id)
         self.backend.save_object(key, params)
 
+    def _save_step_log(self, trial_id, records):
+        key = self.backend.get_step_log_key(trial_id)
+        self.backend.save_object(key, records)
+
+    def load_step_log(self, trial_id):
+        """
+        Load step log records of the trial
+        """
+        key = self.backend.get_step_log_key(trial_id)
+        try:
+            return self.backend.load_object(key)
+        except TrialIDNotFoundError:
+            # trials performed by previous versions
+            return []
+
     def get_parameter_history(self):
         return self._get_parameter_history()
 
     def get_result_history(self):
         return self._get_result_history()
 
+    @property
+    def _step_hash_buffers(self):
+        """
+        StepHashBuffer per Trial ID
+        """
+        if not hasattr(self, '_step_hash_buffers_obj'):
+            self._step_hash_buffers_obj = {}
+        return self._step_hash_buffers_obj
+
+    def prefetch_step_hashes(self, trial_ids, steps=()):
+        """
+        Load the step hashes of the given steps in one bulk read. Trials in
+        a batch share the loaded hashes.
+        """
+        steps = list(steps)
+        buffer = StepHashBuffer(self.backend.load_step_hashes(steps), steps)
+        with self._lock:
+            for trial_id in trial_ids:
+                self._step_hash_buffers[trial_id] = buffer
+
+    def flush_step_hashes(self, trial_id):
+        """
+        Save step hashes updated in the trial in one bulk write
+        """
+        with self._lock:
+            buffer = self._step_hash_buffers.pop(trial_id, None)
+            if buffer is None:
+                return
+            updates = buffer.pop_updates()
+        if len(updates) > 0:
+            self.backend.save_step_hashes(updates)
+
+    def _get_step_hash_buffer(self):
+        if not self.in_trial():
+            return None
+        with self._lock:
+            for trial_id in self.current_trial_ids:
+                buffer = self._step_hash_buffers.get(trial_id)
+                if buffer is not None:
+                    return buffer
+        return None
+
     def _update_step_hash(self, input_hash, output_hash):
         """
         Update the hash result of experiment step. Return previous hash
         if exists.
+
+        During a trial, the update is buffered and saved when the trial
+        is finished.
         """
-        # include experiment_id in key
-        key = self.backend.get_step_hash_key(input_hash)
+        step = get_step_name(input_hash)
+        buffer = self._get_step_hash_buffer()
+        if buffer is not None:
+            if step not in buffer.steps:
+                # step which is not prefetched
+                hashes = self.backend.load_step_hashes([step])
+                with self._lock:
+                    buffer.add(step, hashes)
+            with self._lock:
+                return buffer.update(input_hash, output_hash)
+
+        hashes = self.backend.load_step_hashes([step])
         # return previous hash if exists, otherwise returns current
-        try:
-            previous_output_hash = self.backend.load_text(key)
-        except TrialIDNotFoundError:
-            # it doesn't use trial id...
-            previous_output_hash = output_hash
+        previous_output_hash = hashes.get(input_hash, output_hash)
         # overwrite with current hash
-        self.backend.save_text(key, output_hash)
+        self.backend.save_step_hashes({input_hash: output_hash})
         return previous_output_hash
 
+    def save_step_trial(self, key, trial_id):
+        """
+        Save the trial id which persisted the step output
+        """
+        key = self.backend.get_step_trial_key(key)
+        self.backend.save_text(key, str(trial_id))
+
+    def load_step_trial(self, key):
+        """
+        Load the trial id which persisted the step output, None if not exists
+        """
+        key = self.backend.get_step_trial_key(key)
+        try:
+            return int(self.backend.load_text(key))
+        except TrialIDNotFoundError:
+            return None
+
 
 class RedisTrialManager(_NoSQLTrialManager):
 
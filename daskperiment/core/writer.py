@@ -0,0 +1,127 @@
+import concurrent.futures
+import threading
+
+from dask.sizeof import sizeof
+
+from daskperiment.util.log import get_logger
+
+
+logger = get_logger(__name__)
+
+
+class PersistWriter(object):
+    """
+    Writer of persisted step results running on background threads.
+
+    Steps return immediately after their results are queued, thus
+    computation and backend I/O overlap. Queued results are bounded by
+    max_bytes in total, and queueing more blocks until preceding writes are
+    finished. A result larger than max_bytes is queued when nothing else is
+    queued. Results are written inline if max_bytes is 0.
+    """
+
+    def __init__(self, max_bytes=0, workers=1):
+        if max_bytes < 0:
+            msg = 'Persist buffer size must be 0 or positive, given: {}'
+            raise ValueError(msg.format(max_bytes))
+        if workers < 1:
+            msg = 'Number of persist workers must be positive, given: {}'
+            raise ValueError(msg.format(workers))
+        self.max_bytes = max_bytes
+        self.workers = workers
+
+        self._cond = threading.Condition()
+        # bytes of queued results which are not written yet
+        self.nbytes = 0
+        # trial ID -> futures of writes
+        self._pending = {}
+
+        self.writes = 0
+        # number of writes which waited for preceding writes
+        self.blocked = 0
+
+    def __repr__(self):
+        fmt = 'PersistWriter(nbytes: {}, max_bytes: {}, workers: {})'
+        return fmt.format(self.nbytes, self.max_bytes, self.workers)
+
+    def __getstate__(self):
+        # queued writes and threads are process-local
+        return {'max_bytes': self.max_bytes, 'workers': self.workers}
+
+    def __setstate__(self, state):
+        self.__init__(max_bytes=state['max_bytes'],
+                      workers=state['workers'])
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    @property
+    def _executor(self):
+        with self._cond:
+            if not hasattr(self, '_executor_obj'):
+                executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.workers)
+                self._executor_obj = executor
+            return self._executor_obj
+
+    def submit(self, trial_ids, func, value):
+        """
+        Queue func to write value. The write must be waited via wait
+        before the trials are finished.
+
+        Returns a Future, or None if written inline.
+        """
+        if not self.enabled:
+            func()
+            return None
+
+        nbytes = sizeof(value)
+        with self._cond:
+            blocked = False
+            while self.nbytes > 0 and self.nbytes + nbytes > self.max_bytes:
+                blocked = True
+                self._cond.wait()
+            if blocked:
+                self.blocked += 1
+            self.nbytes += nbytes
+            self.writes += 1
+
+        future = self._executor.submit(self._run, func, nbytes)
+        with self._cond:
+            for trial_id in trial_ids:
+                self._pending.setdefault(trial_id, []).append(future)
+        return future
+
+    def _run(self, func, nbytes):
+        try:
+            func()
+        finally:
+            with self._cond:
+                self.nbytes -= nbytes
+                self._cond.notify_all()
+
+    def wait(self, trial_id):
+        """
+        Wait queued writes of the trial. Raises the first exception
+        raised in the writes.
+        """
+        with self._cond:
+            futures = self._pending.pop(trial_id, [])
+        error = None
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                if error is None:
+                    error = e
+        if error is not None:
+            raise error
+
+    def info(self):
+        """
+        Return writer statistics
+        """
+        with self._cond:
+            return {'writes': self.writes, 'blocked': self.blocked,
+                    'nbytes': self.nbytes, 'max_bytes': self.max_bytes}
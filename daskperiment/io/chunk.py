@@ -0,0 +1,185 @@
+import io
+import itertools
+import json
+import uuid
+
+
+# header of manifest which refers to the chunks of large data
+_MAGIC = b'DPCHUNK\x01'
+
+
+def new_chunk_id():
+    """
+    Generate an ID of chunks. Chunks are written under a new ID each time,
+    thus readers never see partially written data.
+    """
+    return uuid.uuid4().hex
+
+
+def split(data, chunk_size):
+    """
+    Split bytes into chunks without copying
+    """
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size]
+
+
+def dumps_manifest(chunk_id, chunks, nbytes):
+    """
+    Create manifest of chunks stored instead of large data
+    """
+    manifest = {'id': chunk_id, 'chunks': chunks, 'nbytes': nbytes}
+    return _MAGIC + json.dumps(manifest, sort_keys=True).encode('utf-8')
+
+
+def loads_manifest(data):
+    """
+    Load manifest of chunks. Returns None if data is not a manifest.
+    """
+    if not isinstance(data, bytes) or not data.startswith(_MAGIC):
+        return None
+    return json.loads(data[len(_MAGIC):].decode('utf-8'))
+
+
+class ChunkWriter(object):
+    """
+    File-like object which splits written bytes into chunks of chunk_size.
+    Chunks are passed to write_chunks as a list of (index, bytes) in
+    batches of batch_size, thus memory is bounded regardless of the total
+    size.
+
+    Nothing is passed until the data exceeds chunk_size. finish returns
+    the data if it fits in a single chunk, otherwise None.
+    """
+
+    def __init__(self, write_chunks, chunk_size, batch_size=8):
+        self._write_chunks = write_chunks
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+
+        self._buffer = bytearray()
+        self._batch = []
+        # number of chunks passed to write_chunks or batched
+        self.chunks = 0
+        self.nbytes = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        view = memoryview(data).cast('B')
+        pos = 0
+        while pos < len(view):
+            if len(self._buffer) == self.chunk_size:
+                # written when subsequent data arrives, because data
+                # which fits in a single chunk is not chunked
+                self._push()
+            size = min(self.chunk_size - len(self._buffer), len(view) - pos)
+            self._buffer += view[pos:pos + size]
+            pos += size
+        self.nbytes += len(view)
+        return len(view)
+
+    def flush(self):
+        pass
+
+    def _push(self):
+        self._batch.append((self.chunks, bytes(self._buffer)))
+        self._buffer = bytearray()
+        self.chunks += 1
+        if len(self._batch) >= self.batch_size:
+            self._flush_batch()
+
+    def _flush_batch(self):
+        if len(self._batch) > 0:
+            self._write_chunks(self._batch)
+            self._batch = []
+
+    def finish(self):
+        """
+        Write remaining chunks. Returns the data if it is not chunked.
+        """
+        if self.chunks == 0:
+            return bytes(self._buffer)
+        if len(self._buffer) > 0:
+            self._push()
+        self._flush_batch()
+        return None
+
+
+class ChunkReader(io.RawIOBase):
+    """
+    Read-only file-like object over an iterator of bytes, thus chunks are
+    deserialized without being joined
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._current = memoryview(b'')
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        target = memoryview(b).cast('B')
+        size = 0
+        while size < len(target):
+            if len(self._current) == 0:
+                data = next(self._chunks, None)
+                if data is None:
+                    break
+                self._current = memoryview(data).cast('B')
+                continue
+            n = min(len(target) - size, len(self._current))
+            target[size:size + n] = self._current[:n]
+            self._current = self._current[n:]
+            size += n
+        return size
+
+
+def open_reader(chunks):
+    """
+    Open buffered reader over an iterator of bytes
+    """
+    return io.BufferedReader(ChunkReader(chunks))
+
+
+# max bytes of name in the header read by read_header
+_MAX_HEADER_NAME = 64
+
+
+def read_header(chunks, magic):
+    """
+    Read header consists of magic, name and newline from an iterator of
+    bytes. Returns a tuple of (name, iterator of the remaining bytes).
+
+    If the bytes don't start with magic, name is None and the iterator
+    yields all the bytes.
+    """
+    chunks = iter(chunks)
+    max_size = len(magic) + _MAX_HEADER_NAME + 1
+    head = bytearray()
+    consumed = []
+    for data in chunks:
+        consumed.append(data)
+        head += data[:max_size - len(head)]
+        if len(head) >= max_size or b'\n' in head[len(magic):]:
+            break
+
+    if not head.startswith(magic):
+        return None, itertools.chain(consumed, chunks)
+    pos = head.find(b'\n', len(magic))
+    if pos < 0:
+        raise ValueError('Unable to find the end of header')
+    name = bytes(head[len(magic):pos]).decode()
+    return name, itertools.chain(_skip(consumed, pos + 1), chunks)
+
+
+def _skip(chunks, nbytes):
+    for data in chunks:
+        if nbytes >= len(data):
+            nbytes -= len(data)
+            continue
+        yield memoryview(data)[nbytes:]
+        nbytes = 0
@@ -0,0 +1,411 @@
+import collections
+import zlib
+
+import daskperiment.io.chunk as chunk
+
+
+# header of compressed data, followed by codec name and newline
+_MAGIC = b'DPZ\x01'
+
+# categories of data stored in backends
+# persist: persisted step results
+# object: pickled parameters, history, step logs, profiles and references
+# metric: pickled metric records
+# text: code, environment info and traces
+CATEGORIES = ('persist', 'object', 'metric', 'text')
+
+
+class _Codec(object):
+    """
+    Base class of compression codecs.
+
+    Actual class must define name, default_level, compress and decompress.
+    """
+
+    name = None
+    default_level = None
+
+    def __repr__(self):
+        return '{}()'.format(self.__class__.__name__)
+
+    @property
+    def available(self):
+        """
+        Whether required libraries are installed
+        """
+        return True
+
+    def validate(self):
+        """
+        Raise ImportError if required libraries are not installed
+        """
+        return self
+
+    def compress(self, data, level):
+        """
+        This method must be overwritten by actual class
+        """
+        raise NotImplementedError
+
+    def decompress(self, data):
+        """
+        This method must be overwritten by actual class
+        """
+        raise NotImplementedError
+
+    def compressobj(self, level):
+        """
+        Return streaming compressor which has compress and flush.
+        Its output can be decompressed by decompress.
+
+        This method must be overwritten by actual class
+        """
+        raise NotImplementedError
+
+    def decompress_chunks(self, chunks):
+        """
+        Decompress an iterator of bytes chunk by chunk
+
+        This method must be overwritten by actual class
+        """
+        raise NotImplementedError
+
+
+class ZlibCodec(_Codec):
+
+    name = 'zlib'
+    default_level = 1
+
+    def compress(self, data, level):
+        return zlib.compress(data, level)
+
+    def decompress(self, data):
+        return zlib.decompress(data)
+
+    def compressobj(self, level):
+        return zlib.compressobj(level)
+
+    def decompress_chunks(self, chunks):
+        decompressor = zlib.decompressobj()
+        for data in chunks:
+            yield decompressor.decompress(data)
+        yield decompressor.flush()
+
+
+class _OptionalCodec(_Codec):
+
+    # module name to be imported
+    _module = None
+
+    @property
+    def available(self):
+        try:
+            __import__(self._module)
+            return True
+        except ImportError:
+            return False
+
+    def validate(self):
+        if not self.available:
+            msg = '{} compression requires {}'
+            raise ImportError(msg.format(self.name, self._module))
+        return self
+
+
+class ZstdCodec(_OptionalCodec):
+
+    name = 'zstd'
+    default_level = 3
+    _module = 'zstandard'
+
+    def compress(self, data, level):
+        import zstandard
+        return zstandard.ZstdCompressor(level=level).compress(data)
+
+    def decompress(self, data):
+        import zstandard
+        # content size is not written by the streaming compressor
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+    def compressobj(self, level):
+        import zstandard
+        return zstandard.ZstdCompressor(level=level).compressobj()
+
+    def decompress_chunks(self, chunks):
+        import zstandard
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+        for data in chunks:
+            yield decompressor.decompress(data)
+
+
+class Lz4Codec(_OptionalCodec):
+
+    name = 'lz4'
+    default_level = 0
+    _module = 'lz4.frame'
+
+    def compress(self, data, level):
+        import lz4.frame
+        return lz4.frame.compress(data, compression_level=level)
+
+    def decompress(self, data):
+        import lz4.frame
+        return lz4.frame.decompress(data)
+
+    def compressobj(self, level):
+        return _Lz4Compressor(level)
+
+    def decompress_chunks(self, chunks):
+        import lz4.frame
+        decompressor = lz4.frame.LZ4FrameDecompressor()
+        for data in chunks:
+            yield decompressor.decompress(data)
+
+
+class _Lz4Compressor(object):
+    """
+    Adapter of LZ4FrameCompressor to the interface of zlib.compressobj
+    """
+
+    def __init__(self, level):
+        import lz4.frame
+        self._compressor = lz4.frame.LZ4FrameCompressor(
+            compression_level=level)
+        self._header = self._compressor.begin()
+
+    def compress(self, data):
+        header, self._header = self._header, b''
+        return header + self._compressor.compress(data)
+
+    def flush(self):
+        header, self._header = self._header, b''
+        return header + self._compressor.flush()
+
+
+_CODECS = collections.OrderedDict()
+for _codec in (ZlibCodec(), ZstdCodec(), Lz4Codec()):
+    _CODECS[_codec.name] = _codec
+
+
+def get_codec(name):
+    """
+    Get compression codec by its name.
+
+    Raises ValueError if the codec is unknown, and ImportError if
+    required libraries are not installed.
+    """
+    try:
+        codec = _CODECS[name]
+    except KeyError:
+        msg = 'compression codec must be one of {}, given: {}'
+        raise ValueError(msg.format(', '.join(_CODECS), name))
+    return codec.validate()
+
+
+class Compression(object):
+    """
+    Compression policy of data stored in a backend.
+
+    Prameters
+    ---------
+    codec: str or dict, optional
+       Codec name ('zlib', 'zstd' or 'lz4') used for all the categories,
+       or a dict of category ('persist', 'object', 'metric' and 'text') and
+       codec name. Categories not in the dict or mapped to None are stored
+       raw. If not provided, all data is stored raw.
+    threshold: int, default 1024
+       Data smaller than threshold bytes is stored raw.
+    level: int, optional
+       Compression level. If not provided, codec's default is used.
+    """
+
+    def __init__(self, codec=None, threshold=1024, level=None):
+        if isinstance(codec, dict):
+            unknown = set(codec) - set(CATEGORIES)
+            if len(unknown) > 0:
+                msg = 'compression category must be one of {}, given: {}'
+                raise ValueError(msg.format(', '.join(CATEGORIES),
+                                            ', '.join(sorted(unknown))))
+            codecs = dict(codec)
+        else:
+            codecs = {category: codec for category in CATEGORIES}
+
+        self._codecs = {category: get_codec(name)
+                        for category, name in codecs.items() if name}
+        self.threshold = threshold
+        self.level = level
+
+    def __repr__(self):
+        codecs = ', '.join('{}: {}'.format(category,
+                                           self._codecs[category].name)
+                           for category in CATEGORIES
+                           if category in self._codecs)
+        fmt = 'Compression({{{}}}, threshold: {})'
+        return fmt.format(codecs, self.threshold)
+
+    def __eq__(self, other):
+        if not isinstance(other, Compression):
+            return False
+        return (self.codecs == other.codecs and
+                self.threshold == other.threshold and
+                self.level == other.level)
+
+    @property
+    def codecs(self):
+        """
+        Return a dict of category and codec name
+        """
+        return {category: codec.name
+                for category, codec in self._codecs.items()}
+
+    def enabled(self, category):
+        """
+        Whether data of the category is compressed
+        """
+        return category in self._codecs
+
+    def compress(self, data, category):
+        """
+        Compress bytes of the category. Returns the data as it is if
+        it is not compressed.
+        """
+        assert category in CATEGORIES, category
+        codec = self._codecs.get(category)
+        if codec is None or len(data) < self.threshold:
+            return data
+
+        level = self.level
+        if level is None:
+            level = codec.default_level
+        compressed = (_MAGIC + codec.name.encode() + b'\n' +
+                      codec.compress(data, level))
+        if len(compressed) >= len(data):
+            # incompressible
+            return data
+        return compressed
+
+    def open_writer(self, raw, category):
+        """
+        Open file-like object which writes bytes of the category to raw
+        file-like object, compressing them on the fly.
+
+        Same as compress, data smaller than threshold is written raw.
+        Unlike compress, incompressible data is also compressed because
+        written data can't be reverted. close must be called to write
+        remaining data, but it doesn't close raw.
+        """
+        assert category in CATEGORIES, category
+        level = self.level
+        codec = self._codecs.get(category)
+        if codec is not None and level is None:
+            level = codec.default_level
+        return CompressedWriter(raw, codec, level, self.threshold)
+
+
+class CompressedWriter(object):
+    """
+    File-like object created by Compression.open_writer
+    """
+
+    def __init__(self, raw, codec, level, threshold):
+        self._raw = raw
+        self._codec = codec
+        self._level = level
+        self._threshold = threshold
+
+        # data is buffered until it reaches threshold
+        self._buffer = bytearray()
+        self._compressor = None
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        nbytes = memoryview(data).nbytes
+        if self._codec is None:
+            self._raw.write(data)
+        elif self._compressor is not None:
+            self._raw.write(self._compressor.compress(data))
+        else:
+            self._buffer += data
+            if len(self._buffer) >= self._threshold:
+                self._start()
+        return nbytes
+
+    def _start(self):
+        self._compressor = self._codec.compressobj(self._level)
+        self._raw.write(_MAGIC + self._codec.name.encode() + b'\n')
+        self._raw.write(self._compressor.compress(self._buffer))
+        self._buffer = None
+
+    def flush(self):
+        pass
+
+    def close(self):
+        """
+        Write remaining data
+        """
+        if self._compressor is not None:
+            self._raw.write(self._compressor.flush())
+            self._compressor = None
+        elif self._buffer is not None:
+            self._raw.write(self._buffer)
+            self._buffer = None
+
+
+def create_compression(compression, default=None):
+    """
+    Create Compression from Experiment argument.
+
+    None uses default, False disables compression. str or dict specifies
+    the codec.
+    """
+    if compression is None:
+        compression = default
+    if isinstance(compression, Compression):
+        return compression
+    if compression is None or compression is False:
+        return Compression()
+    if isinstance(compression, (str, dict)):
+        return Compression(compression)
+    msg = ('compression must be a str, dict or Compression instance, '
+           'given: {}')
+    raise ValueError(msg.format(type(compression)))
+
+
+def is_compressed(data):
+    """
+    Whether data is compressed by Compression
+    """
+    return isinstance(data, bytes) and data.startswith(_MAGIC)
+
+
+def is_compressed_file(path):
+    """
+    Whether the file is compressed by Compression
+    """
+    with path.open(mode='rb') as p:
+        return p.read(len(_MAGIC)) == _MAGIC
+
+
+def decompress(data):
+    """
+    Decompress data compressed by Compression. Data which is not compressed
+    is returned as it is.
+    """
+    if not is_compressed(data):
+        return data
+    pos = data.index(b'\n', len(_MAGIC))
+    name = data[len(_MAGIC):pos].decode()
+    return get_codec(name).decompress(data[pos + 1:])
+
+
+def decompress_chunks(chunks):
+    """
+    Decompress an iterator of bytes compressed by Compression chunk by
+    chunk. Chunks which are not compressed are yielded as they are.
+    """
+    name, chunks = chunk.read_header(chunks, _MAGIC)
+    if name is None:
+        return chunks
+    return get_codec(name).decompress_chunks(chunks)
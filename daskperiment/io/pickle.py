@@ -14,6 +14,21 @@ def loads(obj):
     return pickle.loads(obj)
 
 
+def dump_stream(obj, fileobj):
+    """
+    Pickle the object to file-like object. Large buffers such as numpy
+    arrays are written without being copied.
+    """
+    pickle.dump(obj, fileobj)
+
+
+def load_stream(fileobj):
+    """
+    Unpickle the object from file-like object
+    """
+    return pickle.load(fileobj)
+
+
 def save(obj, path):
     assert isinstance(path, pathlib.Path), path
     msg = 'Saving {} to path={}'
@@ -0,0 +1,437 @@
+import collections
+import hashlib
+import io
+import os
+import pathlib
+import uuid
+
+import numpy as np
+import pandas as pd
+
+import daskperiment.io.chunk as chunk
+from daskperiment.io.compression import (decompress, decompress_chunks,
+                                         is_compressed_file)
+import daskperiment.io.pickle as pickle
+from daskperiment.util.log import get_logger
+
+logger = get_logger(__name__)
+
+
+# header of serialized data stored as a binary blob
+_MAGIC = b'DPSR\x01'
+
+# header of reference to the content stored by its hash
+_REF_MAGIC = b'DPREF\x01'
+
+
+class _Serializer(object):
+    """
+    Base class of serializers of persisted step results.
+
+    Actual class must define name, extension, dumps and loads.
+    """
+
+    name = None
+    extension = None
+
+    def __repr__(self):
+        return '{}()'.format(self.__class__.__name__)
+
+    @property
+    def available(self):
+        """
+        Whether required libraries are installed
+        """
+        return True
+
+    def validate(self):
+        """
+        Raise ImportError if required libraries are not installed
+        """
+        return self
+
+    def accepts(self, obj):
+        """
+        Whether the object can be serialized
+        """
+        return False
+
+    def dumps(self, obj):
+        """
+        This method must be overwritten by actual class
+        """
+        raise NotImplementedError
+
+    def loads(self, data, columns=None):
+        """
+        This method must be overwritten by actual class
+        """
+        raise NotImplementedError
+
+    def load(self, path, columns=None, mmap=False):
+        """
+        Load from path. mmap is ignored unless the format supports
+        memory-mapping.
+        """
+        assert isinstance(path, pathlib.Path), path
+        return self.loads(path.read_bytes(), columns=columns)
+
+    def load_stream(self, fileobj, columns=None):
+        """
+        Load from file-like object. Formats which can't be read
+        incrementally read the entire data.
+        """
+        return self.loads(fileobj.read(), columns=columns)
+
+
+def _select_columns(obj, columns):
+    if columns is None:
+        return obj
+    if not isinstance(obj, pd.DataFrame):
+        msg = 'columns can be specified only for DataFrame, loaded: {}'
+        raise ValueError(msg.format(type(obj)))
+    return obj[list(columns)]
+
+
+class PickleSerializer(_Serializer):
+    """
+    Serialize any object with cloudpickle
+    """
+
+    name = 'pickle'
+    extension = '.pkl'
+
+    def accepts(self, obj):
+        return True
+
+    def dumps(self, obj):
+        return pickle.dumps(obj)
+
+    def loads(self, data, columns=None):
+        return _select_columns(pickle.loads(data), columns)
+
+    def load(self, path, columns=None, mmap=False):
+        return _select_columns(pickle.load(path), columns)
+
+    def load_stream(self, fileobj, columns=None):
+        return _select_columns(pickle.load_stream(fileobj), columns)
+
+
+class NumpySerializer(_Serializer):
+    """
+    Serialize numpy array in .npy format. The file can be loaded as
+    read-only memory-mapped array.
+    """
+
+    name = 'npy'
+    extension = '.npy'
+
+    def accepts(self, obj):
+        return (type(obj) in (np.ndarray, np.memmap) and
+                not obj.dtype.hasobject)
+
+    def dumps(self, obj):
+        buf = io.BytesIO()
+        np.save(buf, obj, allow_pickle=False)
+        return buf.getvalue()
+
+    def loads(self, data, columns=None):
+        obj = np.load(io.BytesIO(data), allow_pickle=False)
+        return _select_columns(obj, columns)
+
+    def load(self, path, columns=None, mmap=False):
+        assert isinstance(path, pathlib.Path), path
+        mmap_mode = 'r' if mmap else None
+        obj = np.load(str(path), mmap_mode=mmap_mode, allow_pickle=False)
+        return _select_columns(obj, columns)
+
+    def load_stream(self, fileobj, columns=None):
+        # np.load requires seekable file
+        obj = np.lib.format.read_array(fileobj, allow_pickle=False)
+        return _select_columns(obj, columns)
+
+
+class ParquetSerializer(_Serializer):
+    """
+    Serialize pandas DataFrame in Parquet format. Requires pyarrow or
+    fastparquet. Only the specified columns are read when loading.
+    """
+
+    name = 'parquet'
+    extension = '.parquet'
+
+    @property
+    def available(self):
+        for engine in ('pyarrow', 'fastparquet'):
+            try:
+                __import__(engine)
+                return True
+            except ImportError:
+                pass
+        return False
+
+    def validate(self):
+        if not self.available:
+            msg = 'Parquet format requires pyarrow or fastparquet'
+            raise ImportError(msg)
+        return self
+
+    def accepts(self, obj):
+        return type(obj) is pd.DataFrame
+
+    def dumps(self, obj):
+        buf = io.BytesIO()
+        obj.to_parquet(buf)
+        return buf.getvalue()
+
+    def loads(self, data, columns=None):
+        if columns is not None:
+            columns = list(columns)
+        return pd.read_parquet(io.BytesIO(data), columns=columns)
+
+    def load(self, path, columns=None, mmap=False):
+        assert isinstance(path, pathlib.Path), path
+        if columns is not None:
+            columns = list(columns)
+        return pd.read_parquet(str(path), columns=columns)
+
+
+# name -> serializer, later registered one precedes in inference
+_SERIALIZERS = collections.OrderedDict()
+
+
+def register_serializer(serializer):
+    """
+    Register serializer of persisted step results.
+
+    Prameters
+    ---------
+    serializer: _Serializer
+       Serializer instance. Registered serializer precedes the existing
+       ones when the format is inferred from the result type.
+    """
+    if not isinstance(serializer, _Serializer):
+        msg = 'serializer must be a subclass of _Serializer, given: {}'
+        raise ValueError(msg.format(type(serializer)))
+    _SERIALIZERS.pop(serializer.name, None)
+    _SERIALIZERS[serializer.name] = serializer
+    return serializer
+
+
+def get_serializer(format):
+    """
+    Get serializer by its format name.
+
+    Raises ValueError if the format is unknown, and ImportError if
+    required libraries are not installed.
+    """
+    try:
+        serializer = _SERIALIZERS[format]
+    except KeyError:
+        msg = 'format must be one of {}, given: {}'
+        raise ValueError(msg.format(', '.join(_SERIALIZERS), format))
+    return serializer.validate()
+
+
+def infer_serializer(obj):
+    """
+    Get serializer which accepts the object, pickle if no others do
+    """
+    for serializer in reversed(list(_SERIALIZERS.values())):
+        if serializer.name == 'pickle':
+            continue
+        if serializer.available and serializer.accepts(obj):
+            return serializer
+    return _SERIALIZERS['pickle']
+
+
+def iter_serializers():
+    """
+    Iterate over registered serializers
+    """
+    return iter(list(_SERIALIZERS.values()))
+
+
+register_serializer(PickleSerializer())
+register_serializer(NumpySerializer())
+register_serializer(ParquetSerializer())
+
+
+def _resolve(obj, format):
+    if format is None:
+        return infer_serializer(obj), True
+    serializer = get_serializer(format)
+    if not serializer.accepts(obj):
+        msg = 'Unable to serialize {} in {} format'
+        raise ValueError(msg.format(type(obj), format))
+    return serializer, False
+
+
+def serialize(obj, format=None):
+    """
+    Serialize the object, returns a tuple of (serializer, payload).
+
+    If format is not provided, it is inferred from the object type.
+    Inferred format falls back to pickle if the object can't be serialized.
+    """
+    serializer, inferred = _resolve(obj, format)
+    try:
+        return serializer, serializer.dumps(obj)
+    except Exception as e:
+        if not inferred or serializer.name == 'pickle':
+            raise
+        msg = 'Unable to serialize in {} format, fallback to pickle: {}'
+        logger.debug(msg.format(serializer.name, e))
+        serializer = _SERIALIZERS['pickle']
+        return serializer, serializer.dumps(obj)
+
+
+def dumps(obj, format=None):
+    """
+    Serialize the object to bytes which hold the format name
+    """
+    return b''.join(dumps_parts(obj, format=format))
+
+
+def dumps_parts(obj, format=None):
+    """
+    Same as dumps, but returns a list of bytes to be concatenated. The
+    payload is not copied to prepend the format name.
+    """
+    serializer, payload = serialize(obj, format=format)
+    return [_MAGIC + serializer.name.encode() + b'\n', payload]
+
+
+def loads(data, columns=None):
+    """
+    Deserialize bytes created by dumps (may be compressed). Bytes without
+    the format name are regarded as pickle.
+    """
+    data = decompress(data)
+    if not data.startswith(_MAGIC):
+        return _SERIALIZERS['pickle'].loads(data, columns=columns)
+    pos = data.index(b'\n', len(_MAGIC))
+    name = data[len(_MAGIC):pos].decode()
+    return get_serializer(name).loads(data[pos + 1:], columns=columns)
+
+
+def load_chunks(chunks, columns=None):
+    """
+    Same as loads, but deserialize an iterator of bytes without joining
+    them if the format can be read incrementally
+    """
+    name, chunks = chunk.read_header(decompress_chunks(chunks), _MAGIC)
+    if name is None:
+        serializer = _SERIALIZERS['pickle']
+    else:
+        serializer = get_serializer(name)
+    return serializer.load_stream(chunk.open_reader(chunks), columns=columns)
+
+
+def content_hash(*chunks):
+    """
+    Hash serialized bytes to address the content
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for data in chunks:
+        h.update(data)
+    return h.hexdigest()
+
+
+def dumps_reference(content_hash):
+    """
+    Create a reference to the content stored by its hash
+    """
+    return _REF_MAGIC + content_hash.encode()
+
+
+def loads_reference(data):
+    """
+    Return the content hash if data is a reference, otherwise None
+    """
+    if isinstance(data, bytes) and data.startswith(_REF_MAGIC):
+        return data[len(_REF_MAGIC):].decode()
+    return None
+
+
+def write(path, data):
+    """
+    Write bytes to the path atomically, thus arrays memory-mapped from
+    the previous file are not affected
+    """
+    assert isinstance(path, pathlib.Path), path
+    # write to temporary file in the same directory, then rename
+    tmp = path.with_name('.{}.{}.tmp'.format(path.name, uuid.uuid4().hex))
+    try:
+        tmp.write_bytes(data)
+        os.replace(str(tmp), str(path))
+    except Exception:
+        _unlink(tmp)
+        raise
+    return path
+
+
+def save(obj, path, format=None, compression=None):
+    """
+    Serialize the object to the path whose suffix is replaced with the
+    format's extension. Returns the path actually written.
+
+    The file is compressed if compression (Compression) is provided.
+    """
+    serializer, payload = serialize(obj, format=format)
+    if compression is not None:
+        payload = compression.compress(payload, 'persist')
+    target = write(path.with_suffix(serializer.extension), payload)
+
+    # remove the file saved in other format previously
+    for other in iter_serializers():
+        if other.extension != serializer.extension:
+            _unlink(path.with_suffix(other.extension))
+    return target
+
+
+def find(path):
+    """
+    Find the file saved by save, returns a tuple of (serializer, path).
+    Raises FileNotFoundError if not exists.
+    """
+    for serializer in reversed(list(_SERIALIZERS.values())):
+        target = path.with_suffix(serializer.extension)
+        if target.is_file():
+            return serializer, target
+    raise FileNotFoundError(path)
+
+
+def load_file(path, columns=None, mmap=False):
+    """
+    Deserialize the file in the format specified by its extension.
+    If mmap is True, arrays saved in npy format are returned as read-only
+    np.memmap unless compressed.
+    """
+    for serializer in reversed(list(_SERIALIZERS.values())):
+        if path.suffix == serializer.extension:
+            break
+    else:
+        msg = 'Unable to find the format of the file: {}'
+        raise ValueError(msg.format(path))
+
+    serializer.validate()
+    if is_compressed_file(path):
+        data = decompress(path.read_bytes())
+        return serializer.loads(data, columns=columns)
+    return serializer.load(path, columns=columns, mmap=mmap)
+
+
+def load(path, columns=None, mmap=False):
+    """
+    Deserialize the file saved by save
+    """
+    _, target = find(path)
+    return load_file(target, columns=columns, mmap=mmap)
+
+
+def _unlink(path):
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
@@ -7,7 +7,8 @@ import pandas as pd
 import daskperiment
 from daskperiment.backend import (init_backend, LocalBackend,
                                   MongoBackend, RedisBackend)
-from daskperiment.backend.base import maybe_mongo, maybe_redis
+from daskperiment.backend.base import (get_step_input_key, get_step_name,
+                                       maybe_mongo, maybe_redis)
 
 
 class TestInitBackend(object):
@@ -108,6 +109,17 @@ class TestInitBackend(object):
 
 class TestBackend(object):
 
+    def test_step_input_key(self):
+        key = get_step_input_key('my_step', 'abc123')
+        assert key == 'my_step-abc123'
+        assert get_step_name(key) == 'my_step'
+        # step name may contain the separator
+        assert get_step_name(get_step_input_key('a-b', 'abc')) == 'a-b'
+
+        for key in ['my_step', 'my_step-']:
+            with pytest.raises(ValueError, match='Invalid input key'):
+                get_step_name(key)
+
     def test_local_backend(self):
         ex = daskperiment.Experiment('local_backend', backend='local')
         assert isinstance(ex._backend, LocalBackend)
@@ -6,6 +6,7 @@ import pandas as pd
 
 from daskperiment.backend import MongoBackend, RedisBackend
 from daskperiment.backend.mongo import MongoKey
+import daskperiment.io.chunk as chunk
 
 
 class NoSQLBase(object):
@@ -83,6 +84,42 @@ class NoSQLBase(object):
         assert backend.increment(new_key) == 1
         assert backend.increment(key) == 5
 
+    def test_getset_delete(self):
+        backend = self.init_backend()
+
+        key = self.make_key('getset_key')
+        assert backend.getset(key, 1) is None
+        assert backend.getset(key, 2) == self.make_expected(1)
+        assert backend.get(key) == self.make_expected(2)
+
+        backend.delete(key)
+        assert backend.get(key) is None
+        # do nothing if not exists
+        backend.delete(key)
+
+    def test_chunked_object(self):
+        backend = self.init_backend()
+        backend.chunk_size = 1000
+        backend.set_compression(False)
+
+        key = self.make_key('chunked_key')
+        obj = list(range(2000))
+        backend.save_object(key, obj)
+        manifest = chunk.loads_manifest(backend.get(key))
+        assert manifest['chunks'] > 1
+
+        chunks = list(backend.iter_binary(key))
+        assert len(chunks) == manifest['chunks']
+        assert all(len(c) <= 1000 for c in chunks)
+        assert sum(len(c) for c in chunks) == manifest['nbytes']
+        assert backend.load_object(key) == obj
+
+        # chunks are deleted when overwritten
+        backend.save_object(key, 'xxx')
+        assert backend.load_object(key) == 'xxx'
+        chunk_key = backend.get_chunk_key(manifest['id'], 0)
+        assert backend.get(chunk_key) is None
+
     def test_save_load_text(self):
         backend = self.init_backend()
 
@@ -0,0 +1,135 @@
+import pytest
+
+import numpy as np
+
+import daskperiment
+from daskperiment.backend import LocalBackend, MongoBackend, RedisBackend
+from daskperiment.core.errors import TrialIDNotFoundError
+import daskperiment.io.pickle as pickle
+
+
+class PersistedBase(object):
+
+    @classmethod
+    def init_backend(cls):
+        raise NotImplementedError
+
+    @classmethod
+    def teardown_class(cls):
+        backend = cls.init_backend()
+        backend._delete_cache()
+
+    def count_blobs(self, backend):
+        raise NotImplementedError
+
+    def save_legacy(self, backend, key, obj):
+        raise NotImplementedError
+
+    def test_save_load(self):
+        backend = self.init_backend()
+
+        key = backend.get_persist_key('step_a', 1)
+        with pytest.raises(TrialIDNotFoundError):
+            backend.load_persisted(key)
+
+        backend.save_persisted(key, [1, 2])
+        assert backend.load_persisted(key) == [1, 2]
+
+        # overwrite
+        backend.save_persisted(key, np.arange(3))
+        np.testing.assert_array_equal(backend.load_persisted(key),
+                                      np.arange(3))
+
+    def test_dedup(self):
+        backend = self.init_backend()
+        backend._delete_cache()
+        backend = self.init_backend()
+
+        key1 = backend.get_persist_key('step_b', 1)
+        key2 = backend.get_persist_key('step_b', 2)
+        key3 = backend.get_persist_key('step_b', 3)
+
+        ref1 = backend.save_persisted(key1, np.arange(5))
+        # the same content is stored once
+        ref2 = backend.save_persisted(key2, np.arange(5))
+        assert ref1 == ref2
+        assert self.count_blobs(backend) == 1
+
+        # the same value in other format is stored separately
+        ref3 = backend.save_persisted(key3, np.arange(5), format='pickle')
+        assert ref3 != ref1
+        assert self.count_blobs(backend) == 2
+
+        for key in [key1, key2, key3]:
+            np.testing.assert_array_equal(backend.load_persisted(key),
+                                          np.arange(5))
+
+        key4 = backend.get_persist_key('step_b', 4)
+        backend.link_persisted(key4, ref1)
+        np.testing.assert_array_equal(backend.load_persisted(key4),
+                                      np.arange(5))
+        assert self.count_blobs(backend) == 2
+
+    def test_load_legacy(self):
+        backend = self.init_backend()
+
+        key = backend.get_persist_key('step_c', 1)
+        self.save_legacy(backend, key, {'a': 1})
+        assert backend.load_persisted(key) == {'a': 1}
+
+
+class TestLocalPersisted(PersistedBase):
+
+    @classmethod
+    def init_backend(cls):
+        p = daskperiment.config._CACHE_DIR / 'local_persisted'
+        return LocalBackend('local_persisted', p)
+
+    def count_blobs(self, backend):
+        return len(list(backend.persist_blob_dir.iterdir()))
+
+    def save_legacy(self, backend, key, obj):
+        pickle.save(obj, key)
+
+    def test_skip_write(self):
+        backend = self.init_backend()
+
+        key1 = backend.get_persist_key('step_d', 1)
+        key2 = backend.get_persist_key('step_d', 2)
+        name = backend.save_persisted(key1, list(range(10)))
+        blob = backend.get_persist_blob_key(name)
+        assert blob.suffix == '.pkl'
+        mtime = blob.stat().st_mtime_ns
+
+        backend.save_persisted(key2, list(range(10)))
+        assert blob.stat().st_mtime_ns == mtime
+        assert key2.with_suffix('.ref').read_text() == name
+
+
+class TestRedisPersisted(PersistedBase):
+
+    @classmethod
+    def init_backend(cls):
+        uri = 'redis://localhost:6379/0'
+        return RedisBackend('redis_persisted', uri)
+
+    def count_blobs(self, backend):
+        return len(backend.keys(backend.get_persist_blob_key('*')))
+
+    def save_legacy(self, backend, key, obj):
+        backend.set(key, pickle.dumps(obj))
+
+
+class TestMongoPersisted(PersistedBase):
+
+    @classmethod
+    def init_backend(cls):
+        uri = 'mongodb://localhost:27017/test_db'
+        return MongoBackend('mongo_persisted', uri)
+
+    def count_blobs(self, backend):
+        query = backend.get_persist_blob_key('*')
+        return len(list(backend.collection.find(query.document_meta)))
+
+    def save_legacy(self, backend, key, obj):
+        backend.set(key, pickle.dumps(obj))
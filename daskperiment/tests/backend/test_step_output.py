@@ -0,0 +1,100 @@
+import time
+
+import daskperiment
+from daskperiment.backend import LocalBackend, MongoBackend, RedisBackend
+
+
+class StepOutputBase(object):
+
+    @classmethod
+    def init_backend(cls):
+        raise NotImplementedError
+
+    @classmethod
+    def teardown_class(cls):
+        backend = cls.init_backend()
+        backend._delete_cache()
+
+    def test_save_load(self):
+        backend = self.init_backend()
+
+        assert backend.load_step_output('step-a-b') is None
+
+        backend.save_step_output('step-a-b', b'xxx')
+        assert backend.load_step_output('step-a-b') == b'xxx'
+
+        # overwrite
+        backend.save_step_output('step-a-b', b'yyyy')
+        assert backend.load_step_output('step-a-b') == b'yyyy'
+
+        backend.delete_step_output('step-a-b')
+        assert backend.load_step_output('step-a-b') is None
+        # deleting non-existing output doesn't raise
+        backend.delete_step_output('step-a-b')
+
+    def test_list(self):
+        backend = self.init_backend()
+
+        backend.save_step_output('step-c-d', b'xxx')
+        backend.save_step_output('step-e-f', b'yy')
+
+        res = {key: (nbytes, accessed) for key, nbytes, accessed
+               in backend.list_step_outputs()}
+        assert res['step-c-d'][0] == 3
+        assert res['step-e-f'][0] == 2
+
+        time.sleep(0.1)
+        backend.load_step_output('step-c-d')
+        res2 = {key: (nbytes, accessed) for key, nbytes, accessed
+                in backend.list_step_outputs()}
+        # last access time is updated
+        assert res2['step-c-d'][1] > res['step-c-d'][1]
+        assert res2['step-e-f'][1] == res['step-e-f'][1]
+
+        backend.delete_step_output('step-c-d')
+        backend.delete_step_output('step-e-f')
+        keys = [key for key, _, _ in backend.list_step_outputs()]
+        assert 'step-c-d' not in keys
+        assert 'step-e-f' not in keys
+
+    def test_ttl(self):
+        backend = self.init_backend()
+
+        backend.save_step_output('step-g-h', b'xxx')
+        assert backend.load_step_output('step-g-h', ttl=10) == b'xxx'
+
+        time.sleep(0.2)
+        assert backend.load_step_output('step-g-h', ttl=0.1) is None
+        # expired output is deleted
+        assert backend.load_step_output('step-g-h') is None
+
+
+class TestLocalStepOutput(StepOutputBase):
+
+    @classmethod
+    def init_backend(cls):
+        p = daskperiment.config._CACHE_DIR / 'local_step_output'
+        return LocalBackend('local_step_output', p)
+
+    def test_no_temporary_file(self):
+        backend = self.init_backend()
+        backend.save_step_output('step-i-j', b'xxx')
+        files = [p.name for p in backend.step_output_dir.iterdir()]
+        assert files == ['step-i-j.pkl']
+        backend.delete_step_output('step-i-j')
+
+
+class TestRedisStepOutput(StepOutputBase):
+
+    @classmethod
+    def init_backend(cls):
+        uri = 'redis://localhost:6379/0'
+        return RedisBackend('redis_step_output', uri)
+
+
+class TestMongoStepOutput(StepOutputBase):
+
+    @classmethod
+    def init_backend(cls):
+        uri = 'mongodb://localhost:27017/test_db'
+        return MongoBackend('mongo_step_output', uri)
@@ -84,7 +84,8 @@ class TestBoard(object):
                        {'data': 5, 'title': 'Success'},
                        {'data': 6, 'title': 'Finished'},
                        {'data': 7, 'title': 'Process Time'},
-                       {'data': 8, 'title': 'Description'}]
+                       {'data': 8, 'title': 'Description'},
+                       {'data': 9, 'title': 'Resumed From'}]
         assert result['columns'] == exp_columns
         # trial id
         assert [d[0] for d in result['data']] == [1, 2, 3]
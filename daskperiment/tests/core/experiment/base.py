@@ -1,21 +1,28 @@
 import pytest
 
+import json
+import pstats
 import random
+import sys
 
 import numpy as np
 import pandas as pd
 import pandas.testing as tm
 
+import dask
+from dask.delayed import Delayed
+
 import daskperiment
 from daskperiment.backend import LocalBackend
 from daskperiment.core.errors import LockedTrialError, TrialIDNotFoundError
+from daskperiment.core.parameter import Undefined
 
 
 def assert_history_equal(df, exp, verbose=False, check_dtype=True):
     if verbose:
         exp_index = ['Seed', 'Result', 'Result Type', 'Success', 'Finished',
-                     'Process Time', 'Description']
-        dropper = ['Seed', 'Finished', 'Process Time']
+                     'Process Time', 'Description', 'Resumed From']
+        dropper = ['Seed', 'Finished', 'Process Time', 'Resumed From']
     else:
         exp_index = ['Result', 'Success', 'Finished',
                      'Process Time', 'Description']
@@ -345,6 +352,214 @@ class ExperimentBase(object):
                                     'Success', 'Description'])
         assert_history_equal(hist, exp, verbose=True)
 
+    def test_persist_format(self, ex):
+        a = ex.parameter("a")
+
+        @ex.persist
+        def array(a):
+            return np.arange(a)
+
+        @ex.persist
+        def frame(a):
+            return pd.DataFrame({'x': np.arange(a), 'y': np.arange(a) * 2})
+
+        @ex.persist(format='pickle')
+        def pickled(a):
+            return np.arange(a) + 1
+
+        @ex.result
+        def total(x, df, y):
+            return int(x.sum() + df['y'].sum() + y.sum())
+
+        res = total(array(a), frame(a), pickled(a))
+        ex.set_parameters(a=3)
+        assert res.compute() == 15
+
+        result = ex.get_persisted('array', trial_id=1)
+        np.testing.assert_array_equal(result, np.arange(3))
+        result = ex.get_persisted('pickled', trial_id=1)
+        np.testing.assert_array_equal(result, np.arange(1, 4))
+
+        exp = pd.DataFrame({'x': np.arange(3), 'y': np.arange(3) * 2})
+        tm.assert_frame_equal(ex.get_persisted('frame', trial_id=1), exp)
+        result = ex.get_persisted('frame', trial_id=1, columns=['y'])
+        tm.assert_frame_equal(result, exp[['y']])
+
+        with pytest.raises(ValueError, match='only for DataFrame'):
+            ex.get_persisted('array', trial_id=1, columns=['y'])
+
+        with pytest.raises(ValueError, match='format must be one of'):
+            @ex.persist(format='xxx')
+            def invalid(a):
+                return a
+
+    def test_persist_mmap(self, ex):
+        a = ex.parameter("a")
+
+        @ex.persist
+        def array(a):
+            return np.arange(a, dtype=np.float64)
+
+        @ex.result
+        def total(x):
+            return x.sum()
+
+        res = total(array(a))
+        ex.set_parameters(a=5)
+        assert res.compute() == 10
+
+        if isinstance(ex._backend, LocalBackend):
+            result = ex.get_persisted('array', trial_id=1, mmap=True)
+            assert isinstance(result, np.memmap)
+            assert not result.flags.writeable
+            np.testing.assert_array_equal(result, np.arange(5))
+        else:
+            with pytest.raises(ValueError, match='only supported by'):
+                ex.get_persisted('array', trial_id=1, mmap=True)
+
+    def test_get_persisted_many(self, ex):
+        a = ex.parameter("a")
+
+        @ex.persist
+        def array(a):
+            return np.arange(3) * a
+
+        @ex.persist
+        def frame(a):
+            return pd.DataFrame({'x': [a, a + 1], 'y': [a * 2, a * 3]})
+
+        @ex.persist
+        def scalar(a):
+            return a + 1
+
+        @ex.result
+        def total(x, df, s):
+            return int(x.sum() + df['x'].sum() + s)
+
+        res = total(array(a), frame(a), scalar(a))
+        ex.sweep(res, {'a': [1, 2, 3]})
+
+        result = ex.get_persisted_many('scalar', [3, 1])
+        assert list(result.items()) == [(3, 4), (1, 2)]
+
+        result = ex.get_persisted_many('array', [1, 2, 3], stack=True)
+        np.testing.assert_array_equal(result, np.array([[0, 1, 2],
+                                                        [0, 2, 4],
+                                                        [0, 3, 6]]))
+
+        result = ex.get_persisted_many('frame', [1, 2], columns=['y'],
+                                       stack=True, max_workers=2)
+        exp = pd.DataFrame({'y': [2, 3, 4, 6]},
+                           index=pd.MultiIndex.from_tuples(
+                               [(1, 0), (1, 1), (2, 0), (2, 1)],
+                               names=['Trial ID', None]))
+        tm.assert_frame_equal(result, exp)
+
+        result = ex.get_persisted_many('scalar', [1, 2], stack=True)
+        exp = pd.Series([2, 3], index=pd.Index([1, 2], name='Trial ID'))
+        tm.assert_series_equal(result, exp)
+
+        # loaded when computed
+        result = ex.get_persisted_many('scalar', [1, 2, 3], lazy=True)
+        assert all(isinstance(v, Delayed) for v in result.values())
+        assert dask.compute(result)[0] == {1: 2, 2: 3, 3: 4}
+
+        with pytest.raises(ValueError, match='cannot be specified'):
+            ex.get_persisted_many('scalar', [1], stack=True, lazy=True)
+        with pytest.raises(TrialIDNotFoundError):
+            ex.get_persisted_many('scalar', [1, 4])
+
+    def test_persisted_delayed(self, ex):
+        a = ex.parameter("a")
+
+        @ex.persist
+        def frame(a):
+            return pd.DataFrame({'x': [a, a + 1], 'y': [a * 2, a * 3]})
+
+        @ex.result
+        def total(df):
+            return int(df['x'].sum())
+
+        res = total(frame(a))
+        ex.sweep(res, {'a': [1, 2]})
+
+        d1 = ex.persisted_delayed('frame', 1)
+        d2 = ex.persisted_delayed('frame', 2, columns=['y'])
+        assert isinstance(d1, Delayed)
+        assert d1.key != ex.persisted_delayed('frame', 1, columns=['y']).key
+
+        @dask.delayed
+        def combine(df1, df2):
+            return int(df1['x'].sum() + df2['y'].sum())
+
+        assert combine(d1, d2).compute() == 3 + 10
+        assert combine(d1, d2).compute(scheduler='processes') == 3 + 10
+
+        with pytest.raises(TrialIDNotFoundError):
+            ex.persisted_delayed('frame', 3)
+
+    def test_gc(self, ex):
+        a = ex.parameter("a")
+
+        @ex.persist
+        def shared():
+            return np.arange(1000)
+
+        @ex.persist
+        def scale(x, a):
+            return x * a
+
+        @ex.result
+        def total(x):
+            return int(x.sum())
+
+        res = total(scale(shared(), a))
+        for i in [3, 1, 4, 2]:
+            ex.set_parameters(a=i)
+            res.compute()
+
+        # nothing to be removed
+        removed = ex.gc()
+        assert len(removed) == 0
+        assert list(removed.columns) == ['Trial ID', 'Category', 'Key',
+                                         'Bytes']
+
+        removed = ex.gc(keep_last=2)
+        assert set(removed['Trial ID'].dropna()) == {1, 2}
+        categories = set(removed['Category'])
+        assert {'code', 'environment', 'persist'} <= categories
+        assert 'persist blob' in categories
+        assert (removed['Bytes'] > 0).all()
+        # dry run
+        assert ex.get_persisted('scale', trial_id=1)[1] == 3
+
+        removed = ex.gc(keep_last=1, keep_best=1, dry_run=False)
+        # trial 3 has the best result
+        assert set(removed['Trial ID'].dropna()) == {1, 2}
+        for trial_id in [1, 2]:
+            with pytest.raises(TrialIDNotFoundError):
+                ex.get_persisted('scale', trial_id=trial_id)
+            with pytest.raises(TrialIDNotFoundError):
+                ex.get_code(trial_id=trial_id)
+        # the blob shared with remaining trials is kept
+        np.testing.assert_array_equal(ex.get_persisted('shared', trial_id=3),
+                                      np.arange(1000))
+        assert ex.get_persisted('scale', trial_id=4)[1] == 2
+        assert len(ex.get_history()) == 4
+
+        assert len(ex.gc(keep_last=1, keep_best=1)) == 0
+
+        # trial 2 has the smallest result
+        removed = ex.gc(keep_best=1, minimize=True)
+        assert set(removed['Trial ID'].dropna()) == {3, 4}
+
+        # remove others to fit within the budget
+        removed = ex.gc(keep_last=1, max_bytes=0)
+        assert set(removed['Trial ID'].dropna()) == {3}
+
+        with pytest.raises(ValueError, match='must be 0 or positive'):
+            ex.gc(keep_last=-1)
+
     def test_persist_paren(self, ex):
         a = ex.parameter("a")
 
@@ -619,6 +834,1060 @@ class ExperimentBase(object):
 
         ex._delete_cache()
 
+    def test_random_state(self, ex):
+        @ex.result
+        def rand():
+            return ex.random_state.random_sample()
+
+        res = rand()
+        assert res.compute(seed=1) != res.compute(seed=2)
+        assert res.compute(seed=1) == res.compute(seed=1)
+        assert len(ex._random_states) == 0
+
+        with pytest.raises(TrialIDNotFoundError):
+            ex.random_state
+
+    def test_random_state_concurrent(self, ex, caplog):
+        import concurrent.futures
+        import threading
+
+        barrier = threading.Barrier(2, timeout=10)
+
+        @ex.result
+        def rand():
+            # both trials are running
+            barrier.wait()
+            return ex.random_state.random_sample(3).tolist()
+
+        res = rand()
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            futures = [res.submit(seed=1, executor=executor)
+                       for _ in range(2)]
+            results = [f.result() for f in futures]
+
+        # random states are not shared between trials
+        assert results[0] == results[1]
+        assert results[0] == np.random.RandomState(1).random_sample(3).tolist()
+
+        messages = [r.getMessage() for r in caplog.records]
+        assert any('Other trials are running concurrently' in m
+                   for m in messages)
+
+    def test_sweep(self, ex):
+        a = ex.parameter("a")
+        b = ex.parameter("b")
+
+        @ex.persist
+        def load(b):
+            ex.save_metric('load_metric', epoch=0, value=b)
+            return b * 10
+
+        @ex.result
+        def add(x, a):
+            return x + a
+
+        res = add(load(b), a)
+
+        ex.set_parameters(b=1)
+        assert ex.sweep(res, {'a': [1, 2, 3]}) == [11, 12, 13]
+        assert ex.trial_id == 3
+
+        # shared step is persisted per trial
+        for i in [1, 2, 3]:
+            assert ex.get_persisted('load', trial_id=i) == 10
+        metric = ex.load_metric('load_metric', trial_id=[1, 2, 3])
+        exp = pd.DataFrame({1: [1], 2: [1], 3: [1]},
+                           index=pd.Index([0], name='Epoch'),
+                           columns=pd.Index([1, 2, 3], name='Trial ID'))
+        tm.assert_frame_equal(metric, exp)
+
+        # current parameters are not changed
+        assert ex.get_parameters() == dict(a=Undefined(), b=1)
+
+        hist = ex.get_history()
+        exp = pd.DataFrame({'a': [1, 2, 3],
+                            'b': [1, 1, 1],
+                            'Result': [11, 12, 13],
+                            'Success': [True, True, True],
+                            'Description': [np.nan, np.nan, np.nan]},
+                           index=pd.Index([1, 2, 3], name='Trial ID'),
+                           columns=['a', 'b', 'Result',
+                                    'Success', 'Description'])
+        assert_history_equal(hist, exp)
+
+        params = [{'a': 1, 'b': 2}, {'a': 1, 'b': 3}]
+        assert ex.sweep(res, params) == [21, 31]
+        assert ex.get_persisted('load', trial_id=4) == 20
+        assert ex.get_persisted('load', trial_id=5) == 30
+        assert ex.get_parameters(trial_id=5) == dict(a=1, b=3)
+
+    def test_sweep_shared_step(self, ex):
+        a = ex.parameter("a")
+        b = ex.parameter("b")
+
+        calls = []
+
+        @ex
+        def load(b):
+            calls.append(b)
+            return b * 10
+
+        @ex.result
+        def add(x, a):
+            return x + a
+
+        res = add(load(b), a)
+        ex.set_parameters(b=1)
+        assert res.compute_many([{'a': 1}, {'a': 2}]) == [11, 12]
+        # load doesn't depend on a
+        assert calls == [1]
+
+    def test_sweep_failure(self, ex):
+        a = ex.parameter("a")
+
+        @ex.result
+        def div(a):
+            return 3 / a
+
+        res = div(a)
+
+        with pytest.raises(ZeroDivisionError):
+            ex.sweep(res, {'a': [1, 0, 3]})
+
+        description = 'ZeroDivisionError(division by zero)'
+
+        hist = ex.get_history()
+        exp = pd.DataFrame({'a': [1, 0, 3],
+                            'Result': [3.0, None, 1.0],
+                            'Success': [True, False, True],
+                            'Description': [np.nan, description, np.nan]},
+                           index=pd.Index([1, 2, 3], name='Trial ID'),
+                           columns=['a', 'Result', 'Success', 'Description'])
+        assert_history_equal(hist, exp)
+
+    def test_sweep_invalid(self, ex):
+        a = ex.parameter("a")
+
+        @ex.result
+        def inc(a):
+            return a + 1
+
+        res = inc(a)
+
+        with pytest.raises(daskperiment.core.errors.ParameterUndeclaredError):
+            ex.sweep(res, {'x': [1, 2]})
+        with pytest.raises(ValueError, match='must be list-like'):
+            ex.sweep(res, {'a': 1})
+        with pytest.raises(daskperiment.core.errors.ParameterUndefinedError):
+            ex.sweep(res, [{'a': 1}, {}])
+        assert ex.trial_id == 0
+        assert ex.sweep(res, []) == []
+
+    def test_submit(self, ex):
+        a = ex.parameter("a")
+
+        @ex.persist
+        def inc(a):
+            ex.save_metric('trial_id', epoch=0, value=ex.current_trial_id)
+            return a + 1
+
+        @ex.result
+        def add(x, a):
+            return x + a
+
+        res = add(inc(a), a)
+
+        futures = [res.submit(parameters={'a': i}) for i in range(5)]
+        # trial ids are fixed in submission order
+        assert [f.trial_id for f in futures] == [1, 2, 3, 4, 5]
+        assert [f.result() for f in futures] == [1, 3, 5, 7, 9]
+
+        for i, f in enumerate(futures):
+            assert ex.get_persisted('inc', trial_id=f.trial_id) == i + 1
+            metric = ex.load_metric('trial_id', trial_id=f.trial_id)
+            assert metric.loc[0, f.trial_id] == f.trial_id
+            assert ex.get_parameters(trial_id=f.trial_id) == dict(a=i)
+
+        hist = ex.get_history()
+        exp = pd.DataFrame({'a': [0, 1, 2, 3, 4],
+                            'Result': [1, 3, 5, 7, 9],
+                            'Success': [True] * 5,
+                            'Description': [np.nan] * 5},
+                           index=pd.Index([1, 2, 3, 4, 5], name='Trial ID'),
+                           columns=['a', 'Result', 'Success', 'Description'])
+        assert_history_equal(hist, exp)
+
+    def test_submit_failure(self, ex):
+        import concurrent.futures
+
+        a = ex.parameter("a")
+
+        @ex.result
+        def div(a):
+            return 3 / a
+
+        res = div(a)
+
+        with pytest.raises(daskperiment.core.errors.ParameterUndefinedError):
+            res.submit()
+        assert ex.trial_id == 0
+
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            f1 = res.submit(parameters={'a': 0}, executor=executor)
+            f2 = res.submit(parameters={'a': 3}, executor=executor)
+            assert isinstance(f1.exception(), ZeroDivisionError)
+            assert f2.result() == 1
+
+        hist = ex.get_history()
+        assert hist['Success'].tolist() == [False, True]
+
+    def test_compute_async(self, ex):
+        import asyncio
+
+        a = ex.parameter("a")
+
+        @ex.result
+        def inc(a):
+            return a + 1
+
+        res = inc(a)
+
+        async def main():
+            futures = [res.compute_async(parameters={'a': i})
+                       for i in range(3)]
+            return await asyncio.gather(*futures)
+
+        loop = asyncio.new_event_loop()
+        try:
+            assert loop.run_until_complete(main()) == [1, 2, 3]
+        finally:
+            loop.close()
+        assert ex.get_history()['Result'].tolist() == [1, 2, 3]
+
+    def test_trial_task_graph(self, ex):
+        from dask.highlevelgraph import HighLevelGraph
+        from daskperiment.core.experiment import TrialTask
+
+        a = ex.parameter("a")
+
+        @ex
+        def inc(a):
+            return a + 1
+
+        @ex.result
+        def add(x, a):
+            return x + a
+
+        res = add(inc(a), a)
+        ex.set_parameters(a=1)
+
+        task = TrialTask(res)
+        assert task.compute() == 3
+        assert task._key == res._key + '-trial1'
+
+        assert isinstance(task.dask, HighLevelGraph)
+        # layers except for parameters are kept as it is
+        resolved = [a._key, ex._trial_context._key]
+        for name, layer in res.dask.layers.items():
+            if name in resolved:
+                assert task.dask.layers[name] is not layer
+            else:
+                assert task.dask.layers[name] is layer
+
+        # step can be computed outside of trial
+        assert inc(a).compute() == 2
+
+    def test_shared_scheduler(self, ex):
+        import concurrent.futures
+
+        a = ex.parameter("a")
+
+        @ex
+        def inc(a):
+            return a + 1
+
+        @ex.result
+        def add(x, a):
+            return x + a
+
+        res = add(inc(a), a)
+
+        graphs = []
+
+        def get(dsk, keys, **kwargs):
+            # scheduler shared between trials
+            graphs.append(dict(dsk))
+            return dask.get(dsk, keys, **kwargs)
+
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            futures = [res.submit(parameters={'a': i}, executor=executor,
+                                  scheduler=get)
+                       for i in [1, 2]]
+            assert [f.result() for f in futures] == [3, 5]
+
+        keys1, keys2 = [set(g) for g in graphs]
+        # all the keys are distinguished per trial
+        assert len(keys1 & keys2) == 0
+        for keys in [keys1, keys2]:
+            trial_ids = set(k.rsplit('-trial', 1)[1] for k in keys)
+            assert len(trial_ids) == 1
+
+        assert res.compute_many([{'a': 1}, {'a': 2}], scheduler=get) == [3, 5]
+        assert len(set(graphs[-1]) & (keys1 | keys2)) == 0
+
+    def test_submit_client(self, ex):
+        distributed = pytest.importorskip('distributed')
+
+        a = ex.parameter("a")
+
+        @ex.result
+        def inc(a):
+            return a + 1
+
+        res = inc(a)
+        with distributed.Client(processes=False) as client:
+            futures = [res.submit(parameters={'a': i}, executor=client)
+                       for i in range(3)]
+            assert [f.result() for f in futures] == [1, 2, 3]
+
+    def test_incremental(self):
+        ex = daskperiment.Experiment(id='test_incremental',
+                                     backend=self.backend, incremental=True)
+        a = ex.parameter("a")
+        b = ex.parameter("b")
+
+        calls = []
+
+        @ex.persist
+        def load(b):
+            calls.append('load')
+            return b * 10
+
+        @ex.persist
+        def add(x, a):
+            calls.append('add')
+            return x + a
+
+        @ex.result
+        def result(x):
+            return x
+
+        res = result(add(load(b), a))
+
+        ex.set_parameters(a=1, b=1)
+        assert res.compute() == 11
+        assert calls == ['load', 'add']
+
+        # only the step depends on changed parameter is executed
+        ex.set_parameters(a=2)
+        assert res.compute() == 12
+        assert calls == ['load', 'add', 'add']
+
+        ex.set_parameters(a=1)
+        assert res.compute() == 11
+        assert calls == ['load', 'add', 'add']
+
+        # reused result is persisted in each trial
+        for i in [1, 2, 3]:
+            assert ex.get_persisted('load', trial_id=i) == 10
+        assert ex.get_persisted('add', trial_id=3) == 11
+
+        # code change
+        @ex.persist
+        def load(b):
+            calls.append('load2')
+            return b * 20
+
+        res = result(add(load(b), a))
+        assert res.compute() == 21
+        assert calls == ['load', 'add', 'add', 'load2', 'add']
+        ex._delete_cache()
+
+    def test_step_cache(self):
+        ex = daskperiment.Experiment(id='test_step_cache',
+                                     backend=self.backend,
+                                     cache_size=10000)
+        a = ex.parameter("a")
+        b = ex.parameter("b")
+
+        calls = []
+
+        @ex
+        def load(b):
+            calls.append('load')
+            return b * 10
+
+        @ex.persist
+        def add(x, a):
+            calls.append('add')
+            return x + a
+
+        @ex.result
+        def result(x):
+            return x
+
+        res = result(add(load(b), a))
+
+        ex.set_parameters(a=1, b=1)
+        assert res.compute() == 11
+        assert calls == ['load', 'add']
+
+        ex.set_parameters(a=2)
+        assert res.compute() == 12
+        assert calls == ['load', 'add', 'add']
+
+        ex.set_parameters(a=1)
+        assert res.compute() == 11
+        assert calls == ['load', 'add', 'add']
+
+        # cached result is persisted in the trial
+        assert ex.get_persisted('add', trial_id=3) == 11
+        assert ex.get_history()['Result'].tolist() == [11, 12, 11]
+
+        info = ex.get_cache_info()
+        # load: 1 miss, 2 hits, add and result: 2 misses, 1 hit
+        assert info['hits'] == 4
+        assert info['misses'] == 5
+        assert info['evictions'] == 0
+        assert info['max_bytes'] == 10000
+
+        ex.clear_cache()
+        assert ex.get_cache_info()['count'] == 0
+        assert res.compute() == 11
+        assert calls == ['load', 'add', 'add', 'load', 'add']
+
+        # reinstanciation disables the cache
+        ex = daskperiment.Experiment(id='test_step_cache',
+                                     backend=self.backend)
+        assert res.compute() == 11
+        assert ex.get_cache_info()['count'] == 0
+        assert calls == ['load', 'add', 'add', 'load', 'add', 'load', 'add']
+        ex._delete_cache()
+
+    def test_step_cache_side_effect(self):
+        ex = daskperiment.Experiment(id='test_step_cache_side_effect',
+                                     backend=self.backend,
+                                     cache_size=10 ** 6)
+        a = ex.parameter("a")
+
+        calls = []
+
+        @ex
+        def load(a):
+            calls.append('load')
+            return np.arange(a)
+
+        @ex(cache=False)
+        def train(x):
+            calls.append('train')
+            ex.save_metric('score', epoch=0, value=int(x.sum()))
+            # modify the cached input in-place
+            x += 1
+            return x.sum()
+
+        @ex.result
+        def result(x):
+            return x
+
+        res = result(train(load(a)))
+        ex.set_parameters(a=3)
+        assert res.compute() == 6
+        assert res.compute() == 6
+        # step which disables the cache is executed in every trial
+        assert calls == ['load', 'train', 'train']
+        metric = ex.load_metric('score', trial_id=[1, 2])
+        assert metric.loc[0].tolist() == [3, 3]
+
+        ex._delete_cache()
+
+    def test_backend_cache(self):
+        calls = []
+
+        def define(backend):
+            ex = daskperiment.Experiment(id='test_backend_cache',
+                                         backend=backend,
+                                         backend_cache_size=10000)
+            a = ex.parameter("a")
+
+            @ex
+            def inc(a):
+                calls.append('inc')
+                return a + 1
+
+            @ex.result
+            def result(x):
+                return x
+
+            return ex, result(inc(a))
+
+        ex, res = define(self.backend)
+
+        ex.set_parameters(a=1)
+        assert res.compute() == 2
+        assert calls == ['inc']
+
+        ex.set_parameters(a=2)
+        assert res.compute() == 3
+        assert calls == ['inc', 'inc']
+
+        # other process using the same backend
+        ex, res = define(self.backend)
+        ex.set_parameters(a=1)
+        assert res.compute() == 2
+        assert calls == ['inc', 'inc']
+
+        info = ex.get_cache_info(backend=True)
+        assert info['hits'] == 2
+        assert info['misses'] == 0
+        assert info['count'] == 4
+        assert info['max_bytes'] == 10000
+
+        ex.clear_cache(backend=True)
+        assert ex.get_cache_info(backend=True)['count'] == 0
+        assert res.compute() == 2
+        assert calls == ['inc', 'inc', 'inc']
+        ex._delete_cache()
+
+    def test_backend_cache_disabled_step(self):
+        ex = daskperiment.Experiment(id='test_backend_cache_disabled',
+                                     backend=self.backend,
+                                     backend_cache_size=10000)
+        a = ex.parameter("a")
+
+        calls = []
+
+        @ex(cache=False)
+        def inc(a):
+            calls.append('inc')
+            ex.save_metric('value', epoch=0, value=a)
+            return a + 1
+
+        @ex.result
+        def result(x):
+            return x
+
+        res = result(inc(a))
+        ex.set_parameters(a=1)
+        assert res.compute() == 2
+        assert res.compute() == 2
+        assert calls == ['inc', 'inc']
+        metric = ex.load_metric('value', trial_id=[1, 2])
+        assert metric.loc[0].tolist() == [1, 1]
+
+        # only the result step is stored
+        info = ex.get_cache_info(backend=True)
+        assert info['count'] == 1
+        assert info['hits'] == 1
+        ex._delete_cache()
+
+    def test_not_incremental(self, ex):
+        a = ex.parameter("a")
+
+        calls = []
+
+        @ex.persist
+        def inc(a):
+            calls.append('inc')
+            return a + 1
+
+        res = ex.result(lambda x: x)(inc(a))
+        ex.set_parameters(a=1)
+        assert res.compute() == 2
+        assert res.compute() == 2
+        assert calls == ['inc', 'inc']
+
+    def test_resume(self, ex):
+        a = ex.parameter("a")
+
+        calls = []
+
+        @ex.persist
+        def load(a):
+            calls.append('load')
+            return a * 10
+
+        @ex.persist
+        def prepare(x):
+            calls.append('prepare')
+            return x + 1
+
+        @ex.result
+        def result(x, fail):
+            calls.append('result')
+            if fail:
+                raise ValueError('failed')
+            return x
+
+        res = result(prepare(load(a)), ex.parameter("fail"))
+        ex.set_parameters(a=1, fail=True)
+
+        with pytest.raises(ValueError, match='failed'):
+            res.compute(seed=1)
+        assert calls == ['load', 'prepare', 'result']
+
+        # resumed trial uses the parameters of the failed trial
+        ex.set_parameters(a=2, fail=False)
+        with pytest.raises(ValueError, match='failed'):
+            res.compute(resume_from=1)
+        # upstream of the persisted step is not executed
+        assert calls == ['load', 'prepare', 'result', 'result']
+
+        # resume the trial changing the code
+        @ex.result
+        def result(x, fail):
+            calls.append('result2')
+            return x
+
+        res = result(prepare(load(a)), ex.parameter("fail"))
+        assert res.compute(resume_from=2) == 11
+        assert calls == ['load', 'prepare', 'result', 'result', 'result2']
+        assert ex.get_persisted('prepare', trial_id=3) == 11
+
+        hist = ex.get_history(verbose=True)
+        assert hist['a'].tolist() == [1, 1, 1]
+        assert hist['Seed'].tolist() == [1, 1, 1]
+        assert hist['Success'].tolist() == [False, False, True]
+        assert hist['Resumed From'].tolist()[1:] == [1, 2]
+        assert pd.isnull(hist.loc[1, 'Resumed From'])
+
+        with pytest.raises(ValueError, match='Unable to specify parameters'):
+            res.compute(resume_from=2, parameters={'a': 1})
+        with pytest.raises(TrialIDNotFoundError):
+            res.compute(resume_from=10)
+
+    def test_resume_link(self, ex, monkeypatch):
+        a = ex.parameter("a")
+
+        @ex.persist
+        def load(a):
+            return np.arange(a)
+
+        @ex.result
+        def result(x, fail):
+            if fail:
+                raise ValueError('failed')
+            return x.sum()
+
+        res = result(load(a), ex.parameter("fail"))
+        ex.set_parameters(a=10, fail=True)
+        with pytest.raises(ValueError, match='failed'):
+            res.compute()
+
+        saved = []
+        backend_class = type(ex._backend)
+        save_persisted = backend_class.save_persisted
+
+        def save(self, key, obj, format=None):
+            saved.append(key)
+            return save_persisted(self, key, obj, format=format)
+
+        monkeypatch.setattr(backend_class, 'save_persisted', save)
+
+        ex.set_parameters(fail=False)
+        with pytest.raises(ValueError, match='failed'):
+            res.compute(resume_from=1)
+        # resumed result is referred without being saved again
+        assert saved == []
+
+        backend = ex._backend
+        reference = backend.get_persisted_reference(
+            backend.get_persist_key('load', 1))
+        assert reference is not None
+        assert backend.get_persisted_reference(
+            backend.get_persist_key('load', 2)) == reference
+        np.testing.assert_array_equal(ex.get_persisted('load', trial_id=2),
+                                      np.arange(10))
+
+    def test_annotations(self, ex):
+        a = ex.parameter("a")
+
+        @ex(resources={'MEM': 8e9}, priority=10, retries=2)
+        def heavy(a):
+            return a + 1
+
+        @ex.persist(priority=5)
+        def persisted(x):
+            return x * 2
+
+        @ex.result
+        def result(x):
+            return x
+
+        x = heavy(a)
+        y = persisted(x)
+        res = result(y)
+
+        layers = res.dask.layers
+        assert layers[x.key].annotations == {'resources': {'MEM': 8e9},
+                                             'priority': 10, 'retries': 2}
+        assert layers[y.key].annotations == {'priority': 5}
+        assert not layers[res.key].annotations
+        # parameter layer is not annotated
+        assert not layers[a.key].annotations
+
+        ex.set_parameters(a=1)
+        assert res.compute() == 4
+
+        # annotations are kept in the trial graph
+        task = daskperiment.core.experiment.TrialTask(res)
+        dsk = task._resolve_parameters(task.dask, 1)
+        assert dsk.layers[x.key].annotations['priority'] == 10
+
+    def test_annotations_sweep(self, ex, monkeypatch):
+        import daskperiment.core.experiment as experiment
+
+        graphs = []
+
+        def build_batch_graph(*args, **kwargs):
+            dsk, keys = build(*args, **kwargs)
+            graphs.append(dsk)
+            return dsk, keys
+
+        build = experiment.build_batch_graph
+        monkeypatch.setattr(experiment, 'build_batch_graph',
+                            build_batch_graph)
+
+        a = ex.parameter("a")
+        b = ex.parameter("b")
+
+        @ex(priority=10, retries=2)
+        def heavy(a):
+            return a + 1
+
+        @ex(priority=5)
+        def shared(b):
+            return b * 10
+
+        @ex.result
+        def result(x, y):
+            return x + y
+
+        x = heavy(a)
+        y = shared(b)
+        res = result(x, y)
+        ex.set_parameters(b=1)
+        assert ex.sweep(res, {'a': [1, 2]}) == [12, 13]
+
+        layers = graphs[0].layers
+        for trial_id in [1, 2]:
+            name = '{}-trial{}'.format(x.key, trial_id)
+            assert layers[name].annotations == {'priority': 10,
+                                                'retries': 2}
+            name = '{}-trial{}'.format(a.key, trial_id)
+            assert not layers[name].annotations
+        assert layers[y.key].annotations == {'priority': 5}
+
+    def test_reference_parameter(self, ex):
+        a = ex.parameter("a", reference=True)
+        b = ex.parameter("b")
+
+        @ex.result
+        def total(a, b):
+            return a.sum() * b
+
+        res = total(a, b)
+        arr = np.arange(10)
+        ex.set_parameters(a=arr, b=1)
+        assert res.compute() == 45
+
+        ex.set_parameters(b=2)
+        assert res.compute() == 90
+
+        hist = ex.get_history()
+        ref = hist.loc[1, 'a']
+        assert isinstance(ref, daskperiment.core.parameter.ParameterReference)
+        assert ref.summary == 'ndarray(shape=(10,), dtype=int64)'
+        # same value is referenced by the same token
+        assert hist.loc[2, 'a'] == ref
+        np.testing.assert_array_equal(ex.load_reference(ref), arr)
+
+        # resumed trial loads the referenced value
+        assert res.compute(resume_from=1) == 45
+
+    def test_step_log(self):
+        ex = daskperiment.Experiment(id='test_step_log',
+                                     backend=self.backend,
+                                     cache_size=10000)
+        a = ex.parameter('a')
+
+        @ex
+        def prepare(a):
+            return list(range(a))
+
+        @ex.result
+        def total(x):
+            return sum(x)
+
+        res = total(prepare(a))
+        ex.set_parameters(a=10)
+        assert res.compute() == 45
+        assert res.compute() == 45
+
+        log = ex.get_step_log(1)
+        exp_columns = ['Step', 'Started', 'Wall Time', 'CPU Time',
+                       'Hash Time', 'Process Peak RSS', 'Result Size',
+                       'From Cache']
+        assert log.columns.tolist() == exp_columns
+        assert log['Step'].tolist() == ['prepare', 'total']
+        assert log['From Cache'].tolist() == [False, False]
+        assert (log['Wall Time'] >= pd.Timedelta(0)).all()
+        assert (log['CPU Time'] >= pd.Timedelta(0)).all()
+        assert log['Result Size'].iloc[0] > log['Result Size'].iloc[1]
+        if sys.platform != 'win32':
+            assert (log['Process Peak RSS'] > 0).all()
+
+        log = ex.get_step_log(2)
+        assert log['Step'].tolist() == ['prepare', 'total']
+        assert log['From Cache'].tolist() == [True, True]
+
+        # steps shared in batch are recorded in all the trials
+        ex.sweep(res, {'a': [3, 4]})
+        for trial_id in [3, 4]:
+            log = ex.get_step_log(trial_id)
+            assert log['Step'].tolist() == ['prepare', 'total']
+
+        with pytest.raises(TrialIDNotFoundError):
+            ex.get_step_log(5)
+        ex._delete_cache()
+
+    def test_profile(self, ex):
+        a = ex.parameter('a')
+
+        @ex
+        def prepare(a):
+            return list(range(a))
+
+        @ex.result
+        def total(x):
+            return sum(x)
+
+        res = total(prepare(a))
+        ex.set_parameters(a=10)
+        assert res.compute() == 45
+        assert res.compute(profile=True) == 45
+        assert res.compute(profile='sampling') == 45
+
+        with pytest.raises(TrialIDNotFoundError, match='not profiled'):
+            ex.get_profile(1)
+
+        stats = ex.get_profile(2)
+        assert isinstance(stats, pstats.Stats)
+        funcs = [func[2] for func in stats.stats]
+        assert 'prepare' in funcs
+        assert 'total' in funcs
+
+        df = ex.get_profile(2, top=5)
+        assert isinstance(df, pd.DataFrame)
+        assert len(df) == 5
+
+        df = ex.get_profile(3)
+        assert isinstance(df, pd.DataFrame)
+
+        with pytest.raises(ValueError, match="profile must be a bool"):
+            res.compute(profile='xxx')
+        assert ex.trial_id == 3
+
+    def test_compression(self, ex):
+        from daskperiment.io.compression import Compression
+
+        # re-initialize to compress all the data
+        ex = daskperiment.Experiment(id=ex.id, backend=self.backend,
+                                     compression=Compression('zlib',
+                                                             threshold=0))
+        assert ex._backend.compression.codecs['persist'] == 'zlib'
+
+        a = ex.parameter('a')
+
+        @ex.persist
+        def prepare(a):
+            ex.save_metric('dummy_metric', epoch=1, value=a)
+            return list(range(a))
+
+        @ex.result
+        def total(x):
+            return sum(x)
+
+        res = total(prepare(a))
+        ex.set_parameters(a=1000)
+        assert res.compute() == 499500
+
+        if isinstance(ex._backend, LocalBackend):
+            from daskperiment.io.compression import is_compressed_file
+            key = ex._backend.get_persist_key('prepare', 1)
+            name = key.with_suffix('.ref').read_text()
+            assert is_compressed_file(ex._backend.get_persist_blob_key(name))
+            assert is_compressed_file(ex._backend.get_code_key(1))
+
+        # compressed data is loaded regardless of the setting
+        ex = daskperiment.Experiment(id=ex.id, backend=self.backend,
+                                     compression=False)
+        assert not ex._backend.compression.enabled('persist')
+        assert ex.get_persisted('prepare', trial_id=1) == list(range(1000))
+        assert 'def prepare(a):' in ex.get_code(trial_id=1)
+        assert ex.get_parameters(trial_id=1) == {'a': 1000}
+        metric = ex.load_metric('dummy_metric', trial_id=1)
+        assert metric.loc[1, 1] == 1000
+
+        with pytest.raises(ValueError, match='compression codec must be'):
+            daskperiment.Experiment(id=ex.id, backend=self.backend,
+                                    compression='xxx')
+
+    def test_persist_writer(self, ex, monkeypatch):
+        # re-initialize to write persisted steps on background
+        ex = daskperiment.Experiment(id=ex.id, backend=self.backend,
+                                     persist_buffer_size=10000)
+        assert ex._persist_writer.enabled
+
+        a = ex.parameter('a')
+
+        @ex.persist
+        def prepare(a):
+            return list(range(a))
+
+        @ex.persist
+        def double(x):
+            return [i * 2 for i in x]
+
+        @ex.result
+        def total(x):
+            return sum(x)
+
+        res = total(double(prepare(a)))
+        ex.set_parameters(a=10)
+        assert res.compute() == 90
+        # written before the trial is finished
+        assert ex.get_persisted('prepare', trial_id=1) == list(range(10))
+        assert ex.get_persisted('double', trial_id=1) == list(range(0, 20, 2))
+        info = ex._persist_writer.info()
+        assert info['writes'] == 2
+        assert info['nbytes'] == 0
+
+        def raise_error(*args, **kwargs):
+            raise OSError('disk is full')
+
+        monkeypatch.setattr(ex._backend, 'save_persisted', raise_error)
+        with pytest.raises(OSError, match='disk is full'):
+            res.compute()
+
+        hist = ex.get_history()
+        assert hist['Success'].tolist() == [True, False]
+        assert hist.loc[2, 'Description'] == 'OSError(disk is full)'
+
+        with pytest.raises(ValueError, match='must be 0 or positive'):
+            daskperiment.Experiment(id=ex.id, backend=self.backend,
+                                    persist_buffer_size=-1)
+
+    def test_trace(self, ex, tmpdir):
+        a = ex.parameter('a')
+
+        @ex.persist
+        def prepare(a):
+            ex.save_metric('dummy_metric', epoch=1, value=a)
+            return list(range(a))
+
+        @ex.result
+        def total(x):
+            return sum(x)
+
+        res = total(prepare(a))
+        ex.set_parameters(a=10)
+        assert res.compute() == 45
+        assert res.compute(trace=True) == 45
+
+        with pytest.raises(TrialIDNotFoundError, match='not traced'):
+            ex.get_trace(1)
+
+        path = str(tmpdir.join('trace.json'))
+        trace = ex.get_trace(2, path=path)
+        with open(path) as f:
+            assert json.load(f) == trace
+
+        spans = [e for e in trace['traceEvents'] if e['ph'] == 'X']
+        categories = {e['name']: e['cat'] for e in spans}
+        assert categories['trial 2'] == 'trial'
+        assert categories['prepare'] == 'step'
+        assert categories['total'] == 'step'
+        assert categories['compute'] == 'step'
+        assert categories['save experiment'] == 'backend'
+        assert categories['save persist'] == 'backend'
+        assert categories['save metric'] == 'backend'
+        assert categories['save result'] == 'backend'
+
+        # all spans are in the trial span
+        trial = [e for e in spans if e['name'] == 'trial 2'][0]
+        for span in spans:
+            assert span['ts'] >= trial['ts']
+            assert span['ts'] + span['dur'] <= trial['ts'] + trial['dur']
+
+    @pytest.mark.parametrize('purity', ['full', 'sampled', 'fast', 'async'])
+    def test_purity(self, purity, ex, caplog):
+        a = ex.parameter('a')
+        counter = []
+
+        @ex(purity=purity)
+        def impure(a):
+            counter.append(a)
+            return np.arange(10000) + len(counter)
+
+        @ex.result(purity='off')
+        def total(x):
+            return int(x.sum())
+
+        res = total(impure(a))
+        ex.set_parameters(a=1)
+        assert res.compute() == 49995000 + 10000
+        assert res.compute() == 49995000 + 20000
+
+        msg = 'Experiment step result is changed with the same input'
+        messages = [r.getMessage() for r in caplog.records]
+        warned = [m for m in messages if m.startswith(msg)]
+        assert len(warned) == 1
+        assert '(step: impure' in warned[0]
+
+        log = ex.get_step_log(2)
+        assert log['Hash Time'].iloc[0] > pd.Timedelta(0)
+        # purity check is skipped
+        assert log['Hash Time'].iloc[1] == pd.Timedelta(0)
+
+    @pytest.mark.parametrize('purity', ['off', 'sampled', 'fast'])
+    def test_purity_persist_no_input_hash(self, purity, ex, monkeypatch):
+        import daskperiment.core.experiment as experiment
+
+        calls = []
+
+        def get_hash(*args, **kwargs):
+            calls.append(args)
+            raise AssertionError('inputs must not be hashed by tokenize')
+
+        monkeypatch.setattr(experiment, 'get_hash', get_hash)
+        a = ex.parameter('a')
+
+        @ex.persist(purity=purity)
+        def inc(a):
+            return np.arange(10000) + a
+
+        @ex.result(purity='off')
+        def total(x):
+            return int(x.sum())
+
+        res = total(inc(a))
+        ex.set_parameters(a=1)
+        assert res.compute() == 49995000 + 10000
+        assert calls == []
+        np.testing.assert_array_equal(ex.get_persisted('inc', trial_id=1),
+                                      np.arange(10000) + 1)
+
+    def test_purity_invalid(self, ex):
+        msg = 'purity must be one of full, sampled, fast, async, off'
+        with pytest.raises(ValueError, match=msg):
+            @ex(purity='xxx')
+            def step(a):
+                return a
+
+        with pytest.raises(ValueError, match=msg):
+            daskperiment.Experiment(id='test_purity_invalid',
+                                    backend=self.backend, purity='xxx')
+
     def test_metric(self, ex):
         a = ex.parameter('a')
         assert ex.trial_id == 0
@@ -0,0 +1,207 @@
+import pytest
+
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+
+import daskperiment
+from daskperiment.backend import LocalBackend
+from daskperiment.core.cache import BackendStepCache, StepCache
+
+
+class TestStepCache(object):
+
+    def test_get_put(self):
+        cache = StepCache(max_bytes=10000)
+        assert cache.enabled
+        assert cache.get('a') == (False, None)
+
+        assert cache.put('a', 1)
+        assert 'a' in cache
+        assert cache.get('a') == (True, 1)
+
+        info = cache.info()
+        assert info['hits'] == 1
+        assert info['misses'] == 1
+        assert info['evictions'] == 0
+        assert info['count'] == 1
+        assert info['nbytes'] > 0
+        assert info['max_bytes'] == 10000
+
+    @pytest.mark.parametrize('value', [np.arange(10),
+                                       pd.DataFrame({'a': np.arange(10)}),
+                                       pd.Series(np.arange(10))])
+    def test_copy(self, value):
+        cache = StepCache(max_bytes=10000)
+        cache.put('a', value)
+        # modified after stored
+        value[:] = -1
+
+        found, res = cache.get('a')
+        assert found
+        np.testing.assert_array_equal(np.asarray(res).ravel(), np.arange(10))
+        # modified after loaded
+        res[:] = -1
+        np.testing.assert_array_equal(np.asarray(cache.get('a')[1]).ravel(),
+                                      np.arange(10))
+
+    def test_disabled(self):
+        cache = StepCache()
+        assert not cache.enabled
+        assert not cache.put('a', 1)
+        assert cache.get('a') == (False, None)
+        assert cache.info()['misses'] == 0
+
+    def test_lru(self):
+        arr = np.zeros(100, dtype=np.int64)
+        cache = StepCache(max_bytes=arr.nbytes * 2 + 100)
+        cache.put('a', arr)
+        cache.put('b', arr)
+        # "a" becomes most recently used
+        assert cache.get('a')[0]
+
+        cache.put('c', arr)
+        assert 'a' in cache
+        assert 'b' not in cache
+        assert 'c' in cache
+        assert cache.info()['evictions'] == 1
+
+        # too large to be cached
+        assert not cache.put('d', np.zeros(1000, dtype=np.int64))
+        assert len(cache) == 2
+
+        cache.resize(arr.nbytes + 100)
+        assert len(cache) == 1
+        assert 'c' in cache
+        assert cache.info()['evictions'] == 2
+
+        with pytest.raises(ValueError, match='Cache size must be'):
+            cache.resize(-1)
+
+    def test_clear(self):
+        cache = StepCache(max_bytes=10000)
+        cache.put('a', 1)
+        cache.get('a')
+        cache.clear()
+        assert len(cache) == 0
+        assert cache.nbytes == 0
+        assert cache.info()['hits'] == 1
+
+    def test_pickle(self):
+        cache = StepCache(max_bytes=10000)
+        cache.put('a', 1)
+        res = pickle.loads(pickle.dumps(cache))
+        assert res.max_bytes == 10000
+        assert len(res) == 0
+
+
+class TestBackendStepCache(object):
+
+    @classmethod
+    def init_backend(cls):
+        p = daskperiment.config._CACHE_DIR / 'backend_step_cache'
+        return LocalBackend('backend_step_cache', p)
+
+    @classmethod
+    def teardown_class(cls):
+        cls.init_backend()._delete_cache()
+
+    def test_get_put(self):
+        cache = BackendStepCache(self.init_backend(), max_bytes=10000)
+        assert cache.enabled
+        assert cache.get('step-a') == (False, None)
+
+        assert cache.put('step-a', {'x': 1})
+        assert cache.get('step-a') == (True, {'x': 1})
+
+        # shared with other instance
+        other = BackendStepCache(self.init_backend(), max_bytes=10000)
+        assert other.get('step-a') == (True, {'x': 1})
+
+        info = cache.info()
+        assert info['hits'] == 1
+        assert info['misses'] == 1
+        assert info['count'] == 1
+        assert info['nbytes'] > 0
+        assert info['ttl'] is None
+
+        cache.clear()
+        assert cache.get('step-a') == (False, None)
+
+    def test_disabled(self):
+        cache = BackendStepCache(self.init_backend())
+        assert not cache.enabled
+        assert not cache.put('step-b', 1)
+        assert cache.get('step-b') == (False, None)
+
+    def test_lru(self):
+        backend = self.init_backend()
+        arr = np.zeros(100, dtype=np.int64)
+        nbytes = len(daskperiment.io.pickle.dumps(arr))
+        cache = BackendStepCache(backend, max_bytes=nbytes * 2)
+
+        cache.put('step-c', arr)
+        time.sleep(0.05)
+        cache.put('step-d', arr)
+        time.sleep(0.05)
+        assert cache.get('step-c')[0]
+        time.sleep(0.05)
+        cache.put('step-e', arr)
+
+        keys = [key for key, _, _ in backend.list_step_outputs()]
+        assert sorted(keys) == ['step-c', 'step-e']
+        assert cache.info()['evictions'] == 1
+
+        # too large to be cached
+        assert not cache.put('step-f', np.zeros(1000, dtype=np.int64))
+        cache.clear()
+
+    def test_evict_listing(self, monkeypatch):
+        backend = self.init_backend()
+        cache = BackendStepCache(backend, max_bytes=10000)
+        cache.clear()
+
+        calls = []
+        list_step_outputs = backend.list_step_outputs
+
+        def listed():
+            calls.append(1)
+            return list_step_outputs()
+
+        monkeypatch.setattr(backend, 'list_step_outputs', listed)
+
+        # stored outputs are not listed on every put
+        for i in range(10):
+            cache.put('step-j{}'.format(i), i)
+        assert len(calls) == 0
+
+        # running total exceeds the budget
+        cache.put('step-k1', np.zeros(700, dtype=np.int64))
+        assert len(calls) == 0
+        cache.put('step-k2', np.zeros(700, dtype=np.int64))
+        assert len(calls) == 1
+
+        # outputs stored by other processes are counted periodically
+        cache.scan_interval = 3
+        for i in range(3):
+            cache.put('step-l{}'.format(i), i)
+        assert len(calls) == 2
+        cache.clear()
+
+    def test_ttl(self):
+        cache = BackendStepCache(self.init_backend(), max_bytes=10000,
+                                 ttl=0.1)
+        cache.put('step-g', 1)
+        cache.put('step-h', 1)
+        assert cache.get('step-g') == (True, 1)
+
+        time.sleep(0.2)
+        assert cache.get('step-g') == (False, None)
+
+        # expired output is evicted when other output is stored
+        cache.put('step-i', 1)
+        assert cache.info()['count'] == 1
+        assert cache.info()['evictions'] == 1
+        cache.clear()
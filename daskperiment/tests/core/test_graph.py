@@ -0,0 +1,203 @@
+from operator import add
+
+from dask.core import get
+from dask.optimization import cull
+from dask.highlevelgraph import HighLevelGraph
+
+from daskperiment.core.graph import (TrialFailure, TrialBoundFunction,
+                                     add_alias, apply, build_batch_graph,
+                                     get_dependents, get_task_function,
+                                     get_trial_key, is_local_scheduler,
+                                     rename_keys, resolve_graph,
+                                     substitute_tasks, uniquify_graph)
+from daskperiment.core.trial.local import LocalTrialManager
+
+
+class TestGraph(object):
+
+    def test_get_trial_key(self):
+        assert get_trial_key('x-1', 3) == 'x-1-trial3'
+        assert get_trial_key(('x-1', 0, 1), 3) == ('x-1-trial3', 0, 1)
+
+    def test_rename_keys(self):
+        mapping = {'a': 'a-1', 'b': 'b-1'}
+        task = (add, 'a', [(add, 'b', 1), 'c'])
+        exp = (add, 'a-1', [(add, 'b-1', 1), 'c'])
+        assert rename_keys(task, mapping) == exp
+        assert rename_keys(['a', 'c'], mapping) == ['a-1', 'c']
+        assert rename_keys({'a': 1}, mapping) == {'a': 1}
+
+    def test_resolve_graph(self):
+        layers = {'a': {'a': None},
+                  'b': {'b': (add, 'a', 1), 'c': (add, 'b', 1)}}
+        dependencies = {'a': set(), 'b': {'a'}}
+        dsk = HighLevelGraph(layers, dependencies)
+
+        res = resolve_graph(dsk, {'a': 1, 'x': 2})
+        assert isinstance(res, HighLevelGraph)
+        assert res.layers['b'] is dsk.layers['b']
+        assert dict(res) == {'a': 1, 'b': (add, 'a', 1), 'c': (add, 'b', 1)}
+
+        # key is a part of other layer
+        res = resolve_graph(dsk, {'a': 1, 'c': 2})
+        assert res == {'a': 1, 'b': (add, 'a', 1), 'c': 2}
+
+        res = resolve_graph({'a': None, 'b': (add, 'a', 1)}, {'a': 1})
+        assert res == {'a': 1, 'b': (add, 'a', 1)}
+
+    def test_get_task_function(self):
+        assert get_task_function((add, 1, 2)) is add
+        assert get_task_function((apply, add, [1, 2], {})) is add
+        assert get_task_function('a') is None
+        assert get_task_function(1) is None
+
+    def test_substitute_tasks(self):
+        dsk = {'a': 1, 'b': (add, 'a', 1), 'c': (add, 'b', 1),
+               'd': (add, 'c', 'a')}
+        loaded = []
+
+        def load(key, task):
+            loaded.append(key)
+            if key in ('a', 'c'):
+                # loaded value is kept as it is
+                return True, ('x', 'y')
+            return False, None
+
+        res, keys = substitute_tasks(dsk, 'd', load)
+        assert keys == ['a', 'c']
+        # dependencies of the replaced task are not visited
+        assert sorted(loaded) == ['a', 'c', 'd']
+        res, _ = cull(res, 'd')
+        assert sorted(res) == ['a', 'c', 'd']
+        assert get(res, 'd') == ('x', 'y', 'x', 'y')
+        # original graph is not changed
+        assert get(dsk, 'd') == 4
+
+    def test_add_alias(self):
+        dsk = HighLevelGraph({'a': {'a': 1}}, {'a': set()})
+        res = add_alias(dsk, 'a', 'a-1')
+        assert dict(res) == {'a': 1, 'a-1': 'a'}
+        assert res.dependencies['a-1'] == {'a'}
+
+        assert add_alias({'a': 1}, 'a', 'a-1') == {'a': 1, 'a-1': 'a'}
+
+    def test_get_dependents(self):
+        dsk = {'a': 1, 'b': 2,
+               'c': (add, 'a', 1),
+               'd': (add, 'c', 'b'),
+               'e': (add, 'b', 1)}
+        assert get_dependents(dsk, ['a']) == {'a', 'c', 'd'}
+        assert get_dependents(dsk, ['b']) == {'b', 'd', 'e'}
+        assert get_dependents(dsk, []) == set()
+
+    def test_build_batch_graph(self):
+        trials = LocalTrialManager('dummy')
+        dsk = {'a': None, 'b': None,
+               'c': (add, 'b', 1),
+               'd': (add, 'a', 'c')}
+        params = [{'a': 1, 'b': 2}, {'a': 3, 'b': 2}]
+        graph, keys = build_batch_graph(dsk, 'd', params, [5, 6], trials)
+
+        assert keys == ['d-trial5', 'd-trial6']
+        assert sorted(graph.keys()) == ['a-trial5', 'a-trial6', 'b', 'c',
+                                        'd-trial5', 'd-trial6']
+        assert graph['b'] == 2
+        assert graph['a-trial5'] == 1
+        assert graph['a-trial6'] == 3
+
+        assert graph['c'][0].trial_ids == (5, 6)
+        assert graph['c'][1:] == ('b', 1)
+        assert graph['d-trial5'][0].trial_ids == (5, )
+        assert graph['d-trial5'][1:] == ('a-trial5', 'c')
+
+    def test_build_batch_graph_layers(self):
+        from dask.highlevelgraph import MaterializedLayer
+
+        trials = LocalTrialManager('dummy')
+        layers = {'a': {'a': None}, 'b': {'b': None},
+                  'c': MaterializedLayer({'c': (add, 'b', 1)},
+                                         annotations={'priority': 10}),
+                  'd': MaterializedLayer({'d': (add, 'a', 'c')},
+                                         annotations={'retries': 2})}
+        dependencies = {'a': set(), 'b': set(), 'c': {'b'},
+                        'd': {'a', 'c'}}
+        dsk = HighLevelGraph(layers, dependencies)
+        params = [{'a': 1, 'b': 2}, {'a': 3, 'b': 2}]
+        graph, keys = build_batch_graph(dsk, 'd', params, [5, 6], trials)
+        graph.validate()
+
+        assert keys == ['d-trial5', 'd-trial6']
+        assert sorted(graph.layers) == ['a-trial5', 'a-trial6', 'b', 'c',
+                                        'd-trial5', 'd-trial6']
+        assert graph.dependencies['d-trial5'] == {'a-trial5', 'c'}
+        assert graph.dependencies['c'] == {'b'}
+        assert graph['a-trial6'] == 3
+        assert graph['d-trial5'][1:] == ('a-trial5', 'c')
+
+        # annotations are kept in shared and duplicated layers
+        assert graph.layers['c'].annotations == {'priority': 10}
+        assert graph.layers['d-trial5'].annotations == {'retries': 2}
+        assert graph.layers['d-trial6'].annotations == {'retries': 2}
+        assert get(dict(graph), keys) == (4, 6)
+
+    def test_uniquify_graph(self):
+        from dask.highlevelgraph import MaterializedLayer
+
+        layers = {'a': {'a': 1},
+                  'b': MaterializedLayer({'b': (add, 'a', 1), 'c': 'b'},
+                                         annotations={'priority': 10})}
+        dsk = HighLevelGraph(layers, {'a': set(), 'b': {'a'}})
+        graph = uniquify_graph(dsk, 3)
+        graph.validate()
+
+        assert sorted(graph.layers) == ['a-trial3', 'b-trial3']
+        assert graph.dependencies['b-trial3'] == {'a-trial3'}
+        assert graph.layers['b-trial3'].annotations == {'priority': 10}
+        assert get(dict(graph), 'c-trial3') == 2
+
+        res = uniquify_graph({'a': 1, 'b': (add, 'a', 1)}, 3)
+        assert res == {'a-trial3': 1, 'b-trial3': (add, 'a-trial3', 1)}
+
+    def test_is_local_scheduler(self):
+        import dask
+        import dask.threaded
+
+        assert is_local_scheduler(None)
+        assert is_local_scheduler(dask.threaded.get)
+        assert is_local_scheduler(dask.get)
+        assert not is_local_scheduler(lambda dsk, keys, **kwargs: None)
+
+    def test_trial_bound_function(self):
+        trials = LocalTrialManager('dummy')
+
+        def current(x):
+            return trials.current_trial_ids
+
+        func = TrialBoundFunction(current, (1, 2), trials)
+        assert func(1) == (1, 2)
+
+        def div(x):
+            return 1 / x
+
+        func = TrialBoundFunction(div, (1, ), trials)
+        res = func(0)
+        assert isinstance(res, TrialFailure)
+        assert res.description == 'ZeroDivisionError(division by zero)'
+
+        # failure is propagated without calling function
+        func = TrialBoundFunction(current, (1, ), trials)
+        assert func([1, res]) is res
+
+    def test_build_batch_graph_context(self):
+        trials = LocalTrialManager('dummy')
+        dsk = {'a': None, 'ctx': None,
+               'c': (add, 'ctx', 1),
+               'd': (add, 'a', 'ctx')}
+        params = [{'a': 1}, {'a': 3}]
+        graph, keys = build_batch_graph(dsk, 'd', params, [5, 6], trials,
+                                        context_key='ctx')
+        # shared step belongs to all the trials
+        assert graph['ctx'] == (5, 6)
+        assert graph['c'][1:] == ('ctx', 1)
+        assert graph['ctx-trial5'] == (5, )
+        assert graph['d-trial5'][1:] == ('a-trial5', 'ctx-trial5')
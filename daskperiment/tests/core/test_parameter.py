@@ -1,7 +1,12 @@
 import pytest
 
+import numpy as np
+import pandas as pd
+
 import daskperiment
-from daskperiment.core.parameter import ParameterManager, Undefined
+from daskperiment.core.parameter import (ParameterManager, ParameterReference,
+                                         Undefined, expand_parameter_grid,
+                                         summarize_value)
 
 
 class TestUndefined(object):
@@ -162,3 +167,78 @@ class TestParameter(object):
         p.set(a=1)
         exp = {'a': 1, 'b': Undefined()}
         assert p.to_dict() == exp
+
+    def test_parameter_bind(self):
+        p = ParameterManager()
+        a = p.define('a')
+        p.define('b')
+        p.set(a=1)
+
+        res = p.bind(b=3)
+        assert res.to_dict() == {'a': 1, 'b': 3}
+        assert res.to_dask_dict() == {a._key: 1, res._parameters['b']._key: 3}
+        # original is not changed
+        assert p.to_dict() == {'a': 1, 'b': Undefined()}
+
+        with pytest.raises(daskperiment.core.errors.ParameterUndeclaredError):
+            p.bind(c=3)
+
+    def test_parameter_reference(self):
+        p = ParameterManager()
+        a = p.define('a', reference=True)
+        p.define('b')
+        assert not a.is_reference
+
+        df = pd.DataFrame({'x': [1, 2, 3]})
+        p.set(a=df, b=1)
+        assert a.is_reference
+        ref = a._reference
+        assert ref.token == daskperiment.util.hashing.get_hash(df)
+        assert ref.summary == 'DataFrame(shape=(3, 1))'
+        exp = 'Reference(DataFrame(shape=(3, 1)), token={})'
+        assert repr(ref) == exp.format(ref.token)
+
+        # history records the reference, graph holds the value
+        assert p.to_dict() == {'a': ref, 'b': 1}
+        assert p.to_dask_dict()[a._key] is df
+        assert p.get_references() == {ref: df}
+        assert p.describe() == "a={}, b=1<class 'int'>".format(ref)
+
+        # reference is copied without tokenizing
+        res = p.bind(b=2)
+        assert res._parameters['a']._reference is ref
+        res = p.bind(a=df + 1)
+        assert res._parameters['a']._reference != ref
+        assert p.to_dict()['a'] is ref
+
+    def test_summarize_value(self):
+        arr = np.zeros((2, 3))
+        assert summarize_value(arr) == 'ndarray(shape=(2, 3), dtype=float64)'
+        s = pd.Series([1, 2])
+        assert summarize_value(s) == 'Series(shape=(2,))'
+        assert summarize_value([1, 2]) == 'list(len=2)'
+        assert summarize_value(1) == 'int()'
+
+    def test_reference_tokenize(self):
+        ref = ParameterReference('xxx', 'int()')
+        assert daskperiment.util.hashing.get_hash(ref) == \
+            daskperiment.util.hashing.get_hash(ParameterReference('xxx', ''))
+
+
+class TestExpandParameterGrid(object):
+
+    def test_dict(self):
+        res = expand_parameter_grid({'b': [1, 2], 'a': ['x', 'y']})
+        exp = [{'a': 'x', 'b': 1}, {'a': 'x', 'b': 2},
+               {'a': 'y', 'b': 1}, {'a': 'y', 'b': 2}]
+        assert res == exp
+
+    def test_list(self):
+        params = [{'a': 1}, {'a': 2, 'b': 3}]
+        assert expand_parameter_grid(params) == params
+
+    def test_invalid(self):
+        with pytest.raises(ValueError, match='must be list-like'):
+            expand_parameter_grid({'a': 1})
+        with pytest.raises(ValueError, match='must be dict'):
+            expand_parameter_grid([1, 2])
@@ -0,0 +1,82 @@
+import pytest
+
+import pstats
+import threading
+import time
+
+import pandas as pd
+
+from daskperiment.core.profiler import (CProfileProfiler, SamplingProfiler,
+                                        create_profiler, to_profile_frame,
+                                        to_pstats)
+
+
+def busy(seconds):
+    start = time.time()
+    while time.time() - start < seconds:
+        pass
+
+
+def run_in_thread(profiler, func, *args):
+    def target():
+        with profiler.profile_step():
+            func(*args)
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+
+
+class TestProfiler(object):
+
+    def test_create_profiler(self):
+        assert create_profiler(None) is None
+        assert create_profiler(False) is None
+        assert isinstance(create_profiler(True), CProfileProfiler)
+        assert isinstance(create_profiler('cprofile'), CProfileProfiler)
+        assert isinstance(create_profiler('sampling'), SamplingProfiler)
+
+        msg = "profile must be a bool, 'cprofile' or 'sampling'"
+        with pytest.raises(ValueError, match=msg):
+            create_profiler('xxx')
+
+    def test_cprofile(self):
+        profiler = CProfileProfiler()
+        profiler.start()
+        busy(0.01)
+        # step executed in other thread
+        run_in_thread(profiler, busy, 0.01)
+        data = profiler.stop()
+        assert data['mode'] == 'cprofile'
+
+        stats = to_pstats(data)
+        assert isinstance(stats, pstats.Stats)
+        funcs = [func[2] for func in stats.stats]
+        assert 'busy' in funcs
+
+        df = to_profile_frame(data)
+        exp = ['Function', 'Calls', 'Total Time', 'Cumulative Time']
+        assert df.columns.tolist() == exp
+        busy_calls = df[df['Function'].str.endswith('(busy)')]
+        assert busy_calls['Calls'].tolist() == [2]
+
+        df = to_profile_frame(data, top=3)
+        assert len(df) == 3
+        assert df['Cumulative Time'].is_monotonic_decreasing
+
+    def test_sampling(self):
+        profiler = SamplingProfiler(interval=0.001)
+        profiler.start()
+        busy(0.05)
+        run_in_thread(profiler, busy, 0.05)
+        data = profiler.stop()
+        assert data['mode'] == 'sampling'
+        assert data['interval'] == 0.001
+
+        df = to_profile_frame(data)
+        busy_calls = df[df['Function'].str.endswith('(busy)')]
+        assert len(busy_calls) == 1
+        assert pd.isnull(busy_calls['Calls']).all()
+        assert (busy_calls['Cumulative Time'] > 0).all()
+
+        with pytest.raises(ValueError, match='only available for cprofile'):
+            to_pstats(data)
@@ -0,0 +1,87 @@
+import pytest
+
+import numpy as np
+import pandas as pd
+
+from daskperiment.core.retention import RetentionPolicy
+
+
+def make_history(results, success=None):
+    if success is None:
+        success = [True] * len(results)
+    index = pd.Index(range(1, len(results) + 1), name='Trial ID')
+    return pd.DataFrame({'Result': results, 'Success': success},
+                        index=index)
+
+
+class TestRetentionPolicy(object):
+
+    def test_keep_last(self):
+        history = make_history([1, 2, 3, 4])
+        trial_bytes = {1: 10, 2: 10, 3: 10, 4: 10}
+
+        policy = RetentionPolicy(keep_last=2)
+        assert policy.select(trial_bytes, {}, {}, history) == {1, 2}
+
+        policy = RetentionPolicy(keep_last=0)
+        assert policy.select(trial_bytes, {}, {}, history) == {1, 2, 3, 4}
+
+        # no policy
+        policy = RetentionPolicy()
+        assert policy.select(trial_bytes, {}, {}, history) == set()
+
+    def test_keep_last_without_artifacts(self):
+        # the latest trial doesn't have artifacts
+        history = make_history([1, 2, 3])
+        policy = RetentionPolicy(keep_last=1)
+        assert policy.select({1: 10, 2: 10}, {}, {}, history) == {1, 2}
+
+    def test_keep_best(self):
+        history = make_history([3, np.nan, 5, 'x', 1],
+                               success=[True, False, True, True, True])
+        trial_bytes = {i: 10 for i in range(1, 6)}
+
+        policy = RetentionPolicy(keep_best=2)
+        assert policy.select(trial_bytes, {}, {}, history) == {2, 4, 5}
+
+        policy = RetentionPolicy(keep_best=1, minimize=True)
+        assert policy.select(trial_bytes, {}, {}, history) == {1, 2, 3, 4}
+
+        policy = RetentionPolicy(keep_last=1, keep_best=1)
+        assert policy.select(trial_bytes, {}, {}, history) == {1, 2, 4}
+
+    def test_max_bytes(self):
+        history = make_history([1, 2, 3, 4])
+        trial_bytes = {1: 10, 2: 10, 3: 10, 4: 10}
+        # blob "a" is shared between trial 1 and 2
+        trial_blobs = {1: {'a'}, 2: {'a'}, 3: {'b'}, 4: {'c'}}
+        blob_bytes = {'a': 100, 'b': 100, 'c': 100, 'orphan': 1000}
+
+        policy = RetentionPolicy(max_bytes=1000)
+        assert policy.select(trial_bytes, trial_blobs, blob_bytes,
+                             history) == set()
+
+        # removing trial 1 doesn't reclaim the shared blob
+        policy = RetentionPolicy(max_bytes=300)
+        assert policy.select(trial_bytes, trial_blobs, blob_bytes,
+                             history) == {1, 2}
+
+        policy = RetentionPolicy(max_bytes=0)
+        assert policy.select(trial_bytes, trial_blobs, blob_bytes,
+                             history) == {1, 2, 3, 4}
+
+        # protected trials are not removed
+        policy = RetentionPolicy(keep_best=1, minimize=True, max_bytes=0)
+        assert policy.select(trial_bytes, trial_blobs, blob_bytes,
+                             history) == {2, 3, 4}
+
+    def test_invalid(self):
+        for key in ['keep_last', 'keep_best', 'max_bytes']:
+            with pytest.raises(ValueError, match='must be 0 or positive'):
+                RetentionPolicy(**{key: -1})
+
+    def test_repr(self):
+        policy = RetentionPolicy(keep_last=3)
+        exp = ('RetentionPolicy(keep_last: 3, keep_best: None, '
+               'max_bytes: None, minimize: False)')
+        assert repr(policy) == exp
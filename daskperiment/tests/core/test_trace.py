@@ -0,0 +1,41 @@
+import json
+import threading
+
+from daskperiment.core.trace import TrialTracer
+
+
+class TestTrialTracer(object):
+
+    def test_span(self):
+        tracer = TrialTracer(3)
+        with tracer.span('outer', 'trial'):
+            with tracer.span('inner', 'step', step='x'):
+                pass
+
+        def target():
+            with tracer.span('thread', 'step'):
+                pass
+        thread = threading.Thread(target=target, name='worker')
+        thread.start()
+        thread.join()
+
+        trace = tracer.to_dict()
+        assert trace['otherData'] == {'trial_id': 3}
+
+        events = trace['traceEvents']
+        metadata = [e for e in events if e['ph'] == 'M']
+        assert metadata[0]['args'] == {'name': 'Trial 3'}
+        names = sorted(e['args']['name'] for e in metadata[1:])
+        assert names == sorted([threading.current_thread().name, 'worker'])
+
+        spans = [e for e in events if e['ph'] == 'X']
+        assert [e['name'] for e in spans] == ['outer', 'inner', 'thread']
+        outer, inner, other = spans
+        assert outer['cat'] == 'trial'
+        assert inner['args'] == {'step': 'x'}
+        assert outer['ts'] <= inner['ts']
+        assert inner['ts'] + inner['dur'] <= outer['ts'] + outer['dur']
+        assert outer['tid'] == inner['tid']
+        assert outer['tid'] != other['tid']
+
+        assert json.loads(tracer.dumps()) == trace
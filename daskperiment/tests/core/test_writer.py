@@ -0,0 +1,103 @@
+import pytest
+
+import pickle
+import threading
+
+import numpy as np
+
+from daskperiment.core.writer import PersistWriter
+
+
+class TestPersistWriter(object):
+
+    def test_inline(self):
+        writer = PersistWriter()
+        assert not writer.enabled
+
+        written = []
+        assert writer.submit((1, ), lambda: written.append(1), 1) is None
+        assert written == [1]
+        writer.wait(1)
+        assert writer.info()['writes'] == 0
+
+    def test_background(self):
+        writer = PersistWriter(max_bytes=10000, workers=2)
+        assert writer.enabled
+
+        written = []
+        for i in range(5):
+            writer.submit((1, 2), lambda i=i: written.append(i), i)
+        writer.wait(1)
+        writer.wait(2)
+        assert sorted(written) == list(range(5))
+
+        info = writer.info()
+        assert info['writes'] == 5
+        assert info['blocked'] == 0
+        assert info['nbytes'] == 0
+        assert info['max_bytes'] == 10000
+
+    def test_backpressure(self):
+        arr = np.zeros(100, dtype=np.int64)
+        writer = PersistWriter(max_bytes=arr.nbytes + 100)
+
+        started = threading.Event()
+        release = threading.Event()
+
+        def block():
+            started.set()
+            release.wait()
+
+        writer.submit((1, ), block, arr)
+        started.wait()
+        assert writer.nbytes >= arr.nbytes
+
+        def submit():
+            writer.submit((1, ), lambda: None, arr)
+
+        # blocks until the first write is finished
+        thread = threading.Thread(target=submit)
+        thread.start()
+        thread.join(timeout=0.2)
+        assert thread.is_alive()
+
+        release.set()
+        thread.join()
+        writer.wait(1)
+        assert writer.info()['blocked'] == 1
+        assert writer.nbytes == 0
+
+        # larger than the buffer, but nothing is queued
+        writer.submit((1, ), lambda: None, np.zeros(1000))
+        writer.wait(1)
+
+    def test_error(self):
+        writer = PersistWriter(max_bytes=10000)
+
+        def fail():
+            raise OSError('disk is full')
+
+        writer.submit((1, ), fail, 1)
+        writer.submit((2, ), lambda: None, 1)
+        with pytest.raises(OSError, match='disk is full'):
+            writer.wait(1)
+        writer.wait(2)
+        # errors are raised once
+        writer.wait(1)
+        assert writer.nbytes == 0
+
+    def test_invalid(self):
+        with pytest.raises(ValueError, match='must be 0 or positive'):
+            PersistWriter(max_bytes=-1)
+        with pytest.raises(ValueError, match='must be positive'):
+            PersistWriter(max_bytes=1, workers=0)
+
+    def test_pickle(self):
+        writer = PersistWriter(max_bytes=100, workers=2)
+        writer.submit((1, ), lambda: None, 1)
+        writer.wait(1)
+
+        res = pickle.loads(pickle.dumps(writer))
+        assert res.max_bytes == 100
+        assert res.workers == 2
+        assert res.info()['writes'] == 0
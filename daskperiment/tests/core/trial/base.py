@@ -127,3 +127,84 @@ class TrialManagerBase(object):
         assert t.maybe_pure(total, ([1, 2], {'c': 3}), 5)
         assert t.maybe_pure(total, ([1, 2], {'c': 3}), 5)
         assert not t.maybe_pure(total, ([1, 2], {'c': 3}), 6)
+
+    def test_maybe_pure_buffered(self):
+        t = self.trials
+
+        def total(a=1, b=2, c=3):
+            return a + b + c
+
+        def other(a):
+            return a
+
+        assert t.maybe_pure(total, ([1, 2, 3], {}), 6)
+        assert t.maybe_pure(other, ([1], {}), 1)
+
+        trial_id = t.increment()
+        t.prefetch_step_hashes((trial_id, ), ['total'])
+        # prefetched hash is compared
+        assert not t.maybe_pure(total, ([1, 2, 3], {}), 5)
+        assert t.maybe_pure(total, ([1, 2, 3], {}), 5)
+        assert t.maybe_pure(total, ([4], {}), 4)
+        # step which is not prefetched
+        assert not t.maybe_pure(other, ([1], {}), 2)
+        t.flush_step_hashes(trial_id)
+        t.unlock()
+
+        # updates are saved
+        assert t.maybe_pure(total, ([1, 2, 3], {}), 5)
+        assert not t.maybe_pure(total, ([4], {}), 5)
+        assert t.maybe_pure(other, ([1], {}), 2)
+
+    def test_lock_threading(self):
+        import threading
+
+        t = self.trials
+        base = t.trial_id
+        i = t.increment()
+
+        results = {}
+
+        def other():
+            # current trial id is managed per thread
+            with pytest.raises(daskperiment.core.errors.TrialIDNotFoundError):
+                t.current_trial_id
+            results['trial_id'] = t.increment()
+            results['current'] = t.current_trial_id
+            t.unlock()
+
+        thread = threading.Thread(target=other)
+        thread.start()
+        thread.join()
+
+        assert results == {'trial_id': base + 2, 'current': base + 2}
+        assert t.current_trial_id == i
+        with t.bind([5, 6]):
+            assert t.current_trial_ids == (5, 6)
+            assert t.current_trial_id == 5
+        assert t.current_trial_id == i
+        t.unlock()
+        assert not t.is_locked()
+
+    def test_reserve(self):
+        t = self.trials
+        base = t.trial_id
+
+        res = t.reserve()
+        assert res == base + 1
+        assert not t.is_locked()
+        assert t.trial_id == base + 1
+
+        state = t.start('dummy', trial_id=res)
+        assert t.is_locked()
+        assert t.current_trial_id == res
+        t.unlock()
+        assert state._current_trial_id == res
+
+    def test_step_trial(self):
+        t = self.trials
+        assert t.load_step_trial('step-xxx-yyy') is None
+        t.save_step_trial('step-xxx-yyy', 3)
+        assert t.load_step_trial('step-xxx-yyy') == 3
+        t.save_step_trial('step-xxx-yyy', 5)
+        assert t.load_step_trial('step-xxx-yyy') == 5
@@ -18,3 +18,29 @@ class TestRedisTrialManager(TrialManagerBase, CleanupMixin):
         t = backend.get_trial_manager()
         assert t.trial_id == 0
         assert not t.is_locked()
+
+    def test_legacy_step_hashes(self):
+        from daskperiment.backend.base import get_step_input_key
+        from daskperiment.util.hashing import get_hash
+
+        backend = RedisBackend('legacy_step_hash', self.backend)
+        t = backend.get_trial_manager()
+
+        def total(a=1, b=2, c=3):
+            return a + b + c
+
+        # stored per input key by older versions
+        input_key = get_step_input_key('total', get_hash(1, 2, 3))
+        legacy_key = backend.get_step_hash_key(input_key)
+        backend.set(legacy_key, get_hash(6))
+
+        trial_id = t.increment()
+        t.prefetch_step_hashes((trial_id, ), ['total'])
+        # compared with the hash stored by older versions
+        assert not t.maybe_pure(total, ([1, 2, 3], {}), 5)
+        t.flush_step_hashes(trial_id)
+        t.unlock()
+
+        # migrated to the hash per step
+        assert backend.get(legacy_key) is None
+        assert backend.load_step_hashes(['total']) == {input_key: get_hash(5)}
@@ -0,0 +1,50 @@
+import pytest
+
+import daskperiment.io.chunk as chunk
+
+
+class TestChunk(object):
+
+    def test_writer(self):
+        written = []
+        writer = chunk.ChunkWriter(written.append, 4, batch_size=2)
+        writer.write(b'abc')
+        writer.write(memoryview(b'defghijklm'))
+        assert written == [[(0, b'abcd'), (1, b'efgh')]]
+        assert writer.finish() is None
+        assert written[1] == [(2, b'ijkl'), (3, b'm')]
+        assert writer.chunks == 4
+        assert writer.nbytes == 13
+
+        # data fits in a single chunk is not chunked
+        written = []
+        writer = chunk.ChunkWriter(written.append, 4)
+        writer.write(b'ab')
+        writer.write(b'cd')
+        assert writer.finish() == b'abcd'
+        assert written == []
+
+    def test_reader(self):
+        reader = chunk.open_reader([b'ab', b'', memoryview(b'cde'), b'f'])
+        assert reader.read(3) == b'abc'
+        assert reader.read() == b'def'
+        assert reader.read() == b''
+
+    @pytest.mark.parametrize('size', [1, 3, 100])
+    def test_read_header(self, size):
+        data = b'MAGICname\npayload'
+        chunks = [data[i:i + size] for i in range(0, len(data), size)]
+        name, rest = chunk.read_header(chunks, b'MAGIC')
+        assert name == 'name'
+        assert b''.join(rest) == b'payload'
+
+        name, rest = chunk.read_header(chunks, b'OTHER')
+        assert name is None
+        assert b''.join(rest) == data
+
+        name, rest = chunk.read_header([], b'MAGIC')
+        assert name is None
+        assert list(rest) == []
+
+        with pytest.raises(ValueError, match='end of header'):
+            chunk.read_header([b'MAGIC' + b'x' * 100], b'MAGIC')
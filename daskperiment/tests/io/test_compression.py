@@ -0,0 +1,127 @@
+import pytest
+
+import pathlib
+
+import daskperiment.io.compression as compression
+from daskperiment.io.compression import Compression
+
+
+AVAILABLE = [name for name, codec in compression._CODECS.items()
+             if codec.available]
+
+
+class TestCompression(object):
+
+    @pytest.mark.parametrize('codec', AVAILABLE)
+    def test_roundtrip(self, codec):
+        data = b'abc' * 1000
+        comp = Compression(codec)
+        res = comp.compress(data, 'persist')
+        assert compression.is_compressed(res)
+        assert len(res) < len(data)
+        assert compression.decompress(res) == data
+
+    def test_threshold(self):
+        comp = Compression('zlib', threshold=100)
+        # smaller than threshold
+        assert comp.compress(b'a' * 99, 'object') == b'a' * 99
+        assert compression.is_compressed(comp.compress(b'a' * 100, 'object'))
+
+        # incompressible data is stored raw
+        comp = Compression('zlib', threshold=0)
+        assert comp.compress(b'abc', 'object') == b'abc'
+
+    def test_category(self):
+        comp = Compression({'persist': 'zlib', 'text': None})
+        assert comp.codecs == {'persist': 'zlib'}
+        assert comp.enabled('persist')
+        assert not comp.enabled('text')
+        assert not comp.enabled('metric')
+
+        data = b'abc' * 1000
+        assert compression.is_compressed(comp.compress(data, 'persist'))
+        assert comp.compress(data, 'text') == data
+
+        msg = 'compression category must be one of'
+        with pytest.raises(ValueError, match=msg):
+            Compression({'xxx': 'zlib'})
+
+    @pytest.mark.parametrize('codec', AVAILABLE)
+    def test_writer(self, codec):
+        import io
+
+        data = b'abc' * 1000
+        buf = io.BytesIO()
+        writer = Compression(codec).open_writer(buf, 'persist')
+        for i in range(0, len(data), 100):
+            writer.write(data[i:i + 100])
+        writer.close()
+        res = buf.getvalue()
+        assert compression.is_compressed(res)
+        assert len(res) < len(data)
+        assert compression.decompress(res) == data
+
+        # decompress chunk by chunk
+        chunks = [res[i:i + 7] for i in range(0, len(res), 7)]
+        assert b''.join(compression.decompress_chunks(chunks)) == data
+
+    def test_writer_threshold(self):
+        import io
+
+        comp = Compression('zlib', threshold=100)
+        buf = io.BytesIO()
+        writer = comp.open_writer(buf, 'object')
+        writer.write(b'a' * 50)
+        writer.write(b'a' * 49)
+        writer.close()
+        assert buf.getvalue() == b'a' * 99
+        assert list(compression.decompress_chunks([b'a' * 99])) == [b'a' * 99]
+
+        # category not compressed
+        buf = io.BytesIO()
+        writer = Compression({'persist': 'zlib'}).open_writer(buf, 'text')
+        writer.write(b'a' * 1000)
+        writer.close()
+        assert buf.getvalue() == b'a' * 1000
+
+    def test_decompress_raw(self):
+        # data stored without compression
+        assert compression.decompress(b'\x80abc') == b'\x80abc'
+        assert compression.decompress('abc') == 'abc'
+        assert not compression.is_compressed('abc')
+
+    def test_compressed_file(self, tmpdir):
+        path = pathlib.Path(str(tmpdir)) / 'x.pkl'
+        path.write_bytes(Compression('zlib').compress(b'a' * 2000, 'object'))
+        assert compression.is_compressed_file(path)
+        path.write_bytes(b'a' * 2000)
+        assert not compression.is_compressed_file(path)
+
+    def test_create_compression(self):
+        comp = compression.create_compression(None)
+        assert comp == Compression()
+        comp = compression.create_compression(None, default='zlib')
+        assert comp == Compression('zlib')
+        comp = compression.create_compression(False, default='zlib')
+        assert comp == Compression()
+        comp = compression.create_compression({'metric': 'zlib'})
+        assert comp.codecs == {'metric': 'zlib'}
+
+        comp = Compression('zlib', threshold=10, level=9)
+        assert compression.create_compression(comp) is comp
+
+        with pytest.raises(ValueError, match='compression must be'):
+            compression.create_compression(1)
+        with pytest.raises(ValueError, match='compression codec must be'):
+            compression.create_compression('xxx')
+
+    @pytest.mark.parametrize('codec', ['zstd', 'lz4'])
+    def test_unavailable(self, codec):
+        if codec in AVAILABLE:
+            pytest.skip('{} is installed'.format(codec))
+        with pytest.raises(ImportError, match='compression requires'):
+            Compression(codec)
+
+    def test_repr(self):
+        comp = Compression({'persist': 'zlib'}, threshold=10)
+        assert repr(comp) == 'Compression({persist: zlib}, threshold: 10)'
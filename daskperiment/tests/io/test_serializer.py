@@ -0,0 +1,186 @@
+import pytest
+
+import numpy as np
+import pandas as pd
+import pandas.testing as tm
+
+import daskperiment.io.pickle as pickle
+import daskperiment.io.serializer as serializer
+
+
+class TestSerializer(object):
+
+    def test_infer(self):
+        df = pd.DataFrame({'a': [1, 2, 3]})
+        arr = np.arange(5)
+
+        assert serializer.infer_serializer(1).name == 'pickle'
+        assert serializer.infer_serializer(arr).name == 'npy'
+        # object array is not supported by npy
+        obj = np.array(['a', 1], dtype=object)
+        assert serializer.infer_serializer(obj).name == 'pickle'
+
+        if serializer.ParquetSerializer().available:
+            assert serializer.infer_serializer(df).name == 'parquet'
+        else:
+            assert serializer.infer_serializer(df).name == 'pickle'
+
+    @pytest.mark.parametrize('obj', [1, 'x', {'a': [1, 2]},
+                                     np.arange(5), np.ones((2, 3))])
+    def test_roundtrip(self, obj, tmpdir):
+        import pathlib
+
+        res = serializer.loads(serializer.dumps(obj))
+        assert type(res) is type(obj)
+        np.testing.assert_equal(res, obj)
+
+        path = pathlib.Path(str(tmpdir)) / 'obj.pkl'
+        saved = serializer.save(obj, path)
+        assert saved.suffix == serializer.infer_serializer(obj).extension
+        res = serializer.load(path)
+        assert type(res) is type(obj)
+        np.testing.assert_equal(res, obj)
+
+    def test_roundtrip_dataframe(self, tmpdir):
+        import pathlib
+
+        df = pd.DataFrame({'a': [1, 2, 3], 'b': [1.1, 2.2, 3.3],
+                           'c': ['x', 'y', 'z']},
+                          index=pd.Index([4, 5, 6], name='i'))
+        tm.assert_frame_equal(serializer.loads(serializer.dumps(df)), df)
+        res = serializer.loads(serializer.dumps(df), columns=['a', 'c'])
+        tm.assert_frame_equal(res, df[['a', 'c']])
+
+        path = pathlib.Path(str(tmpdir)) / 'df.pkl'
+        serializer.save(df, path)
+        tm.assert_frame_equal(serializer.load(path), df)
+        tm.assert_frame_equal(serializer.load(path, columns=['b']),
+                              df[['b']])
+
+        # not supported by Parquet, fallback to pickle
+        df = pd.DataFrame({1: [1, 2], 2: [3, 4]})
+        tm.assert_frame_equal(serializer.loads(serializer.dumps(df)), df)
+        assert serializer.save(df, path).suffix == '.pkl'
+        tm.assert_frame_equal(serializer.load(path), df)
+
+    def test_columns_invalid(self):
+        with pytest.raises(ValueError, match='only for DataFrame'):
+            serializer.loads(serializer.dumps(np.arange(3)), columns=['a'])
+
+    def test_loads_legacy(self):
+        # data persisted by older versions
+        assert serializer.loads(pickle.dumps([1, 2])) == [1, 2]
+
+    @pytest.mark.parametrize('obj', [1, {'a': [1, 2]}, np.arange(1000),
+                                     np.ones((20, 30)),
+                                     pd.DataFrame({'a': [1, 2, 3]})])
+    @pytest.mark.parametrize('compression', [None, 'zlib'])
+    def test_load_chunks(self, obj, compression):
+        from daskperiment.io.compression import Compression
+
+        parts = serializer.dumps_parts(obj)
+        data = b''.join(parts)
+        assert data == serializer.dumps(obj)
+        assert serializer.content_hash(*parts) == \
+            serializer.content_hash(data)
+
+        comp = Compression(compression, threshold=0)
+        data = comp.compress(data, 'persist')
+        chunks = [data[i:i + 5] for i in range(0, len(data), 5)]
+        res = serializer.load_chunks(chunks)
+        assert type(res) is type(obj)
+        if isinstance(obj, pd.DataFrame):
+            tm.assert_frame_equal(res, obj)
+        else:
+            np.testing.assert_equal(res, obj)
+
+        # data persisted by older versions
+        assert serializer.load_chunks([pickle.dumps([1, 2])]) == [1, 2]
+
+    def test_save_other_format(self, tmpdir):
+        import pathlib
+
+        path = pathlib.Path(str(tmpdir)) / 'x.pkl'
+        assert serializer.save(np.arange(3), path).suffix == '.npy'
+        assert serializer.save([1], path).suffix == '.pkl'
+        # file saved previously in other format is removed
+        assert [p.name for p in pathlib.Path(str(tmpdir)).iterdir()] == \
+            ['x.pkl']
+        assert serializer.load(path) == [1]
+
+        with pytest.raises(FileNotFoundError):
+            serializer.load(path.with_name('y.pkl'))
+
+    def test_mmap(self, tmpdir):
+        import pathlib
+
+        path = pathlib.Path(str(tmpdir)) / 'x.pkl'
+        serializer.save(np.arange(10), path)
+        res = serializer.load(path, mmap=True)
+        assert isinstance(res, np.memmap)
+        assert not res.flags.writeable
+        np.testing.assert_array_equal(res, np.arange(10))
+
+        # file is replaced, memory-mapped array is not affected
+        serializer.save(np.arange(3), path)
+        np.testing.assert_array_equal(res, np.arange(10))
+        np.testing.assert_array_equal(serializer.load(path, mmap=True),
+                                      np.arange(3))
+        # temporary files are removed
+        assert [p.name for p in pathlib.Path(str(tmpdir)).iterdir()] == \
+            ['x.npy']
+
+        # ignored if not supported by the format
+        serializer.save([1, 2], path)
+        assert serializer.load(path, mmap=True) == [1, 2]
+
+        # compressed file is loaded in memory
+        from daskperiment.io.compression import Compression
+        serializer.save(np.zeros(1000), path, compression=Compression('zlib'))
+        res = serializer.load(path, mmap=True)
+        assert not isinstance(res, np.memmap)
+        np.testing.assert_array_equal(res, np.zeros(1000))
+
+    def test_format(self):
+        data = serializer.dumps(np.arange(3), format='pickle')
+        np.testing.assert_equal(serializer.loads(data), np.arange(3))
+
+        msg = 'format must be one of pickle, npy, parquet'
+        with pytest.raises(ValueError, match=msg):
+            serializer.get_serializer('xxx')
+
+        with pytest.raises(ValueError, match='Unable to serialize'):
+            serializer.dumps([1, 2], format='npy')
+
+    @pytest.mark.skipif(serializer.ParquetSerializer().available,
+                        reason='pyarrow or fastparquet is installed')
+    def test_parquet_unavailable(self):
+        with pytest.raises(ImportError, match='Parquet format requires'):
+            serializer.get_serializer('parquet')
+
+    def test_register(self):
+
+        class ListSerializer(serializer._Serializer):
+            name = 'list'
+            extension = '.list'
+
+            def accepts(self, obj):
+                return isinstance(obj, list)
+
+            def dumps(self, obj):
+                return ','.join(str(o) for o in obj).encode()
+
+            def loads(self, data, columns=None):
+                return [int(d) for d in bytes(data).decode().split(',')]
+
+        try:
+            serializer.register_serializer(ListSerializer())
+            assert serializer.infer_serializer([1, 2]).name == 'list'
+            data = serializer.dumps([1, 2])
+            assert data.endswith(b'1,2')
+            assert serializer.loads(data) == [1, 2]
+        finally:
+            serializer._SERIALIZERS.pop('list')
+
+        with pytest.raises(ValueError, match='must be a subclass'):
+            serializer.register_serializer(object())
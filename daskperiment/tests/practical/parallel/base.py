@@ -1,9 +1,13 @@
+import pytest
+
 import threading
 import time
 
 import pandas as pd
 import pandas.testing as tm
 
+import daskperiment
+
 
 class ParallelExperimentBase(object):
 
@@ -110,3 +114,149 @@ class ParallelExperimentBase(object):
                            index=pd.Index(range(1, 101), name='Trial ID'),
                            columns=['a', 'Result'])
         tm.assert_frame_equal(hist[['a', 'Result']], exp)
+
+    def test_threading_concurrent(self, ex):
+        a = ex.parameter('a')
+
+        @ex
+        def wait(a):
+            time.sleep(0.01)
+            return a
+
+        @ex.result
+        def id(a):
+            ex.save_metric(metric_key='a', epoch=0, value=a)
+            ex.save_metric(metric_key='trial_id', epoch=0,
+                           value=ex.current_trial_id)
+            return a
+
+        res = id(wait(a))
+
+        def compute(x):
+            # parameters are fixed per trial without external lock
+            assert res.compute(parameters={'a': x}) == x
+
+        threads = []
+        for i in range(20):
+            thread = threading.Thread(target=compute, args=([i]))
+            threads.append(thread)
+
+        for t in threads:
+            t.start()
+
+        for t in threads:
+            t.join()
+
+        hist = ex.get_history()
+        assert len(hist) == 20
+        tm.assert_series_equal(hist['a'], hist['Result'], check_names=False)
+        assert sorted(hist['a'].tolist()) == list(range(20))
+
+        # metrics are saved to the trial which the step belongs to
+        for trial_id, row in hist.iterrows():
+            metric = ex.load_metric('a', trial_id=trial_id)
+            assert metric.loc[0, trial_id] == row['a']
+            metric = ex.load_metric('trial_id', trial_id=trial_id)
+            assert metric.loc[0, trial_id] == trial_id
+
+    def test_threading_parallel(self, ex):
+        a = ex.parameter('a')
+
+        @ex.result
+        def long_task(a):
+            time.sleep(0.5)
+            return a
+
+        res = long_task(a)
+
+        def compute(x):
+            assert res.compute(parameters={'a': x}) == x
+
+        threads = []
+        for i in range(6):
+            thread = threading.Thread(target=compute, args=([i]))
+            threads.append(thread)
+
+        start = time.time()
+        for t in threads:
+            t.start()
+
+        for t in threads:
+            t.join()
+
+        # trials are not serialized
+        assert time.time() - start <= 2.5
+        assert sorted(ex.get_history()['Result'].tolist()) == list(range(6))
+
+    def test_process_pool(self, ex):
+        a = ex.parameter('a')
+
+        @ex.persist
+        def double(a):
+            return a * 2
+
+        @ex.result
+        def id(x):
+            ex.save_metric(metric_key='x', epoch=0, value=x)
+            return x
+
+        res = id(double(a))
+        ex.set_parameters(a=0)
+
+        parameters = [{'a': i} for i in range(6)]
+        with daskperiment.ProcessPoolTrialRunner(max_workers=2) as runner:
+            future = runner.submit(res, parameters={'a': 10})
+            assert future.trial_id == 1
+            assert future.result() == 20
+
+            assert runner.map(res, parameters) == [0, 2, 4, 6, 8, 10]
+
+        hist = ex.get_history()
+        assert hist['a'].tolist() == [10, 0, 1, 2, 3, 4, 5]
+        assert hist['Result'].tolist() == [20, 0, 2, 4, 6, 8, 10]
+        assert hist['Success'].all()
+
+        # saved from worker processes
+        for trial_id, row in hist.iterrows():
+            metric = ex.load_metric('x', trial_id=trial_id)
+            assert metric.loc[0, trial_id] == row['Result']
+            persisted = ex.get_persisted('double', trial_id=trial_id)
+            assert persisted == row['Result']
+
+        # parent process is not locked
+        assert ex.trial_id == 7
+
+    def test_process_pool_failure(self, ex):
+        a = ex.parameter('a')
+
+        @ex.result
+        def inv(a):
+            return 1 / a
+
+        res = inv(a)
+        ex.set_parameters(a=1)
+
+        with daskperiment.ProcessPoolTrialRunner(max_workers=2) as runner:
+            with pytest.raises(ZeroDivisionError):
+                runner.map(res, [{'a': 1}, {'a': 0}, {'a': 2}])
+
+        hist = ex.get_history()
+        assert hist['Success'].tolist() == [True, False, True]
+        assert hist['Result'].tolist()[0] == 1
+        assert hist['Result'].tolist()[2] == 0.5
+
+    def test_sweep_processes(self, ex):
+        a = ex.parameter('a')
+        b = ex.parameter('b')
+
+        @ex.result
+        def add(a, b):
+            return a + b
+
+        res = add(a, b)
+        grid = {'a': [1, 2], 'b': [10, 20]}
+        results = ex.sweep(res, grid, scheduler='processes', num_workers=2)
+        assert results == [11, 21, 12, 22]
+
+        hist = ex.get_history()
+        assert hist['Result'].tolist() == [11, 21, 12, 22]
@@ -8,6 +8,7 @@ import pandas as pd
 import pandas.testing as tm
 
 import daskperiment
+from daskperiment.core.errors import TrialIDNotFoundError
 import daskperiment.testing
 
 
@@ -85,3 +86,41 @@ class TestCommand(object):
         assert h.loc[2, 'Result'] == 0.5513862488149752
 
         e._delete_cache()
+
+    def test_gc(self):
+        from click.testing import CliRunner
+        from daskperiment.command import gc
+
+        e = daskperiment.Experiment('gc_command_pj')
+        a = e.parameter('a')
+
+        @e.persist
+        def inc(a):
+            return a + 1
+
+        @e.result
+        def double(x):
+            return x * 2
+
+        res = double(inc(a))
+        for i in range(3):
+            e.set_parameters(a=i)
+            res.compute()
+
+        runner = CliRunner()
+        result = runner.invoke(gc, ['gc_command_pj', '--keep-last', '1'])
+        assert result.exit_code == 0
+        assert 'dry run' in result.output
+        assert 'of 2 trials' in result.output
+        assert e.get_persisted('inc', trial_id=1) == 1
+
+        result = runner.invoke(gc, ['gc_command_pj', '--keep-last', '1',
+                                    '--no-dry-run'])
+        assert result.exit_code == 0
+        assert result.output.splitlines()[-1].startswith('Reclaimed')
+        with pytest.raises(TrialIDNotFoundError):
+            e.get_persisted('inc', trial_id=1)
+        assert e.get_persisted('inc', trial_id=3) == 3
+
+        # cleanup
+        e._delete_cache()
@@ -1,9 +1,13 @@
 import pytest
 
+import gc
+
 import numpy as np
 import pandas as pd
+from dask.base import tokenize
 
-from daskperiment.util.hashing import get_hash
+from daskperiment.util.hashing import (TokenCache, get_fast_hash, get_hash,
+                                       get_sampled_hash, token_cache)
 
 
 def assert_hash(h):
@@ -102,3 +106,167 @@ class TestHashing(object):
         assert_hash(hashed2)
 
         assert hashed1 != hashed2
+
+    @pytest.mark.parametrize('hasher', [get_sampled_hash, get_fast_hash])
+    def test_hash_modes(self, hasher):
+        objs = [1, 'aaa', [1, 2], dict(a=1, b='x'),
+                np.arange(10000), pd.DataFrame(dict(a=np.arange(10000))),
+                pd.Series(np.arange(10000)), b'x' * 10000, 'x' * 10000]
+        for obj in objs:
+            hashed1 = hasher(obj)
+            hashed2 = hasher(obj)
+            assert_hash(hashed1)
+            assert hashed1 == hashed2
+
+        hashed1 = hasher(np.arange(10000), a=pd.Series([1, 2]))
+        hashed2 = hasher(np.arange(10000), a=pd.Series([1, 3]))
+        assert hashed1 != hashed2
+
+        df1 = pd.DataFrame(dict(a=np.arange(10000)))
+        df2 = pd.DataFrame(dict(b=np.arange(10000)))
+        assert hasher(df1) != hasher(df2)
+        assert hasher(df1) != hasher(df1.astype(np.float64))
+
+    def test_hash_sampled(self):
+        arr1 = np.arange(10000)
+        arr2 = arr1.copy()
+        # not sampled
+        arr2[1] = -1
+        assert get_sampled_hash(arr1) == get_sampled_hash(arr2)
+        # sampled
+        arr2[0] = -1
+        assert get_sampled_hash(arr1) != get_sampled_hash(arr2)
+        # shape is hashed
+        assert get_sampled_hash(arr1) != get_sampled_hash(arr1[:-1])
+
+    def test_hash_fast(self):
+        arr1 = np.arange(10000)
+        arr2 = arr1.copy()
+        arr2[1] = -1
+        assert get_fast_hash(arr1) != get_fast_hash(arr2)
+        assert get_fast_hash(arr1) == get_fast_hash(arr1.copy())
+
+        # non-contiguous array
+        arr = np.arange(100).reshape(10, 10)
+        assert get_fast_hash(arr.T) == get_fast_hash(arr.T.copy())
+        assert get_fast_hash(arr.T) != get_fast_hash(arr)
+
+        df1 = pd.DataFrame(dict(a=np.arange(10000), b='x'))
+        df2 = df1.copy()
+        df2.loc[1, 'b'] = 'y'
+        assert get_fast_hash(df1) != get_fast_hash(df2)
+        assert get_fast_hash(df1) == get_fast_hash(df1.copy())
+
+    @pytest.mark.parametrize('factory', [
+        lambda: pd.Series(pd.date_range('2018-01-01', periods=100)),
+        lambda: pd.Series(pd.date_range('2018-01-01', periods=100,
+                                        tz='Asia/Tokyo')),
+        lambda: pd.Series(['x', 'y'] * 50, dtype='category'),
+        lambda: pd.Series([1, 'x'] * 50),
+        lambda: pd.Series(np.arange(100), index=np.arange(100) * 2),
+        lambda: pd.Series(np.arange(100),
+                          index=pd.MultiIndex.from_product([range(10),
+                                                            range(10)])),
+        lambda: pd.Index(['x', 'y'] * 50)])
+    def test_hash_fast_pandas(self, factory):
+        obj1 = factory()
+        obj2 = factory()
+        assert get_fast_hash(obj1) == get_fast_hash(obj2)
+
+        obj2 = obj2[::-1]
+        assert get_fast_hash(obj1) != get_fast_hash(obj2)
+
+    def test_hash_fast_performance(self):
+        import timeit
+
+        n = 2 * 10 ** 6
+        df = pd.DataFrame(dict(a=np.random.rand(n), b=np.arange(n),
+                               c=pd.date_range('2018-01-01', periods=n,
+                                               freq='s'),
+                               d='x'))
+        fast = min(timeit.repeat(lambda: get_fast_hash(df), number=1,
+                                 repeat=3))
+        full = min(timeit.repeat(lambda: get_hash(df), number=1, repeat=3))
+        # raw buffers are hashed
+        assert fast <= full * 1.2
+
+
+def readonly(arr):
+    arr.flags.writeable = False
+    return arr
+
+
+class TestTokenCache(object):
+
+    @pytest.mark.parametrize('factory, assume_immutable', [
+        (lambda: readonly(np.arange(10000)), False),
+        (lambda: np.arange(10000), True),
+        (lambda: np.array(['x'] * 10000, dtype=object), True),
+        (lambda: pd.DataFrame(dict(a=np.arange(10000))), True),
+        (lambda: pd.Series(np.arange(10000)), True)])
+    def test_normalize(self, factory, assume_immutable):
+        obj = factory()
+        cache = TokenCache(min_bytes=1000, assume_immutable=assume_immutable)
+        res = cache.normalize(obj)
+        assert res is not obj
+        assert tokenize(res, 1) == tokenize(obj, 1)
+        assert cache.info() == {'hits': 0, 'misses': 1, 'count': 1,
+                                'min_bytes': 1000}
+
+        res = cache.normalize(obj)
+        assert tokenize(res, 1) == tokenize(obj, 1)
+        assert cache.info()['hits'] == 1
+
+        # removed when garbage collected
+        del obj, res
+        gc.collect()
+        assert len(cache) == 0
+
+    def test_not_cacheable(self):
+        cache = TokenCache(min_bytes=1000)
+        for obj in [1, 'x' * 10000, [1, 2], readonly(np.arange(10)),
+                    # may be modified in-place
+                    np.arange(10000),
+                    readonly(np.array(['x'] * 10000, dtype=object)),
+                    pd.DataFrame(dict(a=np.arange(10000))),
+                    pd.Series(np.arange(10000))]:
+            assert cache.normalize(obj) is obj
+        assert len(cache) == 0
+
+        cache = TokenCache(min_bytes=None)
+        assert not cache.enabled
+        obj = readonly(np.arange(10000))
+        assert cache.normalize(obj) is obj
+
+    def test_writable_base(self):
+        cache = TokenCache(min_bytes=1000)
+        base = np.arange(10000)
+        # base can be modified
+        view = readonly(base[:])
+        assert cache.normalize(view) is view
+
+        readonly(base)
+        assert cache.normalize(view) is not view
+        assert len(cache) == 1
+
+    def test_modified(self):
+        cache = TokenCache(min_bytes=1000, assume_immutable=True)
+        obj = np.arange(10000)
+        token = tokenize(cache.normalize(obj))
+
+        # shape is changed in-place
+        obj.shape = (100, 100)
+        res = tokenize(cache.normalize(obj))
+        assert res != token
+        assert res == tokenize(obj)
+        assert cache.info()['misses'] == 2
+
+        assert tokenize(cache.normalize(obj)) == res
+        assert cache.info()['hits'] == 1
+
+    def test_get_hash(self):
+        obj = readonly(np.arange(10 ** 6))
+        hits = token_cache.info()['hits']
+        assert get_hash(obj, a=obj) == tokenize(obj, a=obj)
+        assert get_hash(obj, 1) == tokenize(obj, 1)
+        assert token_cache.info()['hits'] == hits + 2
@@ -1,5 +1,324 @@
-from dask.base import tokenize
+import functools
+import threading
+import weakref
+import zlib
+
+import numpy as np
+import pandas as pd
+from dask.base import normalize_token, tokenize
+from dask.sizeof import sizeof
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+# number of rows sampled from large objects in get_sampled_hash
+_SAMPLE_SIZE = 1000
+
+
+class _Token(object):
+    """
+    Placeholder of memoized object which is tokenized identically
+    """
+    __slots__ = ('normalized', )
+
+    def __init__(self, normalized):
+        self.normalized = normalized
+
+    def __dask_tokenize__(self):
+        return self.normalized
+
+
+class TokenCache(object):
+    """
+    Identity-keyed cache of normalized tokens of large array-likes whose
+    size is min_bytes or more.
+
+    Entries are removed when the objects are garbage collected. A hit is
+    verified in constant time with the data address, shape, strides and
+    dtype, thus only objects which can't be modified in-place are cached:
+    read-only numpy arrays whose bases are also read-only. Writable arrays,
+    object arrays and pandas objects are cached only if assume_immutable
+    is True, which means the caller guarantees they are never modified.
+    """
+
+    def __init__(self, min_bytes=2 ** 20, assume_immutable=False):
+        self.min_bytes = min_bytes
+        self.assume_immutable = assume_immutable
+
+        self._lock = threading.Lock()
+        # id -> (weakref, version, normalized token)
+        self._data = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        fmt = 'TokenCache(count: {}, min_bytes: {}, assume_immutable: {})'
+        return fmt.format(len(self._data), self.min_bytes,
+                          self.assume_immutable)
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def enabled(self):
+        return self.min_bytes is not None
+
+    def _cacheable(self, obj):
+        if not self.enabled:
+            return False
+        if isinstance(obj, np.ndarray):
+            if obj.nbytes < self.min_bytes:
+                return False
+            if self.assume_immutable:
+                return True
+            return not obj.dtype.hasobject and _is_readonly(obj)
+        elif isinstance(obj, (pd.DataFrame, pd.Series, pd.Index)):
+            return self.assume_immutable and sizeof(obj) >= self.min_bytes
+        return False
+
+    def _remove(self, key, ref):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] is ref:
+                del self._data[key]
+
+    def normalize(self, obj):
+        """
+        Return placeholder of the object which is tokenized identically.
+        The object is returned as it is if not cacheable.
+        """
+        if not self._cacheable(obj):
+            return obj
+
+        version = _get_version(obj)
+        key = id(obj)
+        with self._lock:
+            entry = self._data.get(key)
+            if (entry is not None and entry[0]() is obj and
+                    entry[1] == version):
+                self.hits += 1
+                return _Token(entry[2])
+            self.misses += 1
+
+        normalized = normalize_token(obj)
+        ref = weakref.ref(obj, functools.partial(self._remove, key))
+        with self._lock:
+            self._data[key] = (ref, version, normalized)
+        return _Token(normalized)
+
+    def clear(self):
+        """
+        Remove all entries (counters are kept)
+        """
+        with self._lock:
+            self._data.clear()
+
+    def info(self):
+        """
+        Return cache statistics
+        """
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'count': len(self._data),
+                    'min_bytes': self.min_bytes}
+
+
+# shared by all the experiments in the process
+token_cache = TokenCache()
+
+
+def _is_readonly(arr):
+    """
+    Check whether the array and its array bases are not writable.
+    Other bases (bytes, read-only mmap, etc) can't be modified via arrays.
+    """
+    while isinstance(arr, np.ndarray):
+        if arr.flags.writeable:
+            return False
+        arr = arr.base
+    return True
+
+
+def _get_version(obj):
+    """
+    Attributes to verify the memoized token in constant time
+    """
+    if isinstance(obj, np.ndarray):
+        return (obj.__array_interface__['data'][0], obj.shape, obj.strides,
+                obj.dtype.str)
+    return type(obj).__name__, obj.shape
 
 
 def get_hash(*args, **kwargs):
+    """
+    Hash args and kwargs with dask tokenize.
+
+    Tokens of large array-likes are memoized in token_cache, thus
+    hashing the same object repeatedly is cheap.
+    """
+    args, kwargs = _map_args(token_cache.normalize, args, kwargs)
+    return tokenize(*args, **kwargs)
+
+
+def _map_args(func, args, kwargs):
+    args = [func(arg) for arg in args]
+    kwargs = {key: func(value) for key, value in kwargs.items()}
+    return args, kwargs
+
+
+def _map_nested(func, obj):
+    if isinstance(obj, (list, tuple)):
+        return type(obj).__name__, [func(o) for o in obj]
+    elif isinstance(obj, dict):
+        return 'dict', sorted((str(k), func(v)) for k, v in obj.items())
+    return obj
+
+
+def _sample_index(n, size):
+    """
+    Deterministic positions of rows to be sampled
+    """
+    return np.unique(np.linspace(0, n - 1, num=size, dtype=np.int64))
+
+
+def _sample(obj, size=_SAMPLE_SIZE):
+    """
+    Replace large array-likes with deterministic subset of rows
+    """
+    if isinstance(obj, (pd.DataFrame, pd.Series, pd.Index)):
+        if len(obj) <= size:
+            return obj
+        idx = _sample_index(len(obj), size)
+        if isinstance(obj, pd.Index):
+            sampled = obj[idx]
+        else:
+            sampled = obj.iloc[idx]
+        return type(obj).__name__, obj.shape, sampled
+    elif isinstance(obj, np.ndarray):
+        if obj.ndim == 0 or len(obj) <= size:
+            return obj
+        sampled = obj[_sample_index(len(obj), size)]
+        return 'ndarray', obj.shape, obj.dtype.str, sampled
+    elif isinstance(obj, (bytes, str)):
+        if len(obj) <= size:
+            return obj
+        idx = _sample_index(len(obj), size)
+        return type(obj).__name__, len(obj), [obj[i] for i in idx]
+    return _map_nested(functools.partial(_sample, size=size), obj)
+
+
+def get_sampled_hash(*args, **kwargs):
+    """
+    Hash deterministic subset of rows of large array-likes (numpy arrays,
+    pandas objects, bytes and str). Other objects are hashed entirely.
+
+    Changes which are not in sampled rows are not detected.
+    """
+    args, kwargs = _map_args(_sample, args, kwargs)
+    return tokenize(*args, **kwargs)
+
+
+class _Crc32(object):
+
+    def __init__(self):
+        self.value = 0
+
+    def update(self, buffer):
+        self.value = zlib.crc32(buffer, self.value)
+
+    def hexdigest(self):
+        return '{:08x}'.format(self.value)
+
+
+def _buffer_hasher():
+    if xxhash is not None:
+        return xxhash.xxh64()
+    return _Crc32()
+
+
+def _buffer_hash(buffer):
+    hasher = _buffer_hasher()
+    hasher.update(buffer)
+    return hasher.hexdigest()
+
+
+def _update_values(hasher, obj):
+    """
+    Update hasher with raw buffer of numeric and datetime values, or
+    joined strings. Other values (mixed objects, categorical, etc) are
+    hashed per element.
+    """
+    values = obj.values
+    if isinstance(values, np.ndarray):
+        if not values.dtype.hasobject:
+            data = np.ascontiguousarray(values).reshape(-1).view(np.uint8)
+            hasher.update(data)
+            return
+        try:
+            # strings are joined like dask tokenize
+            joined = '\x00'.join(values.tolist())
+            hasher.update(joined.encode('utf-8', 'surrogatepass'))
+            return
+        except TypeError:
+            pass
+    hasher.update(pd.util.hash_pandas_object(obj, index=False).values)
+
+
+def _update_index(hasher, index):
+    if isinstance(index, pd.RangeIndex):
+        hasher.update(repr((index.start, index.stop,
+                            index.step)).encode('utf-8'))
+    else:
+        _update_values(hasher, index)
+
+
+def _digest_pandas(obj):
+    hasher = _buffer_hasher()
+    if isinstance(obj, pd.Index):
+        meta = (obj.name, str(obj.dtype))
+        _update_index(hasher, obj)
+    else:
+        _update_index(hasher, obj.index)
+        if isinstance(obj, pd.DataFrame):
+            meta = (obj.columns.tolist(), obj.dtypes.astype(str).tolist())
+            for _, column in obj.items():
+                _update_values(hasher, column)
+        else:
+            meta = (obj.name, str(obj.dtype))
+            _update_values(hasher, obj)
+    return type(obj).__name__, meta, hasher.hexdigest()
+
+
+def _digest(obj):
+    """
+    Replace array-likes with non-cryptographic hash of raw buffers
+    """
+    if isinstance(obj, (pd.DataFrame, pd.Series, pd.Index)):
+        try:
+            return _digest_pandas(obj)
+        except TypeError:
+            # unhashable elements
+            return obj
+    elif isinstance(obj, np.ndarray):
+        if obj.dtype.hasobject:
+            return obj
+        data = np.ascontiguousarray(obj).reshape(-1).view(np.uint8)
+        return 'ndarray', obj.shape, obj.dtype.str, _buffer_hash(data)
+    elif isinstance(obj, bytes):
+        return 'bytes', _buffer_hash(obj)
+    return _map_nested(_digest, obj)
+
+
+def get_fast_hash(*args, **kwargs):
+    """
+    Hash raw buffers of array-likes (numpy arrays, pandas objects and
+    bytes) with non-cryptographic hash. Uses xxhash if installed,
+    otherwise CRC32. Other objects are hashed by dask tokenize.
+    """
+    args, kwargs = _map_args(_digest, args, kwargs)
     return tokenize(*args, **kwargs)
@@ -0,0 +1,4 @@
+# Code output saved in trial_id=96
+@ex.result
+def inc(a):
+    return a + 1
@@ -0,0 +1,4 @@
+# Code output saved in trial_id=98
+@ex.result
+def inc(a):
+    return a + 1
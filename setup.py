@@ -47,5 +47,6 @@ setup(name=PACKAGE,
       entry_points="""
       [console_scripts]
       daskperimentboard = daskperiment.command:board
+      daskperimentgc = daskperiment.command:gc
       """
       )